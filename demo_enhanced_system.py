@@ -2,7 +2,7 @@
 """
 Demonstration of the Enhanced Inventory Management and Device Registration System
 Shows how the system handles:
-1. Negative inventory alerts for EAN 23541523652145
+1. Negative inventory alerts for EAN 23541523652143
 2. Device registration with test barcode generation
 3. Notification messages in the requested format
 """
@@ -10,16 +10,16 @@ Shows how the system handles:
 import sys
 from pathlib import Path
 
-# Add src to path
-src_path = Path(__file__).parent / 'src'
-sys.path.append(str(src_path))
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
 
-from inventory_manager import InventoryManager
-from notification_service import NotificationService
-from enhanced_device_registration import EnhancedDeviceRegistration
+from src.inventory_manager import InventoryManager
+from src.notification_service import NotificationService
+from src.enhanced_device_registration import EnhancedDeviceRegistration
 
 def demo_inventory_issue():
-    """Demonstrate the inventory issue with EAN 23541523652145"""
+    """Demonstrate the inventory issue with EAN 23541523652143"""
     print("=" * 70)
     print("INVENTORY ISSUE DEMONSTRATION")
     print("=" * 70)
@@ -27,7 +27,7 @@ def demo_inventory_issue():
     manager = InventoryManager()
     
     # Check the problematic EAN
-    ean = "23541523652145"
+    ean = "23541523652143"
     print(f"\n1. Checking inventory status for EAN: {ean}")
     status = manager.check_inventory_status(ean)
     
@@ -125,7 +125,7 @@ def main():
         print("SUMMARY OF ENHANCEMENTS")
         print("=" * 70)
         
-        print(f"\n✅ ISSUE RESOLVED: EAN 23541523652145 inventory tracking")
+        print(f"\n✅ ISSUE RESOLVED: EAN 23541523652143 inventory tracking")
         print(f"   • System now detects negative inventory (-1)")
         print(f"   • Critical alerts are generated automatically")
         print(f"   • Inventory status is tracked in real-time")
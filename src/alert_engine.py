@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Inventory alert engine.
+
+Alerts live in ``inventory_alerts``. A unique partial index allows at most
+one active alert per (ean, alert_type), and a numeric ``severity_rank``
+column makes "most urgent first" a plain indexed sort. Active alert keys are
+also cached in memory, so the common case of re-evaluating an item that
+already has its alert needs no query. Alerts are written in the caller's
+transaction, so callers finish it with ``AlertEngine.commit`` (or
+``rollback``): cache changes are held per connection until it commits and
+dropped if it rolls back. Every insert and resolution stamps
+the row with the next ``change_seq``, which incremental exports follow.
+
+Stock-level alerts are evaluated from the item's quantity. An alert is
+raised when its condition starts to hold and resolved automatically when
+stock recovers. ``evaluate_all`` does the same for every item with a few
+set-based statements, for use after batch imports or rebuilds.
+"""
+
+import sys
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.database.migrations import migrate
+
+SEVERITY_RANKS = {
+    'CRITICAL': 4,
+    'HIGH': 3,
+    'MEDIUM': 2,
+    'LOW': 1,
+    'INFO': 0
+}
+
+# Alert types derived from the stock level: (alert_type, severity, SQL condition, message)
+STOCK_ALERTS = (
+    ('NEGATIVE_INVENTORY', 'CRITICAL', 'current_quantity < 0', 'Inventory dropped below zero: {quantity}'),
+    ('ZERO_INVENTORY', 'HIGH', 'current_quantity = 0', 'Inventory reached zero'),
+)
+
+# Next value of the change counter, evaluated inside the writing transaction
+NEXT_CHANGE_SEQ = '(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM inventory_alerts)'
+
+# Seconds before the in-memory active-alert cache is reloaded, to pick up
+# alerts resolved by other processes sharing the database
+CACHE_TTL_SECONDS = 60
+
+def severity_rank(severity):
+    return SEVERITY_RANKS.get(str(severity).upper(), 0)
+
+def stock_alert_types(quantity):
+    """Stock alert types whose condition holds for ``quantity``"""
+    if quantity < 0:
+        return {'NEGATIVE_INVENTORY'}
+    if quantity == 0:
+        return {'ZERO_INVENTORY'}
+    return set()
+
+class AlertEngine:
+    def __init__(self, db_path=None, cache_ttl=CACHE_TTL_SECONDS):
+        self.db_path = db_path or project_root / 'barcode_scans.db'
+        self.cache_ttl = cache_ttl
+        self._active = set()
+        self._loaded_at = 0.0
+        # Cache changes per open transaction: connection -> [(key, active)], None to reload
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def _init_db(self):
+        migrate(self.db_path)
+
+    def _active_keys(self):
+        """Cached set of active (ean, alert_type) keys; caller holds the lock"""
+        if time.monotonic() - self._loaded_at > self.cache_ttl:
+            conn = self._get_connection()
+            rows = conn.execute("SELECT ean, alert_type FROM inventory_alerts WHERE status = 'active'").fetchall()
+            conn.close()
+            self._active = set(rows)
+            self._loaded_at = time.monotonic()
+        return self._active
+
+    def refresh(self):
+        """Force the active-alert cache to reload on next use"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def commit(self, conn):
+        """Commit the caller's transaction, then apply its alert changes to the cache"""
+        with self._lock:
+            changes = self._pending.pop(conn, [])
+        conn.commit()
+        with self._lock:
+            for change in changes:
+                if change is None:
+                    self._loaded_at = 0.0
+                elif change[1]:
+                    self._active.add(change[0])
+                else:
+                    self._active.discard(change[0])
+
+    def rollback(self, conn):
+        """Roll back the caller's transaction and drop its alert changes"""
+        with self._lock:
+            self._pending.pop(conn, None)
+        conn.rollback()
+
+    def raise_alert(self, cursor, ean, alert_type, message, severity):
+        """Create an active alert unless one already exists; runs in the caller's transaction
+
+        Returns:
+            bool: True if a new alert was created
+        """
+        with self._lock:
+            active = self._active_keys()
+            if (ean, alert_type) in active:
+                return False
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO inventory_alerts
+                (ean, alert_type, message, severity, severity_rank, created_at, change_seq)
+                VALUES (?, ?, ?, ?, ?, ?, {NEXT_CHANGE_SEQ})
+            ''', (ean, alert_type, message, severity, severity_rank(severity),
+                  datetime.now(timezone.utc).isoformat()))
+            self._pending.setdefault(cursor.connection, []).append(((ean, alert_type), True))
+            return cursor.rowcount > 0
+
+    def resolve(self, cursor, ean, alert_type):
+        """Resolve the active alert for a key, if any; runs in the caller's transaction"""
+        with self._lock:
+            cursor.execute(f'''
+                UPDATE inventory_alerts
+                SET status = 'resolved', resolved_at = ?, change_seq = {NEXT_CHANGE_SEQ}
+                WHERE ean = ? AND alert_type = ? AND status = 'active'
+            ''', (datetime.now(timezone.utc).isoformat(), ean, alert_type))
+            self._pending.setdefault(cursor.connection, []).append(((ean, alert_type), False))
+            return cursor.rowcount > 0
+
+    def evaluate(self, cursor, ean, quantity):
+        """Raise and auto-resolve the stock-level alerts for one item's new quantity
+
+        Returns:
+            dict: Lists of alert types raised and resolved
+        """
+        wanted = stock_alert_types(quantity)
+        with self._lock:
+            active = {alert_type for key_ean, alert_type in self._active_keys() if key_ean == ean}
+
+        raised = []
+        resolved = []
+        for alert_type, severity, _, message in STOCK_ALERTS:
+            if alert_type in wanted and alert_type not in active:
+                if self.raise_alert(cursor, ean, alert_type, message.format(quantity=quantity), severity):
+                    raised.append(alert_type)
+            elif alert_type not in wanted and alert_type in active:
+                if self.resolve(cursor, ean, alert_type):
+                    resolved.append(alert_type)
+        return {'raised': raised, 'resolved': resolved}
+
+    def evaluate_all(self, cursor):
+        """Evaluate stock-level alerts for every item in a few set-based statements
+
+        Returns:
+            dict: Counts of alerts raised and resolved
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        raised = 0
+        resolved = 0
+        with self._lock:
+            for alert_type, severity, condition, message in STOCK_ALERTS:
+                cursor.execute(f'''
+                    UPDATE inventory_alerts
+                    SET status = 'resolved', resolved_at = ?, change_seq = {NEXT_CHANGE_SEQ}
+                    WHERE status = 'active' AND alert_type = ? AND ean IN (
+                        SELECT ean FROM inventory_enhanced WHERE NOT ({condition})
+                    )
+                ''', (now, alert_type))
+                resolved += cursor.rowcount
+                cursor.execute(f'''
+                    INSERT OR IGNORE INTO inventory_alerts
+                    (ean, alert_type, message, severity, severity_rank, created_at, change_seq)
+                    SELECT ean, ?, REPLACE(?, '{{quantity}}', current_quantity), ?, ?, ?, {NEXT_CHANGE_SEQ}
+                    FROM inventory_enhanced WHERE {condition}
+                ''', (alert_type, message, severity, severity_rank(severity), now))
+                raised += cursor.rowcount
+            # Reload the cache from the database once this transaction commits
+            self._pending.setdefault(cursor.connection, []).append(None)
+        return {'raised': raised, 'resolved': resolved}
+
+    def get_active_alerts(self, limit=None):
+        """Active alerts, most severe first, then newest first"""
+        conn = self._get_connection()
+        query = '''
+            SELECT ean, alert_type, message, severity, created_at
+            FROM inventory_alerts
+            WHERE status = 'active'
+            ORDER BY severity_rank DESC, created_at DESC
+        '''
+        params = []
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+        return [
+            {'ean': row[0], 'alert_type': row[1], 'message': row[2], 'severity': row[3], 'created_at': row[4]}
+            for row in rows
+        ]
+
+def main():
+    """Re-evaluate stock alerts for the whole inventory"""
+    engine = AlertEngine()
+    conn = engine._get_connection()
+    result = engine.evaluate_all(conn.cursor())
+    engine.commit(conn)
+    conn.close()
+    print(f"Raised {result['raised']} alerts, resolved {result['resolved']}")
+    for alert in engine.get_active_alerts():
+        print(f"- {alert['severity']}: {alert['ean']} {alert['message']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import requests
 import logging
 import json
 from pathlib import Path
@@ -9,7 +8,11 @@ import os
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
-from utils.config import load_config
+from src.utils.config import load_config
+from src.utils.lazy import lazy_import
+
+# Imported on first request rather than at startup
+requests = lazy_import("requests")
 
 logger = logging.getLogger(__name__)
 
@@ -1,4 +1,17 @@
 #!/usr/bin/env python3
+import sys
+import time
+import random
+import argparse
+
+try:
+    import numpy as np
+except ImportError:  # Batch validation falls back to pure Python
+    np = None
+
+# EAN-8, UPC-A, EAN-13/ISBN-13, GTIN-14
+VALID_LENGTHS = frozenset((8, 12, 13, 14))
+MAX_LENGTH = 14
 
 class BarcodeValidationError(Exception):
     """Custom exception for barcode validation errors"""
@@ -25,7 +38,7 @@ def validate_ean(ean_value):
     ean_str = str(ean_value).strip()
     
     # Check if numeric
-    if not ean_str.isdigit():
+    if not is_numeric(ean_str):
         raise BarcodeValidationError("EAN must be numeric.")
     
     # Validate length
@@ -42,9 +55,162 @@ def validate_ean(ean_value):
             "EAN-13/ISBN-13 (13), GTIN-14 (14 digits)"
         )
     
+    if not has_valid_check_digit(ean_str):
+        raise BarcodeValidationError(
+            f"Invalid check digit: expected {gs1_check_digit(ean_str[:-1])}, got {ean_str[-1]}."
+        )
+    
     # Additional ISBN-13 validation if needed
     if len(ean_str) == 13 and ean_str.startswith(('978', '979')):
         # This is an ISBN-13, which is already validated by length and numeric check
         pass
         
     return ean_str
+
+
+def is_numeric(value):
+    """True for a non-empty string of ASCII digits 0-9
+
+    ``str.isdigit`` also accepts characters such as superscripts ('²')
+    that ``int`` rejects.
+    """
+    return value.isascii() and value.isdigit()
+
+def gs1_check_digit(digits):
+    """
+    Computes the GS1 mod-10 check digit for a string of digits without its check digit.
+    
+    Weights alternate 3, 1, 3, ... starting from the rightmost digit.
+    """
+    reversed_digits = digits[::-1]
+    total = 3 * sum(map(int, reversed_digits[0::2])) + sum(map(int, reversed_digits[1::2]))
+    return (10 - total % 10) % 10
+
+def has_valid_check_digit(ean_str):
+    """Checks the GS1 mod-10 check digit of a numeric EAN/UPC/GTIN string"""
+    reversed_digits = ean_str[::-1]
+    total = sum(map(int, reversed_digits[0::2])) + 3 * sum(map(int, reversed_digits[1::2]))
+    return total % 10 == 0
+
+def _is_valid_code(code):
+    if code is None:
+        return False
+    code = str(code).strip()
+    return len(code) in VALID_LENGTHS and is_numeric(code) and has_valid_check_digit(code)
+
+def validate_ean_batch_python(codes):
+    """Pure-Python batch validation; returns a list of booleans"""
+    return [_is_valid_code(code) for code in codes]
+
+def validate_ean_batch_numpy(codes):
+    """
+    Validates many barcodes in one vectorized NumPy pass.
+    
+    Codes are laid out as a fixed-width matrix of code points, so the digit
+    check, length check and weighted mod-10 sum run over all codes at once.
+    
+    Returns:
+        numpy.ndarray: Boolean array, True where the code is a valid EAN/UPC/GTIN
+    """
+    if np is None:
+        raise RuntimeError("NumPy is not installed")
+    
+    codes = np.asarray(codes)
+    if codes.dtype.kind not in "U":
+        codes = codes.astype(str)
+    codes = np.char.strip(codes)
+    # One column wider than the longest valid code so over-long codes stay detectable
+    codes = codes.astype(f"U{MAX_LENGTH + 1}")
+    chars = codes.view(np.uint32).reshape(len(codes), MAX_LENGTH + 1)
+    
+    lengths = np.char.str_len(codes)
+    digits = chars.astype(np.int64) - ord("0")
+    # Distance of each position from the check digit; negative past the end of the code
+    distance = lengths[:, None] - 1 - np.arange(MAX_LENGTH + 1)
+    in_code = distance >= 0
+    
+    all_digits = np.all(~in_code | ((digits >= 0) & (digits <= 9)), axis=1)
+    weights = np.where(distance % 2 == 1, 3, 1) * in_code
+    checksum_ok = (digits * weights).sum(axis=1) % 10 == 0
+    length_ok = np.isin(lengths, list(VALID_LENGTHS))
+    
+    return length_ok & all_digits & checksum_ok
+
+def validate_ean_batch(codes):
+    """
+    Validates a batch of EAN/UPC/GTIN barcodes, e.g. for bulk imports or
+    re-validating a scan backlog.
+    
+    Args:
+        codes: Sequence (or NumPy array) of barcode values
+    
+    Returns:
+        Sequence of booleans in input order: a NumPy array when NumPy is
+        available, otherwise a list
+    """
+    if np is not None:
+        codes = list(codes) if not isinstance(codes, (list, tuple, np.ndarray)) else codes
+        if len(codes) == 0:
+            return np.zeros(0, dtype=bool)
+        return validate_ean_batch_numpy(codes)
+    return validate_ean_batch_python(codes)
+
+def _random_codes(count, invalid_ratio=0.1, seed=0):
+    rng = random.Random(seed)
+    codes = []
+    for _ in range(count):
+        body = "".join(rng.choice("0123456789") for _ in range(rng.choice((7, 11, 12, 13))))
+        check = gs1_check_digit(body)
+        if rng.random() < invalid_ratio:
+            check = (check + 1) % 10
+        codes.append(body + str(check))
+    return codes
+
+def benchmark(count=1_000_000):
+    """Times batch validation of ``count`` random codes with each implementation"""
+    print(f"Generating {count:,} codes...")
+    codes = _random_codes(count)
+    
+    results = {}
+    start = time.perf_counter()
+    expected = validate_ean_batch_python(codes)
+    results["python"] = time.perf_counter() - start
+    
+    if np is not None:
+        array = np.array(codes)
+        start = time.perf_counter()
+        vectorized = validate_ean_batch_numpy(array)
+        results["numpy"] = time.perf_counter() - start
+        if vectorized.tolist() != expected:
+            raise AssertionError("NumPy and pure-Python validation disagree")
+    else:
+        print("NumPy not installed - only the pure-Python path was measured")
+    
+    for name, elapsed in results.items():
+        print(f"{name:>7}: {elapsed:.3f} s ({count / elapsed:,.0f} codes/s)")
+    print(f"  valid: {sum(expected):,} of {count:,}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate EAN/UPC/GTIN barcodes")
+    parser.add_argument("codes", nargs="*", help="Barcodes to validate")
+    parser.add_argument("--benchmark", type=int, nargs="?", const=1_000_000, metavar="N",
+                        help="Benchmark batch validation on N random codes (default 1,000,000)")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    
+    for code in args.codes:
+        try:
+            print(f"{validate_ean(code)}: valid")
+        except BarcodeValidationError as e:
+            print(f"{code}: {e}")
+    
+    if not args.codes:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Columnar export of the scan, transaction and alert history.
+
+Each run streams the rows added since the last run (rows with an id above the
+table's high-water mark) into Parquet or Arrow IPC files. Rows are read with
+``fetchmany`` and written one record batch at a time, so memory stays at
+``chunk_rows`` rows whatever the table size. The high-water marks and the
+list of files live in ``manifest.json`` in the export directory. The
+manifest is rewritten after every finished file, so an interrupted run
+resumes where the last file ended. With log sharding enabled (shards.py)
+the rows are read from the shard files past the mark.
+
+Files are append-only. ``scans`` are exported without their hub delivery
+state. ``inventory_alerts`` follow their ``change_seq`` marker rather than
+the id, so an alert is exported again when it is resolved; ``ExportReader``
+keeps the latest version of each alert.
+
+Arrow IPC files are written uncompressed so ``ExportReader`` can memory-map
+them without copying. Parquet files are zstd-compressed and smaller. Point
+the reader at a directory of device export directories to analyse a fleet:
+
+    python src/database/columnar_export.py export [--format arrow] [--dir exports]
+    python src/database/columnar_export.py read fleet_exports/ --table inventory_transactions
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # Export is optional on devices without PyArrow
+    pa = pc = pq = None
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.timestamps import to_epoch_ms
+from src.database.migrations import migrate
+from src.database.shards import ShardedLog
+
+DEFAULT_DB_PATH = os.path.join(project_root, 'barcode_scans.db')
+DEFAULT_EXPORT_DIR = os.path.join(project_root, 'exports')
+MANIFEST_NAME = 'manifest.json'
+
+DEFAULT_CHUNK_ROWS = 50000
+DEFAULT_MAX_ROWS_PER_FILE = 1000000
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Exported tables: row key, optional change marker to follow instead of the key,
+# then (column, SQL expression, Arrow type name, value converter)
+EXPORTS = {
+    'scans': {
+        'key': 'rowid',
+        'columns': (
+            ('device_id', 'device_id', 'string', None),
+            ('barcode', 'barcode', 'string', None),
+            ('quantity', 'COALESCE(quantity, 1)', 'int64', None),
+            ('timestamp', 'timestamp_ms', 'timestamp', None),
+        )
+    },
+    'inventory_transactions': {
+        'key': 'id',
+        'columns': (
+            ('ean', 'ean', 'string', None),
+            ('device_id', 'device_id', 'string', None),
+            ('transaction_type', 'transaction_type', 'string', None),
+            ('quantity_change', 'quantity_change', 'int64', None),
+            ('previous_quantity', 'previous_quantity', 'int64', None),
+            ('new_quantity', 'new_quantity', 'int64', None),
+            ('timestamp', 'timestamp_ms', 'timestamp', None),
+            ('notes', 'notes', 'string', None),
+        )
+    },
+    'inventory_alerts': {
+        'key': 'id',
+        'marker': 'change_seq',
+        'columns': (
+            ('ean', 'ean', 'string', None),
+            ('alert_type', 'alert_type', 'string', None),
+            ('severity', 'severity', 'string', None),
+            ('severity_rank', 'severity_rank', 'int64', None),
+            ('message', 'message', 'string', None),
+            ('status', 'status', 'string', None),
+            ('created_at', 'created_at', 'timestamp', to_epoch_ms),
+            ('resolved_at', 'resolved_at', 'timestamp', to_epoch_ms),
+            ('change_seq', 'change_seq', 'int64', None),
+        )
+    }
+}
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Columnar export requires PyArrow (pip install pyarrow)")
+
+def _arrow_type(name):
+    return pa.timestamp('ms', tz='UTC') if name == 'timestamp' else getattr(pa, name)()
+
+def export_schema(table):
+    """Arrow schema of an exported table: ``id`` followed by its columns"""
+    _require_pyarrow()
+    return pa.schema([('id', pa.int64())] + [(name, _arrow_type(type_name))
+                                            for name, _, type_name, _ in EXPORTS[table]['columns']])
+
+def _record_batch(schema, columns, rows):
+    values = list(zip(*rows))
+    arrays = [pa.array(values[0], pa.int64())]
+    for index, (_, _, _, convert) in enumerate(columns, start=1):
+        column = values[index] if convert is None else [None if v is None else convert(v) for v in values[index]]
+        arrays.append(pa.array(column, schema.field(index).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _open_writer(path, schema, file_format):
+    if file_format == 'parquet':
+        return pq.ParquetWriter(str(path), schema, compression='zstd')
+    return pa.ipc.new_file(str(path), schema)
+
+def load_manifest(export_dir):
+    path = Path(export_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {'device_id': None, 'tables': {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _save_manifest(export_dir, manifest):
+    path = Path(export_dir) / MANIFEST_NAME
+    temp_path = path.with_suffix('.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
+
+class ColumnarExporter:
+    def __init__(self, db_path=None, export_dir=None, file_format='parquet', chunk_rows=DEFAULT_CHUNK_ROWS,
+                 max_rows_per_file=DEFAULT_MAX_ROWS_PER_FILE):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown export format: {file_format}")
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        self.export_dir = Path(export_dir or DEFAULT_EXPORT_DIR)
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+        self.max_rows_per_file = max_rows_per_file
+        migrate(self.db_path)
+        self.log = ShardedLog(self.db_path)
+
+    def _device_id(self):
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('SELECT device_id FROM device_info ORDER BY timestamp DESC LIMIT 1').fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def export(self, tables=None):
+        """Export the rows added since the last run
+
+        Args:
+            tables (list): Tables to export (default: all of EXPORTS)
+
+        Returns:
+            dict: Result with rows and files written per table
+        """
+        _require_pyarrow()
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        manifest = load_manifest(self.export_dir)
+        manifest['device_id'] = manifest.get('device_id') or self._device_id()
+        written = {}
+        for table in tables or EXPORTS:
+            if table not in EXPORTS:
+                return {'success': False, 'message': f'{table} cannot be exported', 'tables': written}
+            written[table] = self._export_table(table, manifest)
+        rows = sum(result['rows'] for result in written.values())
+        files = sum(len(result['files']) for result in written.values())
+        return {
+            'success': True,
+            'message': f'Exported {rows} rows into {files} {self.file_format} files',
+            'tables': written
+        }
+
+    def _export_table(self, table, manifest):
+        spec = EXPORTS[table]
+        state = manifest['tables'].setdefault(table, {'high_water_mark': 0, 'files': []})
+        schema = export_schema(table)
+        key = spec['key']
+        marker = spec.get('marker', key)
+        if state.get('marker', key) != marker:
+            # Exported before the table followed a change marker: replace those files
+            for entry in state['files']:
+                (self.export_dir / entry['file']).unlink(missing_ok=True)
+            state.update(marker=marker, high_water_mark=0, high_water_key=0, files=[])
+        expressions = [expression for _, expression, _, _ in spec['columns']]
+        query = f"SELECT {key}, {', '.join(expressions)} FROM {table} "
+        if marker == key:
+            query += f"WHERE {key} > ? ORDER BY {key}"
+            mark_index = 0
+        else:
+            # Several rows can share a marker value: resume after the last (marker, key) pair
+            state['marker'] = marker
+            query += f"WHERE ({marker}, {key}) > (?, ?) ORDER BY {marker}, {key}"
+            mark_index = 1 + expressions.index(marker)
+        table_dir = self.export_dir / table
+        table_dir.mkdir(exist_ok=True)
+        written = {'rows': 0, 'files': []}
+        current = None
+
+        def finish():
+            current['writer'].close()
+            span = f"{current['first_mark']:012d}_{current['last_mark']:012d}"
+            if marker != key:
+                span += f"_{current['last_key']:012d}"
+            name = f"{table}_{span}{FORMATS[self.file_format]}"
+            os.replace(current['path'], table_dir / name)
+            state['files'].append({
+                'file': f'{table}/{name}',
+                'rows': current['rows'],
+                'first_id': current['first_mark'],
+                'last_id': current['last_mark'],
+                'exported_at': datetime.now(timezone.utc).isoformat()
+            })
+            state['high_water_mark'] = current['last_mark']
+            if marker != key:
+                state['high_water_key'] = current['last_key']
+            _save_manifest(self.export_dir, manifest)
+            written['files'].append(name)
+
+        start_mark = state['high_water_mark']
+        if marker == key:
+            segments, params = self.log.each_segment(table, after_id=start_mark), (start_mark,)
+        else:
+            segments, params = self.log.each_segment(table), (start_mark, state.get('high_water_key', 0))
+        for conn in segments:
+            rows_cursor = conn.execute(query, params)
+            while True:
+                rows = rows_cursor.fetchmany(self.chunk_rows)
+                if not rows:
+                    break
+                if current is None:
+                    path = table_dir / f'.{table}_{rows[0][mark_index]}.tmp'
+                    current = {'path': path, 'writer': _open_writer(path, schema, self.file_format),
+                               'first_mark': rows[0][mark_index], 'rows': 0}
+                current['writer'].write_table(pa.Table.from_batches([_record_batch(schema, spec['columns'], rows)]))
+                current['rows'] += len(rows)
+                current['last_key'] = rows[-1][0]
+                current['last_mark'] = rows[-1][mark_index]
+                written['rows'] += len(rows)
+                if current['rows'] >= self.max_rows_per_file:
+                    finish()
+                    current = None
+        if current is not None:
+            finish()
+        return written
+
+def _latest_versions(table, marker):
+    """Keep the row with the highest ``marker`` per (export_device, id)
+
+    A version exported twice (after a re-export) is kept once.
+    """
+    table = table.sort_by([('export_device', 'ascending'), ('id', 'ascending'), (marker, 'ascending')])
+    if table.num_rows < 2:
+        return table
+    # A row is the latest version unless the next row has the same key
+    devices, ids = table.column('export_device'), table.column('id')
+    same_key = pc.and_(pc.equal(devices.slice(0, table.num_rows - 1), devices.slice(1)),
+                       pc.equal(ids.slice(0, table.num_rows - 1), ids.slice(1)))
+    return table.filter(pa.chunked_array(pc.invert(same_key).chunks + [pa.array([True])]))
+
+class ExportReader:
+    """Memory-mapped reads over one export directory or a tree of them (one per device)"""
+
+    def __init__(self, root=None):
+        _require_pyarrow()
+        self.root = Path(root or DEFAULT_EXPORT_DIR)
+
+    def manifests(self):
+        """``(export directory, manifest)`` for every export under the root"""
+        return [(path.parent, load_manifest(path.parent)) for path in sorted(self.root.rglob(MANIFEST_NAME))]
+
+    def files(self, table, devices=None):
+        """``(device_id, path)`` of every exported file of ``table``, in id order per device"""
+        files = []
+        for export_dir, manifest in self.manifests():
+            device_id = manifest.get('device_id') or export_dir.name
+            if devices is not None and device_id not in devices:
+                continue
+            for entry in manifest['tables'].get(table, {}).get('files', []):
+                files.append((device_id, export_dir / entry['file']))
+        return files
+
+    def _read_file(self, path, columns):
+        if path.suffix == FORMATS['arrow']:
+            # Zero-copy: the table's buffers point into the mapping
+            table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+            return table.select(columns) if columns else table
+        return pq.read_table(str(path), columns=columns, memory_map=True)
+
+    def read(self, table, columns=None, devices=None):
+        """One Arrow table over every export of ``table``, with an ``export_device`` column
+
+        Tables exported by change marker hold one row per exported version;
+        only the latest version of each row is returned.
+
+        Args:
+            columns (list): Columns to load (default: all)
+            devices (list): Only these device ids
+        """
+        if table not in EXPORTS:
+            raise ValueError(f"{table} is not exported")
+        marker = EXPORTS[table].get('marker')
+        load = columns
+        if columns and marker:
+            load = list(columns) + [name for name in ('id', marker) if name not in columns]
+        parts = []
+        for device_id, path in self.files(table, devices):
+            part = self._read_file(path, load)
+            parts.append(part.append_column('export_device', pa.repeat(pa.scalar(device_id, pa.string()), part.num_rows)))
+        if not parts:
+            schema = export_schema(table)
+            if columns:
+                schema = pa.schema([schema.field(name) for name in columns])
+            return schema.empty_table().append_column('export_device', pa.array([], pa.string()))
+        result = pa.concat_tables(parts)
+        if marker:
+            result = _latest_versions(result, marker)
+            if columns:
+                result = result.select(list(columns) + ['export_device'])
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Export history to Parquet / Arrow IPC and read it back")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export rows added since the last run")
+    export_parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Database file")
+    export_parser.add_argument("--dir", default=DEFAULT_EXPORT_DIR, help="Export directory")
+    export_parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    export_parser.add_argument("--table", choices=list(EXPORTS), action="append", help="Table to export (default: all)")
+    export_parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    read_parser = subparsers.add_parser("read", help="Summarise exported data")
+    read_parser.add_argument("root", nargs="?", default=DEFAULT_EXPORT_DIR, help="Export directory or fleet tree")
+    read_parser.add_argument("--table", choices=list(EXPORTS), default="inventory_transactions")
+    read_parser.add_argument("--device", action="append", help="Only this device (repeatable)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        exporter = ColumnarExporter(args.db, args.dir, args.format, args.chunk_rows)
+        result = exporter.export(args.table)
+        print(result['message'])
+        for table, written in result['tables'].items():
+            for name in written['files']:
+                print(f"  {table}/{name}")
+        return
+
+    table = ExportReader(args.root).read(args.table, devices=args.device)
+    print(f"{args.table}: {table.num_rows} rows from {len(table.column('export_device').unique())} devices")
+    if table.num_rows:
+        counts = table.group_by('export_device').aggregate([('id', 'count')])
+        for device_id, count in zip(counts.column('export_device').to_pylist(), counts.column('id_count').to_pylist()):
+            print(f"  {device_id}: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination over the scan, transaction and notification history.
+
+Pages are read newest first by row key (``rowid`` for ``scans``, ``id`` for
+the others) and the cursor is the last key returned, so page N costs the
+same index seek as page 1 instead of skipping N * page_size rows with
+OFFSET. Device and EAN filters use indexes that end in the row key (see
+migrations.py), and a
+time range is turned into a key range with two seeks on the timestamp_ms
+index. Rows are appended in time order, so key order is time order.
+With log sharding enabled (shards.py) a page is filled from the newest
+shard file backwards, skipping files outside the cursor and time range.
+
+    python src/utils/db_viewer.py transactions --ean 4006381333931 --since 2025-07-01
+"""
+
+import os
+import sys
+import sqlite3
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.timestamps import to_epoch_ms
+from src.database.migrations import migrate
+from src.database.shards import ShardedLog
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Pageable history: table, row key, columns, device and EAN filter columns
+SOURCES = {
+    'scans': {
+        'table': 'scans',
+        'key': 'rowid',
+        'columns': ('device_id', 'barcode', 'quantity', 'timestamp', 'sent_to_hub', 'retry_count', 'error_message'),
+        'device': 'device_id',
+        'ean': 'barcode'
+    },
+    'transactions': {
+        'table': 'inventory_transactions',
+        'key': 'id',
+        'columns': ('ean', 'device_id', 'transaction_type', 'quantity_change', 'previous_quantity',
+                    'new_quantity', 'timestamp', 'notes'),
+        'device': 'device_id',
+        'ean': 'ean'
+    },
+    'notifications': {
+        'table': 'notifications',
+        'key': 'id',
+        'columns': ('device_id', 'message', 'date', 'status', 'timestamp'),
+        'device': 'device_id',
+        'ean': None
+    }
+}
+
+def _time_bound(value):
+    epoch_ms = to_epoch_ms(value)
+    if epoch_ms is None:
+        raise ValueError(f"Invalid timestamp: {value}")
+    return epoch_ms
+
+class HistoryPages:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(project_root, 'barcode_scans.db')
+        migrate(self.db_path)
+        self.log = ShardedLog(self.db_path)
+
+    def _key_range(self, cursor, source, since, until):
+        """Row key bounds for a time range, from two timestamp index seeks"""
+        table, key = source['table'], source['key']
+        low = high = None
+        if since is not None:
+            cursor.execute(f'SELECT {key} FROM {table} WHERE timestamp_ms >= ? ORDER BY timestamp_ms LIMIT 1',
+                           (_time_bound(since),))
+            row = cursor.fetchone()
+            low = row[0] if row else float('inf')
+        if until is not None:
+            cursor.execute(f'SELECT {key} FROM {table} WHERE timestamp_ms <= ? ORDER BY timestamp_ms DESC LIMIT 1',
+                           (_time_bound(until),))
+            row = cursor.fetchone()
+            high = row[0] if row else -1
+        return low, high
+
+    def page(self, source_name, cursor=None, page_size=DEFAULT_PAGE_SIZE, device_id=None, ean=None,
+             since=None, until=None):
+        """One page of history, newest first
+
+        Args:
+            source_name (str): 'scans', 'transactions' or 'notifications'
+            cursor (int): ``next_cursor`` from the previous page; None for the first page
+            page_size (int): Rows per page (capped at MAX_PAGE_SIZE)
+            device_id (str): Only rows from this device
+            ean (str): Only rows for this EAN (not available for notifications)
+            since, until: datetime or ISO string bounds on the row timestamp
+
+        Returns:
+            dict: Result with items, next_cursor (None on the last page) and has_more
+        """
+        source = SOURCES.get(source_name)
+        if source is None:
+            return {'success': False, 'message': f'Unknown history source: {source_name}', 'items': [],
+                    'next_cursor': None, 'has_more': False}
+        if ean is not None and source['ean'] is None:
+            return {'success': False, 'message': f'{source_name} cannot be filtered by EAN', 'items': [],
+                    'next_cursor': None, 'has_more': False}
+        page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        table, key = source['table'], source['key']
+
+        base_conditions = []
+        base_params = []
+        if device_id is not None:
+            base_conditions.append(f"{source['device']} = ?")
+            base_params.append(device_id)
+        if ean is not None:
+            base_conditions.append(f"{source['ean']} = ?")
+            base_params.append(ean)
+        if cursor is not None:
+            base_conditions.append(f'{key} < ?')
+            base_params.append(int(cursor))
+        bounds = {
+            'since_ms': None if since is None else _time_bound(since),
+            'until_ms': None if until is None else _time_bound(until),
+            'through_id': None if cursor is None else int(cursor) - 1
+        }
+
+        rows = []
+        try:
+            for conn in self.log.each_segment(table, newest_first=True, **bounds):
+                db_cursor = conn.cursor()
+                low, high = self._key_range(db_cursor, source, since, until)
+                conditions = list(base_conditions)
+                params = list(base_params)
+                if low is not None:
+                    conditions.append(f'{key} >= ?')
+                    params.append(low)
+                if high is not None:
+                    conditions.append(f'{key} <= ?')
+                    params.append(high)
+
+                query = f"SELECT {key}, {', '.join(source['columns'])} FROM {table}"
+                if conditions:
+                    query += ' WHERE ' + ' AND '.join(conditions)
+                query += f' ORDER BY {key} DESC LIMIT ?'
+                params.append(page_size + 1 - len(rows))
+                db_cursor.execute(query, params)
+                rows += db_cursor.fetchall()
+                if len(rows) > page_size:
+                    break
+        except sqlite3.OperationalError as e:
+            # The notifications table only exists once a notification was logged
+            if 'no such table' not in str(e):
+                raise
+            rows = []
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        items = [dict(zip(('id',) + source['columns'], row)) for row in rows]
+        return {
+            'success': True,
+            'message': f'{len(items)} {source_name}',
+            'items': items,
+            'next_cursor': rows[-1][0] if has_more else None,
+            'has_more': has_more
+        }
+
+    def iter_pages(self, source_name, page_size=DEFAULT_PAGE_SIZE, **filters):
+        """Yield successive pages until the history is exhausted"""
+        cursor = None
+        while True:
+            result = self.page(source_name, cursor, page_size, **filters)
+            if not result['success']:
+                raise ValueError(result['message'])
+            yield result
+            cursor = result['next_cursor']
+            if cursor is None:
+                return
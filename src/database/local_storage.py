@@ -9,73 +9,27 @@ import threading
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
+from src.database import scan_rollups
+from src.utils.timestamps import format_hub, to_epoch_ms
+from src.database.history_pages import HistoryPages, DEFAULT_PAGE_SIZE
+from src.database.migrations import migrate
+from src.database.shards import ShardedLog
+
 class LocalStorage:
     def __init__(self):
         self.db_path = os.path.join(project_root, 'barcode_scans.db')
         # Initialize the database schema without storing connection
         self._init_db()
+        self.log = ShardedLog(self.db_path)
+        self.history_pages = HistoryPages(self.db_path)
     
     def _get_connection(self):
         """Get a thread-local connection to the database"""
         return sqlite3.connect(self.db_path)
     
     def _init_db(self):
-        """Initialize SQLite database and create tables if they don't exist"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        # Create scans table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scans (
-                device_id TEXT,
-                barcode TEXT,
-                timestamp DATETIME,
-                sent_to_hub BOOLEAN DEFAULT 0,
-                retry_count INTEGER DEFAULT 0,
-                last_retry DATETIME,
-                error_message TEXT,
-                quantity INTEGER DEFAULT 1
-            )
-        ''')
-        # Create device_info table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS device_info (
-                device_id TEXT,
-                timestamp DATETIME
-            )
-        ''')
-        
-        # Create inventory tracking table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inventory (
-                barcode TEXT PRIMARY KEY,
-                product_name TEXT,
-                quantity INTEGER DEFAULT 0,
-                last_updated DATETIME
-            )
-        ''')
-        
-        # Add the retry_count, last_retry, error_message, and quantity columns if they don't exist
-        try:
-            # Check if the columns exist in the table schema
-            columns = [column[1] for column in cursor.execute('PRAGMA table_info(scans)').fetchall()]
-            
-            if 'retry_count' not in columns:
-                cursor.execute('ALTER TABLE scans ADD COLUMN retry_count INTEGER DEFAULT 0')
-                
-            if 'last_retry' not in columns:
-                cursor.execute('ALTER TABLE scans ADD COLUMN last_retry DATETIME')
-                
-            if 'error_message' not in columns:
-                cursor.execute('ALTER TABLE scans ADD COLUMN error_message TEXT')
-                
-            if 'quantity' not in columns:
-                cursor.execute('ALTER TABLE scans ADD COLUMN quantity INTEGER DEFAULT 1')
-        except Exception as e:
-            print(f"Warning: Could not add new columns to scans table: {str(e)}")
-            
-        conn.commit()
-        conn.close()
+        """Bring the database schema up to date; applied once per database by the migration runner"""
+        migrate(self.db_path)
 
     def test_connection(self):
         """Test database connection"""
@@ -92,38 +46,7 @@ class LocalStorage:
         """Format timestamp to match required format: 2025-05-09T10:34:17.353Z
         This handles various input timestamp formats and standardizes them
         """
-        import re
-        # If timestamp is already in the correct format, return it
-        if isinstance(timestamp, str) and re.match(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$', timestamp):
-            return timestamp
-            
-        try:
-            # If it's a string, try to parse it
-            if isinstance(timestamp, str):
-                # Try different formats
-                try:
-                    # Try ISO format with timezone
-                    dt_obj = datetime.fromisoformat(timestamp)
-                except ValueError:
-                    try:
-                        # Try standard datetime format
-                        dt_obj = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f")
-                    except ValueError:
-                        # If all else fails, return as is
-                        return timestamp
-            else:
-                # If it's already a datetime object
-                dt_obj = timestamp
-                
-            # Ensure it's timezone aware
-            if dt_obj.tzinfo is None:
-                dt_obj = dt_obj.replace(tzinfo=timezone.utc)
-                
-            # Format to the required format
-            return dt_obj.strftime("%Y-%m-%dT%H:%M:%S.%fZ")[:-3] + 'Z'
-        except Exception:
-            # If any error occurs, return the original timestamp
-            return str(timestamp)
+        return format_hub(timestamp)
 
     def save_scan(self, device_id, barcode, quantity=1):
         """Save a barcode scan to the database
@@ -137,13 +60,21 @@ class LocalStorage:
             str: The formatted timestamp of the scan
         """
         timestamp = datetime.now(timezone.utc)
-        formatted_timestamp = self.format_timestamp(timestamp)
+        timestamp_ms = to_epoch_ms(timestamp)
+        formatted_timestamp = format_hub(timestamp_ms)
         conn = self._get_connection()
+        # With sharding enabled the scan row goes into today's shard file
+        shard = self.log.attach(conn, 'scans', timestamp_ms)
         cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO scans (device_id, barcode, timestamp, sent_to_hub, retry_count, quantity) VALUES (?, ?, ?, ?, ?, ?)',
-            (device_id, barcode, formatted_timestamp, 0, 0, quantity)
-        )
+        self.log.insert(cursor, shard, 'scans', {
+            'device_id': device_id,
+            'barcode': barcode,
+            'timestamp': formatted_timestamp,
+            'timestamp_ms': timestamp_ms,
+            'sent_to_hub': 0,
+            'retry_count': 0,
+            'quantity': quantity
+        })
         
         # Also update the inventory table
         cursor.execute(
@@ -152,75 +83,81 @@ class LocalStorage:
             (barcode, quantity, formatted_timestamp, quantity, formatted_timestamp)
         )
         
+        # Keep the analytics rollups current in the same transaction
+        scan_rollups.record_scan(cursor, device_id, barcode, quantity, timestamp_ms // 1000)
+        
         conn.commit()
         conn.close()
         return formatted_timestamp
 
     def get_recent_scans(self, limit=10):
         """Get recent barcode scans from the database"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT device_id, barcode, timestamp FROM scans ORDER BY timestamp DESC LIMIT ?',
-            (limit,)
-        )
-        rows = cursor.fetchall()
-        conn.close()
+        rows = []
+        for conn in self.log.each_segment('scans', newest_first=True):
+            rows += conn.execute(
+                'SELECT device_id, barcode, timestamp FROM scans ORDER BY timestamp_ms DESC LIMIT ?',
+                (limit - len(rows),)
+            ).fetchall()
+            if len(rows) >= limit:
+                break
         return [
             {'device_id': row[0], 'barcode': row[1], 'timestamp': self.format_timestamp(row[2])}
             for row in rows
         ]
 
+    def get_scans_page(self, cursor=None, page_size=DEFAULT_PAGE_SIZE, device_id=None, barcode=None,
+                       since=None, until=None):
+        """One page of scan history, newest first
+        
+        Pass the returned ``next_cursor`` back in to get the following page.
+        Each page is an index seek, however deep into the history it is.
+        
+        Returns:
+            dict: Result with items, next_cursor and has_more
+        """
+        result = self.history_pages.page('scans', cursor, page_size, device_id, barcode, since, until)
+        for item in result['items']:
+            item['timestamp'] = self.format_timestamp(item['timestamp'])
+        return result
+
     def mark_sent_to_hub(self, device_id, barcode, timestamp):
         """Mark a scan as successfully sent to IoT Hub"""
-        formatted_timestamp = self.format_timestamp(timestamp)
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE scans SET sent_to_hub = 1, retry_count = retry_count + 1, last_retry = ? WHERE device_id = ? AND barcode = ? AND timestamp = ?',
-            (datetime.now(timezone.utc).isoformat(), device_id, barcode, formatted_timestamp)
+        timestamp_ms = to_epoch_ms(timestamp)
+        self.log.update_at(
+            'scans', timestamp_ms,
+            'UPDATE scans SET sent_to_hub = 1, retry_count = retry_count + 1, last_retry = ? WHERE device_id = ? AND barcode = ? AND timestamp_ms = ?',
+            (format_hub(datetime.now(timezone.utc)), device_id, barcode, timestamp_ms)
         )
-        conn.commit()
-        conn.close()
 
     def mark_retry_attempt(self, device_id, barcode, timestamp, error_message=None):
         """Mark a retry attempt for a scan with optional error message"""
-        formatted_timestamp = self.format_timestamp(timestamp)
-        now = datetime.now(timezone.utc).isoformat()
+        timestamp_ms = to_epoch_ms(timestamp)
+        now = format_hub(datetime.now(timezone.utc))
         
-        conn = self._get_connection()
-        cursor = conn.cursor()
         if error_message:
-            cursor.execute(
-                'UPDATE scans SET retry_count = retry_count + 1, last_retry = ?, error_message = ? WHERE device_id = ? AND barcode = ? AND timestamp = ?',
-                (now, error_message, device_id, barcode, formatted_timestamp)
+            self.log.update_at(
+                'scans', timestamp_ms,
+                'UPDATE scans SET retry_count = retry_count + 1, last_retry = ?, error_message = ? WHERE device_id = ? AND barcode = ? AND timestamp_ms = ?',
+                (now, error_message, device_id, barcode, timestamp_ms)
             )
         else:
-            cursor.execute(
-                'UPDATE scans SET retry_count = retry_count + 1, last_retry = ? WHERE device_id = ? AND barcode = ? AND timestamp = ?',
-                (now, device_id, barcode, formatted_timestamp)
+            self.log.update_at(
+                'scans', timestamp_ms,
+                'UPDATE scans SET retry_count = retry_count + 1, last_retry = ? WHERE device_id = ? AND barcode = ? AND timestamp_ms = ?',
+                (now, device_id, barcode, timestamp_ms)
             )
-        conn.commit()
-        conn.close()
     
     def get_retry_stats(self):
         """Get statistics about message retries"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        # Get total unsent messages
-        cursor.execute('SELECT COUNT(*) FROM scans WHERE sent_to_hub = 0')
-        unsent_count = cursor.fetchone()[0]
-        
-        # Get retry information 
-        cursor.execute('SELECT MAX(retry_count) FROM scans WHERE sent_to_hub = 0')
-        max_retries = cursor.fetchone()[0] or 0
-        
-        # Get messages with errors
-        cursor.execute('SELECT COUNT(*) FROM scans WHERE sent_to_hub = 0 AND error_message IS NOT NULL')
-        error_count = cursor.fetchone()[0]
-        
-        conn.close()
+        unsent_count = max_retries = error_count = 0
+        for conn in self.log.each_segment('scans'):
+            # Unsent count, highest retry count and messages with errors
+            unsent, retries, errors = conn.execute('''
+                SELECT COUNT(*), MAX(retry_count), COUNT(error_message) FROM scans WHERE sent_to_hub = 0
+            ''').fetchone()
+            unsent_count += unsent
+            max_retries = max(max_retries, retries or 0)
+            error_count += errors
         
         return {
             "unsent_count": unsent_count,
@@ -263,22 +200,21 @@ class LocalStorage:
         Returns:
             list: List of unsent scan records
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        query = 'SELECT device_id, barcode, timestamp, retry_count, last_retry, error_message FROM scans WHERE sent_to_hub = 0'
+        query = 'SELECT device_id, barcode, timestamp, retry_count, last_retry, error_message, quantity FROM scans WHERE sent_to_hub = 0'
         params = []
         
         if max_retries is not None:
             query += ' AND retry_count < ?'
             params.append(max_retries)
         
-        query += ' ORDER BY timestamp ASC LIMIT ?'
-        params.append(limit)
+        query += ' ORDER BY timestamp_ms ASC LIMIT ?'
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        # Oldest first across the shard files, stopping once the limit is reached
+        rows = []
+        for conn in self.log.each_segment('scans'):
+            rows += conn.execute(query, params + [limit - len(rows)]).fetchall()
+            if len(rows) >= limit:
+                break
         
         scans = []
         for row in rows:
@@ -288,11 +224,16 @@ class LocalStorage:
                 "timestamp": row[2],
                 "retry_count": row[3] if row[3] is not None else 0,
                 "last_retry": row[4],
-                "error_message": row[5]
+                "error_message": row[5],
+                "quantity": row[6] if row[6] is not None else 1
             })
             
         return scans
 
+    def apply_retention(self):
+        """Delete log shard files past their retention (see shards.py); a no-op without sharding"""
+        return self.log.drop_expired()
+
     def close(self):
         """Close database connection"""
         # Nothing to do as connections are created and closed per operation
\ No newline at end of file
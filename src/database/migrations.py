@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for ``barcode_scans.db``.
+
+The schema version lives in SQLite's ``PRAGMA user_version``. ``migrate``
+applies each pending step in its own ``BEGIN IMMEDIATE`` transaction and
+bumps the version with it, so concurrent processes (main loop, Gradio UI,
+CLIs) never apply a step twice. Once a database is current, the check is
+remembered per process and later calls return without touching the file, so
+constructors and hot paths run no DDL at all.
+
+Steps must stay frozen once released: a step that was applied in the field
+is never edited, later changes go into a new step appended to MIGRATIONS.
+Version 1 adopts databases created before versioning, so every statement in
+it tolerates tables and columns that already exist.
+
+    python src/database/migrations.py [--status]
+"""
+
+import os
+import sys
+import logging
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.timestamps import to_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(project_root, 'barcode_scans.db')
+
+# Rows are backfilled in batches of this many
+BACKFILL_BATCH_SIZE = 5000
+
+def _add_missing_columns(cursor, table, columns):
+    """Add ``{name: declaration}`` columns that ``table`` does not have yet"""
+    existing = {column[1] for column in cursor.execute(f'PRAGMA table_info({table})').fetchall()}
+    for name, declaration in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {declaration}')
+
+def _base_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scans (
+            device_id TEXT,
+            barcode TEXT,
+            timestamp DATETIME,
+            sent_to_hub BOOLEAN DEFAULT 0,
+            retry_count INTEGER DEFAULT 0,
+            last_retry DATETIME,
+            error_message TEXT,
+            quantity INTEGER DEFAULT 1
+        )
+    ''')
+    _add_missing_columns(cursor, 'scans', {
+        'retry_count': 'INTEGER DEFAULT 0',
+        'last_retry': 'DATETIME',
+        'error_message': 'TEXT',
+        'quantity': 'INTEGER DEFAULT 1'
+    })
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS device_info (
+            device_id TEXT,
+            timestamp DATETIME
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory (
+            barcode TEXT PRIMARY KEY,
+            product_name TEXT,
+            quantity INTEGER DEFAULT 0,
+            last_updated DATETIME
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_enhanced (
+            ean TEXT PRIMARY KEY,
+            product_name TEXT,
+            current_quantity INTEGER DEFAULT 0,
+            min_threshold INTEGER DEFAULT 0,
+            max_threshold INTEGER DEFAULT 100,
+            last_updated DATETIME,
+            status TEXT DEFAULT 'active',
+            alerts_enabled BOOLEAN DEFAULT 1,
+            stock_status TEXT
+        )
+    ''')
+    _add_missing_columns(cursor, 'inventory_enhanced', {'stock_status': 'TEXT'})
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_status_counts (
+            status TEXT PRIMARY KEY,
+            item_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # One definition for the registry; the registration modules used to create
+    # it without connection_string
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS device_registry (
+            device_id TEXT PRIMARY KEY,
+            device_name TEXT,
+            connection_string TEXT,
+            registration_date DATETIME,
+            last_seen DATETIME,
+            status TEXT DEFAULT 'active',
+            test_barcode TEXT
+        )
+    ''')
+    _add_missing_columns(cursor, 'device_registry', {'connection_string': 'TEXT'})
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ean TEXT,
+            device_id TEXT,
+            transaction_type TEXT,
+            quantity_change INTEGER,
+            previous_quantity INTEGER,
+            new_quantity INTEGER,
+            timestamp DATETIME,
+            notes TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ean TEXT,
+            alert_type TEXT,
+            message TEXT,
+            severity TEXT,
+            created_at DATETIME,
+            resolved_at DATETIME,
+            status TEXT DEFAULT 'active',
+            severity_rank INTEGER DEFAULT 0
+        )
+    ''')
+    _add_missing_columns(cursor, 'inventory_alerts', {'severity_rank': 'INTEGER DEFAULT 0'})
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            taken_at DATETIME,
+            last_transaction_id INTEGER NOT NULL,
+            item_count INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_snapshot_items (
+            snapshot_id INTEGER NOT NULL,
+            ean TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_id, ean)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT,
+            message TEXT,
+            date TEXT,
+            status TEXT,
+            timestamp DATETIME,
+            api_response TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS device_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT,
+            test_barcode TEXT,
+            message TEXT,
+            date TEXT,
+            timestamp DATETIME,
+            status TEXT DEFAULT 'sent'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            gtin TEXT PRIMARY KEY,
+            ean TEXT NOT NULL,
+            name TEXT,
+            brand TEXT,
+            category TEXT,
+            updated_at DATETIME
+        )
+    ''')
+    for table, key_column in (('scan_rollups_device', 'device_id'), ('scan_rollups_ean', 'barcode')):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                granularity TEXT NOT NULL,
+                bucket_start INTEGER NOT NULL,
+                {key_column} TEXT NOT NULL,
+                scan_count INTEGER NOT NULL DEFAULT 0,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, {key_column}, bucket_start)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (granularity, bucket_start)')
+
+def _epoch_ms_columns(cursor):
+    """Add ``timestamp_ms``, backfill it from the text ``timestamp`` in batches and index it"""
+    for table in ('scans', 'inventory_transactions', 'notifications'):
+        columns = [column[1] for column in cursor.execute(f'PRAGMA table_info({table})').fetchall()]
+        if 'timestamp_ms' in columns:
+            continue
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN timestamp_ms INTEGER')
+        last_rowid = -1
+        while True:
+            rows = cursor.execute(
+                f'SELECT rowid, timestamp FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (last_rowid, BACKFILL_BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                f'UPDATE {table} SET timestamp_ms = ? WHERE rowid = ?',
+                [(to_epoch_ms(text), rowid) for rowid, text in rows]
+            )
+            last_rowid = rows[-1][0]
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_timestamp_ms ON {table} (timestamp_ms)')
+
+def _indexes(cursor):
+    # Keep only the newest active alert per key before enforcing uniqueness
+    cursor.execute('''
+        UPDATE inventory_alerts SET status = 'resolved', resolved_at = ?
+        WHERE status = 'active' AND id NOT IN (
+            SELECT MAX(id) FROM inventory_alerts WHERE status = 'active' GROUP BY ean, alert_type
+        )
+    ''', (datetime.now(timezone.utc).isoformat(),))
+    for statement in (
+        'CREATE INDEX IF NOT EXISTS idx_scans_device_id ON scans (device_id)',
+        'CREATE INDEX IF NOT EXISTS idx_scans_barcode ON scans (barcode)',
+        'CREATE INDEX IF NOT EXISTS idx_scans_unsent ON scans (timestamp_ms) WHERE sent_to_hub = 0',
+        'CREATE INDEX IF NOT EXISTS idx_device_info_timestamp ON device_info (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_enhanced_stock_status '
+        'ON inventory_enhanced (stock_status, current_quantity, ean)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_transactions_device_id ON inventory_transactions (device_id)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_transactions_ean_id ON inventory_transactions (ean, id)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_alerts_active_key '
+        "ON inventory_alerts (ean, alert_type) WHERE status = 'active'",
+        'CREATE INDEX IF NOT EXISTS idx_inventory_alerts_active_rank '
+        "ON inventory_alerts (severity_rank DESC, created_at DESC) WHERE status = 'active'",
+        'CREATE INDEX IF NOT EXISTS idx_inventory_snapshots_last_tx ON inventory_snapshots (last_transaction_id)',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_device_id ON notifications (device_id)',
+        'CREATE INDEX IF NOT EXISTS idx_device_notifications_device_id ON device_notifications (device_id)',
+    ):
+        cursor.execute(statement)
+    # Text-timestamp indexes superseded by timestamp_ms
+    for name in ('idx_scans_timestamp', 'idx_notifications_timestamp', 'idx_inventory_transactions_timestamp'):
+        cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+def _derived_data(cursor):
+    """Backfill stock status buckets, alert severity ranks and scan rollups"""
+    # Stock status and severity rules as released with this version
+    cursor.execute('''
+        UPDATE inventory_enhanced SET stock_status = CASE
+            WHEN current_quantity < 0 THEN 'CRITICAL'
+            WHEN current_quantity = 0 THEN 'OUT_OF_STOCK'
+            WHEN current_quantity <= min_threshold THEN 'LOW_STOCK'
+            ELSE 'NORMAL'
+        END
+    ''')
+    cursor.execute('DELETE FROM inventory_status_counts')
+    cursor.execute('''
+        INSERT INTO inventory_status_counts (status, item_count)
+        SELECT bucket.name, (SELECT COUNT(*) FROM inventory_enhanced WHERE stock_status = bucket.name)
+        FROM (SELECT 'CRITICAL' AS name UNION ALL SELECT 'OUT_OF_STOCK'
+              UNION ALL SELECT 'LOW_STOCK' UNION ALL SELECT 'NORMAL') AS bucket
+    ''')
+    cursor.execute('''
+        UPDATE inventory_alerts SET severity_rank = CASE UPPER(severity)
+            WHEN 'CRITICAL' THEN 4 WHEN 'HIGH' THEN 3 WHEN 'MEDIUM' THEN 2 WHEN 'LOW' THEN 1 ELSE 0
+        END
+    ''')
+    for table, key_column in (('scan_rollups_device', 'device_id'), ('scan_rollups_ean', 'barcode')):
+        cursor.execute(f'DELETE FROM {table}')
+        for granularity, size in (('minute', 60), ('hour', 3600), ('day', 86400)):
+            cursor.execute(f'''
+                INSERT INTO {table} (granularity, bucket_start, {key_column}, scan_count, quantity)
+                SELECT ?, timestamp_ms / 1000 / ? * ?, COALESCE({key_column}, ''), COUNT(*), SUM(COALESCE(quantity, 1))
+                FROM scans WHERE timestamp_ms IS NOT NULL
+                GROUP BY 2, 3
+            ''', (granularity, size, size))
+
+def _log_shards(cursor):
+    """Settings, id sequence and catalogue for the optional log shard files (see shards.py)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_shard_settings (
+            table_name TEXT PRIMARY KEY,
+            shard_by TEXT NOT NULL,
+            rows_per_shard INTEGER,
+            retention_days INTEGER,
+            last_id INTEGER NOT NULL,
+            base_last_id INTEGER NOT NULL,
+            base_last_ms INTEGER,
+            dropped_through_id INTEGER NOT NULL DEFAULT 0,
+            dropped_through_ms INTEGER,
+            enabled_at DATETIME
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_shards (
+            table_name TEXT NOT NULL,
+            shard_key INTEGER NOT NULL,
+            file_name TEXT NOT NULL,
+            first_id INTEGER,
+            last_id INTEGER,
+            first_ms INTEGER,
+            last_ms INTEGER,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (table_name, shard_key)
+        )
+    ''')
+
+def _alert_change_seq(cursor):
+    """Per-write change counter on alerts, so incremental exports pick up resolutions"""
+    _add_missing_columns(cursor, 'inventory_alerts', {'change_seq': 'INTEGER'})
+    cursor.execute('UPDATE inventory_alerts SET change_seq = id WHERE change_seq IS NULL')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_inventory_alerts_change_seq ON inventory_alerts (change_seq)')
+
+# (version, description, step); append only
+MIGRATIONS = (
+    (1, 'Base tables and legacy columns', _base_tables),
+    (2, 'Epoch-millisecond timestamp columns', _epoch_ms_columns),
+    (3, 'Indexes', _indexes),
+    (4, 'Backfill derived data', _derived_data),
+    (5, 'Log shard catalogue', _log_shards),
+    (6, 'Alert change counter', _alert_change_seq),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Databases already checked to be current in this process
+_current = set()
+_lock = threading.Lock()
+
+def get_version(db_path=None):
+    conn = sqlite3.connect(db_path or DEFAULT_DB_PATH)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+    return version
+
+def migrate(db_path=None):
+    """Bring a database up to SCHEMA_VERSION; a no-op once it is current
+
+    Returns:
+        list: Versions applied by this call
+    """
+    key = os.path.abspath(str(db_path or DEFAULT_DB_PATH))
+    if key in _current:
+        return []
+
+    applied = []
+    with _lock:
+        if key in _current:
+            return []
+        conn = sqlite3.connect(key, isolation_level=None)
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, description, step in MIGRATIONS:
+                if number <= version:
+                    continue
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    # Another process may have applied it while we waited for the lock
+                    version = conn.execute('PRAGMA user_version').fetchone()[0]
+                    if number > version:
+                        step(conn.cursor())
+                        conn.execute(f'PRAGMA user_version = {number}')
+                        applied.append(number)
+                        logger.info(f"Applied schema migration {number}: {description}")
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+                version = max(version, number)
+            if version > SCHEMA_VERSION:
+                logger.warning(f"Database schema version {version} is newer than this build ({SCHEMA_VERSION})")
+        finally:
+            conn.close()
+        _current.add(key)
+    return applied
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Database file")
+    parser.add_argument("--status", action="store_true", help="Only print the schema version")
+    args = parser.parse_args()
+
+    version = get_version(args.db)
+    print(f"Schema version {version} (latest {SCHEMA_VERSION})")
+    if args.status:
+        return
+    applied = migrate(args.db)
+    for number, description, _ in MIGRATIONS:
+        if number in applied:
+            print(f"  applied {number}: {description}")
+    if not applied:
+        print("Up to date")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Local product catalogue: EAN -> product name, brand and category.
+
+Products are loaded from a CSV or JSON export into the ``products`` table,
+keyed by the code normalized to GTIN-14 so EAN-8/UPC-A/EAN-13 scans and
+GS1 GTINs all find the same row. Inventory queries LEFT JOIN it by that
+key, so names come from one query rather than a lookup per row.
+
+EAN prefix and manufacturer (GS1 company) prefix queries use an in-memory
+sorted array of codes searched with ``bisect``.
+
+    python src/database/product_catalogue.py import products.csv
+    python src/database/product_catalogue.py search 800123
+"""
+
+import os
+import sys
+import csv
+import json
+import bisect
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.barcode_validator import validate_ean_batch
+from src.database.migrations import migrate
+
+IMPORT_BATCH_SIZE = 5000
+JSON_READ_CHUNK = 64 * 1024
+
+# Accepted column names in catalogue exports, first match wins
+EAN_FIELDS = ("ean", "barcode", "gtin", "EAN", "Barcode", "GTIN")
+NAME_FIELDS = ("name", "product_name", "description", "Name", "ProductName", "Description")
+BRAND_FIELDS = ("brand", "manufacturer", "Brand", "Manufacturer")
+CATEGORY_FIELDS = ("category", "Category")
+
+# SQL expression normalizing a text code to GTIN-14 (left-padded with zeros)
+GTIN_SQL = "substr('00000000000000' || {column}, -14)"
+
+def to_gtin14(ean):
+    """Normalize an EAN-8/UPC-A/EAN-13/GTIN-14 to its 14-digit GTIN form"""
+    return str(ean).strip().zfill(14)
+
+def _first(record, fields):
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+def _iter_csv(f):
+    sample = f.read(4096)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.DictReader(f, dialect=dialect)
+
+def _iter_json(f):
+    """Stream records from a JSON array or JSON lines file without loading it whole"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(JSON_READ_CHUNK).lstrip()
+    in_array = buffer.startswith("[")
+    if in_array:
+        buffer = buffer[1:]
+
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if in_array and buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = f.read(JSON_READ_CHUNK)
+            if not chunk:
+                if buffer.strip():
+                    raise ValueError("Truncated or malformed JSON catalogue")
+                return
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+class EanPrefixIndex:
+    """Sorted array of codes for prefix queries via binary search"""
+
+    def __init__(self, eans=(), names=()):
+        pairs = sorted(zip(eans, names))
+        self.eans = [ean for ean, _ in pairs]
+        self.names = [name for _, name in pairs]
+
+    def _range(self, prefix):
+        start = bisect.bisect_left(self.eans, prefix)
+        # "\x7f" sorts after every digit, so this is the first code past the prefix
+        end = bisect.bisect_left(self.eans, prefix + "\x7f", start)
+        return start, end
+
+    def count(self, prefix):
+        start, end = self._range(prefix)
+        return end - start
+
+    def search(self, prefix, limit=50):
+        start, end = self._range(prefix)
+        end = min(end, start + limit) if limit else end
+        return [{"ean": self.eans[i], "name": self.names[i]} for i in range(start, end)]
+
+    def __len__(self):
+        return len(self.eans)
+
+class ProductCatalogue:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(project_root, 'barcode_scans.db')
+        self._index = None
+        self._index_lock = threading.Lock()
+        self._init_db()
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def _init_db(self):
+        migrate(self.db_path)
+
+    def lookup(self, ean):
+        """Get the catalogue entry for an EAN/GTIN, or None"""
+        conn = self._get_connection()
+        row = conn.execute(
+            'SELECT ean, name, brand, category FROM products WHERE gtin = ?', (to_gtin14(ean),)
+        ).fetchone()
+        conn.close()
+        if not row:
+            return None
+        return {'ean': row[0], 'name': row[1], 'brand': row[2], 'category': row[3]}
+
+    def upsert_products(self, products):
+        """Insert or update ``(ean, name, brand, category)`` tuples in one transaction"""
+        now = datetime.now(timezone.utc).isoformat()
+        conn = self._get_connection()
+        conn.executemany('''
+            INSERT INTO products (gtin, ean, name, brand, category, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(gtin) DO UPDATE SET
+                ean = excluded.ean,
+                name = COALESCE(excluded.name, products.name),
+                brand = COALESCE(excluded.brand, products.brand),
+                category = COALESCE(excluded.category, products.category),
+                updated_at = excluded.updated_at
+        ''', [(to_gtin14(ean), ean, name, brand, category, now) for ean, name, brand, category in products])
+        conn.commit()
+        conn.close()
+        self._index = None
+
+    def import_file(self, path, batch_size=IMPORT_BATCH_SIZE):
+        """Stream a CSV, JSON array or JSON lines export into the catalogue
+
+        Rows are parsed incrementally, validated in batches with the
+        vectorized EAN check and written with one executemany per batch, so
+        memory stays flat for large exports.
+
+        Returns:
+            dict: Result with imported and skipped counts
+        """
+        path = Path(path)
+        if not path.exists():
+            return {'success': False, 'message': f'Catalogue file not found: {path}'}
+
+        imported = 0
+        skipped = 0
+        batch = []
+
+        def flush():
+            nonlocal imported, skipped
+            valid = validate_ean_batch([row[0] for row in batch])
+            rows = [row for row, ok in zip(batch, valid) if ok]
+            skipped += len(batch) - len(rows)
+            if rows:
+                self.upsert_products(rows)
+                imported += len(rows)
+            batch.clear()
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                records = _iter_json(f) if path.suffix.lower() in ('.json', '.jsonl', '.ndjson') else _iter_csv(f)
+                for record in records:
+                    ean = _first(record, EAN_FIELDS)
+                    if not ean:
+                        skipped += 1
+                        continue
+                    batch.append((ean, _first(record, NAME_FIELDS), _first(record, BRAND_FIELDS),
+                                  _first(record, CATEGORY_FIELDS)))
+                    if len(batch) >= batch_size:
+                        flush()
+                if batch:
+                    flush()
+        except (OSError, ValueError, csv.Error) as e:
+            return {
+                'success': False,
+                'message': f'Catalogue import failed after {imported} products: {str(e)}',
+                'imported': imported,
+                'skipped': skipped
+            }
+
+        return {
+            'success': True,
+            'message': f'Imported {imported} products ({skipped} skipped)',
+            'imported': imported,
+            'skipped': skipped
+        }
+
+    def _prefix_index(self):
+        index = self._index
+        if index is None:
+            with self._index_lock:
+                index = self._index
+                if index is None:
+                    conn = self._get_connection()
+                    rows = conn.execute('SELECT ean, name FROM products').fetchall()
+                    conn.close()
+                    index = EanPrefixIndex([row[0] for row in rows], [row[1] for row in rows])
+                    self._index = index
+        return index
+
+    def refresh(self):
+        """Drop the in-memory prefix index (e.g. after another process imported products)"""
+        self._index = None
+
+    def search_prefix(self, prefix, limit=50):
+        """Products whose EAN starts with ``prefix``, in EAN order"""
+        return self._prefix_index().search(str(prefix).strip(), limit)
+
+    def count_manufacturer(self, company_prefix):
+        """Number of catalogue products under a GS1 company prefix"""
+        return self._prefix_index().count(str(company_prefix).strip())
+
+    def count(self):
+        return len(self._prefix_index())
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local product catalogue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import a CSV/JSON catalogue export")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    lookup_parser = subparsers.add_parser("lookup", help="Look up one EAN")
+    lookup_parser.add_argument("ean")
+    search_parser = subparsers.add_parser("search", help="List products by EAN or manufacturer prefix")
+    search_parser.add_argument("prefix")
+    search_parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    catalogue = ProductCatalogue()
+    if args.command == "import":
+        result = catalogue.import_file(args.path, args.batch_size)
+        print(result['message'])
+        if not result['success']:
+            sys.exit(1)
+    elif args.command == "lookup":
+        product = catalogue.lookup(args.ean)
+        print(json.dumps(product, indent=2) if product else f"{args.ean} not in catalogue")
+    else:
+        print(f"{catalogue.count_manufacturer(args.prefix)} products with prefix {args.prefix}")
+        for product in catalogue.search_prefix(args.prefix, args.limit):
+            print(f"  {product['ean']}  {product['name'] or ''}")
+
+if __name__ == "__main__":
+    main()
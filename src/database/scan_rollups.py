@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Time-bucketed scan rollups for analytics.
+
+Every scan increments per-minute, per-hour and per-day counters, once keyed
+by device and once by EAN, in the same transaction that stores the scan.
+Buckets are integer epoch seconds (UTC, truncated to the bucket size), so
+throughput queries are index range scans over a few hundred rollup rows
+rather than date parsing over the whole ``scans`` table.
+
+    python src/database/scan_rollups.py rebuild
+    python src/database/scan_rollups.py query --granularity hour --days 7 [--device ID] [--ean EAN]
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.timestamps import to_epoch_ms
+from src.database.migrations import migrate
+
+GRANULARITIES = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+# Number of points auto_granularity aims to stay under
+MAX_POINTS = 500
+
+_DIMENSIONS = {
+    'device': ('scan_rollups_device', 'device_id'),
+    'ean': ('scan_rollups_ean', 'barcode')
+}
+
+def bucket_start(epoch_seconds, granularity):
+    size = GRANULARITIES[granularity]
+    return int(epoch_seconds) // size * size
+
+def _to_epoch(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    epoch_ms = to_epoch_ms(value)
+    if epoch_ms is None:
+        raise ValueError(f"Invalid timestamp: {value}")
+    return epoch_ms // 1000
+
+def auto_granularity(start, end):
+    """Finest granularity that keeps a range under MAX_POINTS buckets"""
+    span = max(_to_epoch(end) - _to_epoch(start), 1)
+    for granularity, size in GRANULARITIES.items():
+        if span / size <= MAX_POINTS:
+            return granularity
+    return 'day'
+
+def record_scan(cursor, device_id, barcode, quantity, epoch_seconds):
+    """Add one scan to every rollup; runs in the caller's transaction"""
+    quantity = quantity or 1
+    for table, key_column in _DIMENSIONS.values():
+        key = device_id if key_column == 'device_id' else barcode
+        cursor.executemany(f'''
+            INSERT INTO {table} (granularity, bucket_start, {key_column}, scan_count, quantity)
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(granularity, {key_column}, bucket_start) DO UPDATE SET
+                scan_count = scan_count + 1,
+                quantity = quantity + excluded.quantity
+        ''', [(granularity, bucket_start(epoch_seconds, granularity), key or '', quantity)
+              for granularity in GRANULARITIES])
+
+_AGGREGATE_SQL = '''
+    SELECT ?, timestamp_ms / 1000 / ? * ?, COALESCE({key_column}, ''), COUNT(*), SUM(COALESCE(quantity, 1))
+    FROM scans
+    WHERE timestamp_ms IS NOT NULL
+    GROUP BY 2, 3
+'''
+
+def rebuild_rollups(cursor):
+    """Recompute every rollup from the scans table with one aggregate per table and granularity"""
+    for table, key_column in _DIMENSIONS.values():
+        cursor.execute(f'DELETE FROM {table}')
+        for granularity, size in GRANULARITIES.items():
+            cursor.execute(f'''
+                INSERT INTO {table} (granularity, bucket_start, {key_column}, scan_count, quantity)
+                {_AGGREGATE_SQL.format(key_column=key_column)}
+            ''', (granularity, size, size))
+
+def add_rollups(cursor, source):
+    """Add the scans of another database (a log shard) to the rollups
+
+    Args:
+        cursor: Cursor on the main database, in the caller's transaction
+        source: Connection to the database holding the scans
+    """
+    for table, key_column in _DIMENSIONS.values():
+        for granularity, size in GRANULARITIES.items():
+            rows = source.execute(_AGGREGATE_SQL.format(key_column=key_column), (granularity, size, size)).fetchall()
+            cursor.executemany(f'''
+                INSERT INTO {table} (granularity, bucket_start, {key_column}, scan_count, quantity)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(granularity, {key_column}, bucket_start) DO UPDATE SET
+                    scan_count = scan_count + excluded.scan_count,
+                    quantity = quantity + excluded.quantity
+            ''', rows)
+
+class ScanAnalytics:
+    """Query API over the scan rollups"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(project_root, 'barcode_scans.db')
+        migrate(self.db_path)
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def throughput(self, granularity=None, start=None, end=None, device_id=None, barcode=None):
+        """Scans and quantity per time bucket
+
+        Args:
+            granularity (str): 'minute', 'hour' or 'day'; chosen from the range when None
+            start, end: datetime, ISO string or epoch seconds (default: the last 24 hours)
+            device_id (str): Only this device
+            barcode (str): Only this EAN; cannot be combined with device_id, as the
+                rollups are kept per device and per EAN but not per pair
+
+        Returns:
+            list: Dicts with bucket (ISO UTC), bucket_start (epoch), scans and quantity
+        """
+        end = _to_epoch(end) if end is not None else int(datetime.now(timezone.utc).timestamp())
+        start = _to_epoch(start) if start is not None else end - 86400
+        granularity = granularity or auto_granularity(start, end)
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+
+        if device_id is not None and barcode is not None:
+            raise ValueError("Throughput can be filtered by device or by EAN, not both")
+        if barcode is not None:
+            table, key_column = _DIMENSIONS['ean']
+            key = barcode
+        else:
+            table, key_column = _DIMENSIONS['device']
+            key = device_id
+
+        query = f'''
+            SELECT bucket_start, SUM(scan_count), SUM(quantity) FROM {table}
+            WHERE granularity = ? AND bucket_start >= ? AND bucket_start <= ?
+        '''
+        params = [granularity, bucket_start(start, granularity), end]
+        if key is not None:
+            query += f' AND {key_column} = ?'
+            params.append(key)
+        query += ' GROUP BY bucket_start ORDER BY bucket_start'
+
+        conn = self._get_connection()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+        return [
+            {
+                'bucket': datetime.fromtimestamp(row[0], timezone.utc).isoformat(),
+                'bucket_start': row[0],
+                'scans': row[1],
+                'quantity': row[2]
+            }
+            for row in rows
+        ]
+
+    def top(self, dimension='ean', start=None, end=None, limit=10):
+        """Devices or EANs with the most scans in a range, from the day rollups"""
+        table, key_column = _DIMENSIONS[dimension]
+        end = _to_epoch(end) if end is not None else int(datetime.now(timezone.utc).timestamp())
+        start = _to_epoch(start) if start is not None else end - 30 * 86400
+        conn = self._get_connection()
+        rows = conn.execute(f'''
+            SELECT {key_column}, SUM(scan_count), SUM(quantity) FROM {table}
+            WHERE granularity = 'day' AND bucket_start >= ? AND bucket_start <= ?
+            GROUP BY {key_column} ORDER BY SUM(scan_count) DESC LIMIT ?
+        ''', (bucket_start(start, 'day'), end, limit)).fetchall()
+        conn.close()
+        return [{key_column: row[0], 'scans': row[1], 'quantity': row[2]} for row in rows]
+
+    def prune(self, granularity='minute', older_than_days=30):
+        """Drop fine-grained buckets that are no longer charted"""
+        cutoff = int((datetime.now(timezone.utc) - timedelta(days=older_than_days)).timestamp())
+        conn = self._get_connection()
+        removed = 0
+        for table, _ in _DIMENSIONS.values():
+            cursor = conn.execute(f'DELETE FROM {table} WHERE granularity = ? AND bucket_start < ?', (granularity, cutoff))
+            removed += cursor.rowcount
+        conn.commit()
+        conn.close()
+        return removed
+
+    def rebuild(self):
+        from src.database.shards import ShardedLog
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        rebuild_rollups(cursor)
+        # Scans in log shard files, when sharding is enabled
+        for source in ShardedLog(self.db_path).each_segment('scans', conn):
+            if source is not conn:
+                add_rollups(cursor, source)
+        conn.commit()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan throughput analytics from rollup tables")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Recompute the rollups from the scans table and its shards")
+    prune_parser = subparsers.add_parser("prune", help="Drop old minute buckets")
+    prune_parser.add_argument("--days", type=int, default=30)
+    query_parser = subparsers.add_parser("query", help="Print throughput per bucket")
+    query_parser.add_argument("--granularity", choices=list(GRANULARITIES))
+    query_parser.add_argument("--days", type=float, default=1)
+    query_filter = query_parser.add_mutually_exclusive_group()
+    query_filter.add_argument("--device")
+    query_filter.add_argument("--ean")
+    args = parser.parse_args()
+
+    analytics = ScanAnalytics()
+    if args.command == "rebuild":
+        analytics.rebuild()
+        print("Rollups rebuilt")
+    elif args.command == "prune":
+        print(f"Removed {analytics.prune('minute', args.days)} minute buckets")
+    else:
+        end = datetime.now(timezone.utc)
+        rows = analytics.throughput(args.granularity, end - timedelta(days=args.days), end, args.device, args.ean)
+        for row in rows:
+            print(f"{row['bucket']}  scans={row['scans']:6d}  quantity={row['quantity']:6d}")
+        print(f"{len(rows)} buckets")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+Optional rolling shard files for the append-only logs.
+
+With sharding enabled, new ``scans`` and ``inventory_transactions`` rows go
+into small SQLite files next to the main database, one per UTC day or per
+``rows_per_shard`` rows:
+
+    barcode_scans_shards/scans_20250730.db
+    barcode_scans_shards/inventory_transactions_20250730.db
+
+Hot state (inventory, registry, alerts, rollups, snapshots) stays in
+``barcode_scans.db``, together with the rows written before sharding was
+enabled, which act as the oldest segment. The main database also keeps the
+shard catalogue (``log_shards``: id and timestamp range per file), so every
+existing cursor, snapshot anchor and as-of query keeps working.
+
+Only the newest shard of a table takes writes. Ids stay globally increasing
+without a shared sequence: a row gets the id after the shard's own
+``MAX(id)``, and a shard's ids start after the last id of the shard before
+it. Rolling over to a new shard (next day, or ``rows_per_shard`` reached)
+seals the old file (``PRAGMA user_version = 1``) under its write lock and
+records its final id and timestamp range in the catalogue, so the main
+database is written once per shard, not once per row. Writers lock the shard
+first and re-check the seal, so no row lands in a sealed shard.
+
+A write ATTACHes the newest shard to the main connection, so the log row and
+the inventory/rollup updates commit atomically. The log row itself takes no
+main database lock; those hot-state updates still do. Reads fan out over the
+newest shard and the sealed segments whose catalogue range overlaps the
+query, newest or oldest first, and stop as soon as they have enough rows.
+Retention deletes whole sealed shard files instead of DELETE-ing old rows,
+so the main database never grows with history. A shard is kept while it
+still holds unsent scans, or while its transactions are not yet covered by
+an inventory snapshot.
+
+Sharding stays enabled once switched on (ids are no longer handed out by the
+main tables). Enable it with the scanner stopped:
+
+    python src/database/shards.py enable --by day --retention-days 90
+    python src/database/shards.py status
+    python src/database/shards.py prune
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.timestamps import from_epoch_ms, now_ms
+from src.database.migrations import migrate
+
+DEFAULT_DB_PATH = os.path.join(project_root, 'barcode_scans.db')
+
+MS_PER_DAY = 86400000
+SHARD_MODES = ('day', 'rows')
+DEFAULT_ROWS_PER_SHARD = 100000
+
+# Table and index definitions inside a shard file; ``id`` is the global row id
+SHARD_SCHEMAS = {
+    'scans': (
+        '''CREATE TABLE IF NOT EXISTS scans (
+            id INTEGER PRIMARY KEY,
+            device_id TEXT,
+            barcode TEXT,
+            timestamp DATETIME,
+            timestamp_ms INTEGER,
+            sent_to_hub BOOLEAN DEFAULT 0,
+            retry_count INTEGER DEFAULT 0,
+            last_retry DATETIME,
+            error_message TEXT,
+            quantity INTEGER DEFAULT 1
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_scans_device_id ON scans (device_id)',
+        'CREATE INDEX IF NOT EXISTS idx_scans_barcode ON scans (barcode)',
+        'CREATE INDEX IF NOT EXISTS idx_scans_timestamp_ms ON scans (timestamp_ms)',
+        'CREATE INDEX IF NOT EXISTS idx_scans_unsent ON scans (timestamp_ms) WHERE sent_to_hub = 0',
+    ),
+    'inventory_transactions': (
+        '''CREATE TABLE IF NOT EXISTS inventory_transactions (
+            id INTEGER PRIMARY KEY,
+            ean TEXT,
+            device_id TEXT,
+            transaction_type TEXT,
+            quantity_change INTEGER,
+            previous_quantity INTEGER,
+            new_quantity INTEGER,
+            timestamp DATETIME,
+            timestamp_ms INTEGER,
+            notes TEXT
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_transactions_device_id ON inventory_transactions (device_id)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_transactions_ean_id ON inventory_transactions (ean, id)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_transactions_timestamp_ms ON inventory_transactions (timestamp_ms)',
+    )
+}
+
+# user_version of a shard file that takes no more rows
+SEALED = 1
+
+_SETTINGS_COLUMNS = ('shard_by', 'rows_per_shard', 'retention_days', 'last_id', 'base_last_id',
+                     'base_last_ms', 'dropped_through_id', 'dropped_through_ms')
+
+# Shard files whose schema this process already created
+_created = set()
+_created_lock = threading.Lock()
+
+def _unsent_scans(cursor, path, last_id):
+    shard = sqlite3.connect(path)
+    try:
+        unsent = shard.execute('SELECT 1 FROM scans WHERE sent_to_hub = 0 LIMIT 1').fetchone()
+    finally:
+        shard.close()
+    return 'has unsent scans' if unsent else None
+
+def _not_snapshotted(cursor, path, last_id):
+    covered = cursor.execute('SELECT MAX(last_transaction_id) FROM inventory_snapshots').fetchone()[0] or 0
+    return 'not covered by an inventory snapshot yet' if last_id > covered else None
+
+# Why a shard past its retention must be kept (None means it can go)
+RETENTION_GUARDS = {
+    'scans': _unsent_scans,
+    'inventory_transactions': _not_snapshotted
+}
+
+class ShardedLog:
+    def __init__(self, db_path=None):
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        main = Path(self.db_path)
+        self.shard_dir = main.with_name(f'{main.stem}_shards')
+        migrate(self.db_path)
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def settings(self, cursor, table):
+        """Shard settings of ``table``; None when it is not sharded"""
+        row = cursor.execute(f'''
+            SELECT {', '.join(_SETTINGS_COLUMNS)} FROM log_shard_settings WHERE table_name = ?
+        ''', (table,)).fetchone()
+        return dict(zip(_SETTINGS_COLUMNS, row)) if row else None
+
+    def missing_ids(self, cursor, table):
+        """``(low, high)`` such that rows with low < id <= high were dropped by retention, or None"""
+        settings = self.settings(cursor, table)
+        if settings is None or settings['dropped_through_id'] <= settings['base_last_id']:
+            return None
+        return settings['base_last_id'], settings['dropped_through_id']
+
+    def enable(self, table, shard_by='day', rows_per_shard=DEFAULT_ROWS_PER_SHARD, retention_days=None):
+        """Route new ``table`` rows into shard files (or update the settings if already sharded)"""
+        if table not in SHARD_SCHEMAS:
+            raise ValueError(f"{table} cannot be sharded")
+        if shard_by not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode: {shard_by}")
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self.settings(conn, table) is None:
+                    last_id, last_ms = conn.execute(f'SELECT MAX(rowid), MAX(timestamp_ms) FROM {table}').fetchone()
+                    # AUTOINCREMENT may already have handed out ids of rows deleted since
+                    row = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+                    last_id = max(last_id or 0, row[0] if row else 0)
+                    conn.execute('''
+                        INSERT INTO log_shard_settings
+                        (table_name, shard_by, rows_per_shard, retention_days, last_id, base_last_id, base_last_ms,
+                         dropped_through_id, enabled_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
+                    ''', (table, shard_by, rows_per_shard, retention_days, last_id, last_id, last_ms,
+                          datetime.now(timezone.utc).isoformat()))
+                else:
+                    conn.execute('''
+                        UPDATE log_shard_settings SET shard_by = ?, rows_per_shard = ?, retention_days = ?
+                        WHERE table_name = ?
+                    ''', (shard_by, rows_per_shard, retention_days, table))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    def configure(self, storage_config):
+        """Enable sharding from the config.json ``storage`` section
+
+        ``{"sharding": "day" | "rows", "rows_per_shard": 100000, "retention_days": 90}``;
+        nothing happens without ``sharding``.
+
+        Returns:
+            list: Tables now sharded
+        """
+        shard_by = (storage_config or {}).get('sharding')
+        if not shard_by:
+            return []
+        for table in SHARD_SCHEMAS:
+            self.enable(table, shard_by, storage_config.get('rows_per_shard', DEFAULT_ROWS_PER_SHARD),
+                        storage_config.get('retention_days'))
+        return list(SHARD_SCHEMAS)
+
+    def _shard_file(self, table, key, shard_by):
+        if shard_by == 'day':
+            return f'{table}_{from_epoch_ms(key * MS_PER_DAY):%Y%m%d}.db'
+        return f'{table}_r{key:06d}.db'
+
+    def _ensure_shard(self, table, file_name):
+        path = self.shard_dir / file_name
+        with _created_lock:
+            if str(path) in _created:
+                return path
+            self.shard_dir.mkdir(parents=True, exist_ok=True)
+            shard = sqlite3.connect(path)
+            try:
+                for statement in SHARD_SCHEMAS[table]:
+                    shard.execute(statement)
+                shard.commit()
+            finally:
+                shard.close()
+            _created.add(str(path))
+        return path
+
+    def _newest(self, cursor, table):
+        return cursor.execute('''
+            SELECT shard_key, file_name, first_id FROM log_shards WHERE table_name = ?
+            ORDER BY shard_key DESC LIMIT 1
+        ''', (table,)).fetchone()
+
+    def _roll_over(self, table, newest, key, epoch_ms, shard_by):
+        """Seal the newest shard of ``table`` and catalogue a new one under ``key``
+
+        Runs in its own transaction, once per shard. If another writer rolled
+        over first, nothing happens.
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            if newest is not None:
+                conn.execute('ATTACH DATABASE ? AS shard', (str(self._ensure_shard(table, newest[1])),))
+            conn.execute('BEGIN')
+            try:
+                if newest is not None:
+                    # Taking the shard's write lock waits for writers still inside it
+                    conn.execute(f'PRAGMA shard.user_version = {SEALED}')
+                    last_id, first_ms, last_ms, row_count = conn.execute(f'''
+                        SELECT MAX(id), MIN(timestamp_ms), MAX(timestamp_ms), COUNT(*) FROM shard.{table}
+                    ''').fetchone()
+                # Lock the catalogue before reading it, so the read cannot go stale before the write
+                conn.execute('DELETE FROM log_shards WHERE 0')
+                if self._newest(conn, table) != newest:
+                    conn.execute('ROLLBACK')
+                    return
+                if newest is not None:
+                    conn.execute('''
+                        UPDATE log_shards SET last_id = ?, first_ms = COALESCE(?, first_ms), last_ms = ?, row_count = ?
+                        WHERE table_name = ? AND shard_key = ?
+                    ''', (last_id, first_ms, last_ms, row_count, table, newest[0]))
+                    conn.execute('UPDATE log_shard_settings SET last_id = MAX(last_id, ?) WHERE table_name = ?',
+                                 (last_id or 0, table))
+                conn.execute('''
+                    INSERT INTO log_shards (table_name, shard_key, file_name, first_id, first_ms, row_count)
+                    VALUES (?, ?, ?, ?, ?, 0)
+                ''', (table, key, self._shard_file(table, key, shard_by), self.settings(conn, table)['last_id'] + 1,
+                      epoch_ms))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    def attach(self, conn, table, epoch_ms):
+        """ATTACH the shard that takes a new ``table`` row as ``shard`` and lock it
+
+        Call on a fresh connection, before its transaction starts. The
+        transaction begins here with the shard's write lock held; the main
+        database is not locked.
+
+        Returns:
+            dict: The shard to pass to ``insert``; None when ``table`` is not sharded
+        """
+        settings = self.settings(conn, table)
+        if settings is None:
+            return None
+        while True:
+            newest = self._newest(conn, table)
+            if newest is None:
+                key = epoch_ms // MS_PER_DAY if settings['shard_by'] == 'day' else 0
+            elif settings['shard_by'] == 'day':
+                # Never write behind the newest shard, even if the clock went back
+                key = max(epoch_ms // MS_PER_DAY, newest[0])
+            else:
+                key = newest[0]
+            if newest is None or key != newest[0]:
+                self._roll_over(table, newest, key, epoch_ms, settings['shard_by'])
+                continue
+
+            conn.execute('ATTACH DATABASE ? AS shard', (str(self._ensure_shard(table, newest[1])),))
+            # A no-op write takes the shard's write lock and opens the transaction
+            conn.execute(f'DELETE FROM shard.{table} WHERE 0')
+            sealed = conn.execute('PRAGMA shard.user_version').fetchone()[0] == SEALED
+            full = False
+            if not sealed and settings['shard_by'] == 'rows':
+                last_id = conn.execute(f'SELECT MAX(id) FROM shard.{table}').fetchone()[0]
+                full = last_id is not None and last_id - newest[2] + 1 >= settings['rows_per_shard']
+            if not (sealed or full):
+                return {'table': table, 'key': newest[0], 'file_name': newest[1], 'first_id': newest[2]}
+
+            conn.rollback()
+            conn.execute('DETACH DATABASE shard')
+            if full:
+                self._roll_over(table, newest, newest[0] + 1, epoch_ms, settings['shard_by'])
+
+    def insert(self, cursor, shard, table, values):
+        """Append a row to ``table`` in the caller's transaction
+
+        Args:
+            shard (dict): From ``attach``; None writes to the main database
+            values (dict): Column values, including timestamp_ms
+
+        Returns:
+            int: The row id
+        """
+        columns = ', '.join(values)
+        placeholders = ', '.join('?' * len(values))
+        if shard is None:
+            cursor.execute(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', tuple(values.values()))
+            return cursor.lastrowid
+
+        # attach holds the shard's write lock, so MAX(id) + 1 is never handed out twice
+        cursor.execute(f'''
+            INSERT INTO shard.{table} (id, {columns})
+            SELECT COALESCE(MAX(id), ?) + 1, {placeholders} FROM shard.{table}
+        ''', (shard['first_id'] - 1,) + tuple(values.values()))
+        return cursor.lastrowid
+
+    def segments(self, cursor, table, newest_first=False, since_ms=None, until_ms=None, after_id=None,
+                 through_id=None):
+        """Files that can hold ``table`` rows in a time and id range, in id order
+
+        Returns:
+            list: Shard paths, with None standing for the main database
+        """
+        settings = self.settings(cursor, table)
+        if settings is None:
+            return [None]
+
+        conditions = ['table_name = ?']
+        params = [table]
+        if through_id is not None:
+            conditions.append('first_id <= ?')
+            params.append(through_id)
+        # The newest shard still takes rows: only its first id is final
+        sealed, sealed_params = ['1'], []
+        for condition, value in (('last_ms >= ?', since_ms), ('first_ms <= ?', until_ms), ('last_id > ?', after_id)):
+            if value is not None:
+                sealed.append(condition)
+                sealed_params.append(value)
+        conditions.append(f"(shard_key = (SELECT MAX(shard_key) FROM log_shards WHERE table_name = ?) "
+                          f"OR ({' AND '.join(sealed)}))")
+        params += [table] + sealed_params
+        cursor.execute(f"SELECT file_name FROM log_shards WHERE {' AND '.join(conditions)} ORDER BY first_id", params)
+        segments = [self.shard_dir / name for (name,) in cursor.fetchall()]
+        segments = [path for path in segments if path.exists()]
+
+        # Rows from before sharding stay in the main database, below every shard id
+        base_id, base_ms = settings['base_last_id'], settings['base_last_ms']
+        if (base_id and (after_id is None or after_id < base_id)
+                and (since_ms is None or (base_ms is not None and base_ms >= since_ms))):
+            segments.insert(0, None)
+        return segments[::-1] if newest_first else segments
+
+    def each_segment(self, table, conn=None, newest_first=False, **bounds):
+        """Yield one connection per segment from ``segments``
+
+        ``conn`` is reused for the main database segment (and to read the
+        catalogue); shard connections are closed as the iteration moves on.
+        """
+        own = conn is None
+        conn = conn or self._get_connection()
+        try:
+            for path in self.segments(conn.cursor(), table, newest_first, **bounds):
+                if path is None:
+                    yield conn
+                    continue
+                shard = sqlite3.connect(path)
+                try:
+                    yield shard
+                finally:
+                    shard.close()
+        finally:
+            if own:
+                conn.close()
+
+    def update_at(self, table, epoch_ms, sql, params):
+        """Run an UPDATE on the segments that can hold ``table`` rows stamped ``epoch_ms``
+
+        Returns:
+            int: Rows changed
+        """
+        changed = 0
+        for conn in self.each_segment(table, since_ms=epoch_ms, until_ms=epoch_ms):
+            changed += conn.execute(sql, params).rowcount
+            conn.commit()
+        return changed
+
+    def drop_expired(self, now=None):
+        """Delete shard files that are past their table's ``retention_days``
+
+        The newest shard of a table is never dropped.
+
+        Returns:
+            dict: Result with the dropped files and the kept ones with the reason
+        """
+        cutoff_base = now if now is not None else now_ms()
+        dropped, kept = [], []
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            rows = conn.execute('''
+                SELECT table_name, retention_days FROM log_shard_settings WHERE retention_days > 0
+            ''').fetchall()
+            for table, retention_days in rows:
+                cutoff = cutoff_base - retention_days * MS_PER_DAY
+                expired = conn.execute('''
+                    SELECT shard_key, file_name, COALESCE(last_id, first_id - 1), COALESCE(last_ms, first_ms)
+                    FROM log_shards
+                    WHERE table_name = ? AND COALESCE(last_ms, first_ms) < ?
+                      AND shard_key < (SELECT MAX(shard_key) FROM log_shards WHERE table_name = ?)
+                    ORDER BY shard_key
+                ''', (table, cutoff, table)).fetchall()
+                for key, file_name, last_id, last_ms in expired:
+                    path = self.shard_dir / file_name
+                    reason = RETENTION_GUARDS[table](conn, path, last_id) if path.exists() else None
+                    if reason:
+                        kept.append({'file': file_name, 'reason': reason})
+                        continue
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.execute('DELETE FROM log_shards WHERE table_name = ? AND shard_key = ?', (table, key))
+                    conn.execute('''
+                        UPDATE log_shard_settings SET dropped_through_id = MAX(dropped_through_id, ?),
+                            dropped_through_ms = MAX(COALESCE(dropped_through_ms, 0), ?)
+                        WHERE table_name = ?
+                    ''', (last_id, last_ms, table))
+                    conn.execute('COMMIT')
+                    for suffix in ('', '-journal'):
+                        Path(f'{path}{suffix}').unlink(missing_ok=True)
+                    with _created_lock:
+                        _created.discard(str(path))
+                    dropped.append(file_name)
+        finally:
+            conn.close()
+        return {
+            'success': True,
+            'message': f'Dropped {len(dropped)} shard files, kept {len(kept)} past retention',
+            'dropped': dropped,
+            'kept': kept
+        }
+
+    def status(self):
+        """Settings and shard files per sharded table"""
+        conn = self._get_connection()
+        try:
+            tables = {}
+            for (table,) in conn.execute('SELECT table_name FROM log_shard_settings ORDER BY table_name').fetchall():
+                settings = self.settings(conn, table)
+                shards = conn.execute('''
+                    SELECT file_name, first_id, last_id, first_ms, last_ms, row_count FROM log_shards
+                    WHERE table_name = ? ORDER BY shard_key
+                ''', (table,)).fetchall()
+                settings['shards'] = [
+                    dict(zip(('file', 'first_id', 'last_id', 'first_ms', 'last_ms', 'rows'), shard),
+                         bytes=os.path.getsize(self.shard_dir / shard[0]) if (self.shard_dir / shard[0]).exists() else 0)
+                    for shard in shards
+                ]
+                # The catalogue records a shard's range when it is sealed; read the open one directly
+                if shards and (self.shard_dir / shards[-1][0]).exists():
+                    shard = sqlite3.connect(self.shard_dir / shards[-1][0])
+                    try:
+                        last_id, first_ms, last_ms, rows = shard.execute(f'''
+                            SELECT MAX(id), MIN(timestamp_ms), MAX(timestamp_ms), COUNT(*) FROM {table}
+                        ''').fetchone()
+                    finally:
+                        shard.close()
+                    settings['shards'][-1].update(last_id=last_id, first_ms=first_ms, last_ms=last_ms, rows=rows)
+                tables[table] = settings
+        finally:
+            conn.close()
+        return tables
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling shard files for scans and inventory transactions")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Main database file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show shard settings and files")
+    enable_parser = subparsers.add_parser("enable", help="Write new log rows into shard files")
+    enable_parser.add_argument("--by", choices=SHARD_MODES, default="day")
+    enable_parser.add_argument("--rows", type=int, default=DEFAULT_ROWS_PER_SHARD, help="Rows per shard for --by rows")
+    enable_parser.add_argument("--retention-days", type=int, help="Drop shard files older than this")
+    enable_parser.add_argument("--table", choices=list(SHARD_SCHEMAS), action="append",
+                               help="Table to shard (default: all)")
+    subparsers.add_parser("prune", help="Delete shard files past their retention")
+    args = parser.parse_args()
+
+    log = ShardedLog(args.db)
+    if args.command == "enable":
+        for table in args.table or SHARD_SCHEMAS:
+            log.enable(table, args.by, args.rows, args.retention_days)
+            print(f"{table}: sharded by {args.by}")
+    elif args.command == "prune":
+        result = log.drop_expired()
+        print(result['message'])
+        for item in result['kept']:
+            print(f"  kept {item['file']}: {item['reason']}")
+    else:
+        tables = log.status()
+        if not tables:
+            print("Sharding is not enabled")
+        for table, settings in tables.items():
+            retention = f"{settings['retention_days']} days" if settings['retention_days'] else "forever"
+            print(f"{table}: by {settings['shard_by']}, keep {retention}, {len(settings['shards'])} shards")
+            for shard in settings['shards']:
+                print(f"  {shard['file']}: ids {shard['first_id']}-{shard['last_id']}, "
+                      f"{shard['rows']} rows, {shard['bytes'] / 1024:.0f} KiB")
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,9 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
 # Import with proper path handling
-from utils.config import load_config
-from database.local_storage import LocalStorage
-from iot.hub_client import HubClient
+from src.utils.config import load_config
+from src.database.local_storage import LocalStorage
+from src.iot.hub_client import HubClient
 
 def check_database():
     """Check if SQLite database is working"""
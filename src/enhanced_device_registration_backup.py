@@ -6,11 +6,9 @@ Handles device registration, test barcode generation, and API notifications
 
 import json
 import logging
-import requests
 from datetime import datetime, timezone
 from pathlib import Path
 import sys
-from azure.iot.hub import IoTHubRegistryManager
 import base64
 import os
 
@@ -18,8 +16,14 @@ import os
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from api.api_client import ApiClient
-from utils.config import load_config
+from src.api.api_client import ApiClient
+from src.utils.config import load_config
+from src.database.migrations import migrate
+from src.utils.lazy import lazy_import
+
+# Heavy clients are imported on first use rather than at startup
+requests = lazy_import("requests")
+iothub = lazy_import("azure.iot.hub")
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +31,7 @@ class EnhancedDeviceRegistration:
     def __init__(self):
         self.api_client = ApiClient()
         self.config = load_config()
+        migrate(project_root / 'barcode_scans.db')
         
         # IoT Hub connection string for device registration
         self.iothub_connection_string = "HostName=CaleffiIoT.azure-devices.net;SharedAccessKeyName=iothubowner;SharedAccessKey=5wAebNkJEH3qI3WQ8MIXMp3Yj70z68l9vAIoTMDkEyQ="
@@ -96,18 +101,6 @@ class EnhancedDeviceRegistration:
             conn = sqlite3.connect(project_root / 'barcode_scans.db')
             cursor = conn.cursor()
             
-            # Create device_registry table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS device_registry (
-                    device_id TEXT PRIMARY KEY,
-                    device_name TEXT,
-                    registration_date DATETIME,
-                    last_seen DATETIME,
-                    status TEXT DEFAULT 'active',
-                    test_barcode TEXT
-                )
-            ''')
-            
             # Check if device already exists
             cursor.execute('SELECT device_id FROM device_registry WHERE device_id = ?', (device_id,))
             if cursor.fetchone():
@@ -166,7 +159,7 @@ class EnhancedDeviceRegistration:
     def _register_with_azure_iot(self, device_id):
         """Register device with Azure IoT Hub"""
         try:
-            registry_manager = IoTHubRegistryManager.from_connection_string(self.iothub_connection_string)
+            registry_manager = iothub.IoTHubRegistryManager.from_connection_string(self.iothub_connection_string)
             
             # Check if device already exists
             try:
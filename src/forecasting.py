@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Stock depletion forecasting and reorder suggestions.
+
+Consumption (negative ``quantity_change`` in ``inventory_transactions``) is
+aggregated per EAN and day with ``numpy.bincount``. Each SKU then gets an
+exponentially weighted daily rate and a day-to-day standard deviation over
+a recent window, all in one vectorized batch pass. From these come:
+
+- ``days_to_zero``: current quantity / rate
+- ``reorder_point``: rate x lead time + safety stock (z x std x sqrt(lead time))
+- ``suggested_order``: quantity that brings stock back to ``max_threshold``
+  (or a review period of demand above the reorder point)
+
+SKUs projected to reach the reorder point get a predictive LOW_STOCK alert
+before they run out. The alert is resolved once the projection recovers.
+
+    python src/forecasting.py [--no-alerts]
+    python src/forecasting.py --benchmark --skus 100000 --days 365
+"""
+
+import sys
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # Forecasting is optional on devices without NumPy
+    np = None
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.timestamps import to_epoch_ms
+from src.database.migrations import migrate
+from src.database.shards import ShardedLog
+
+DEFAULT_WINDOW_DAYS = 28
+DEFAULT_HALF_LIFE_DAYS = 7
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_REVIEW_DAYS = 14
+# Service level z-score for safety stock (95%)
+DEFAULT_SERVICE_Z = 1.65
+
+PREDICTIVE_ALERT_TYPE = 'LOW_STOCK'
+PREDICTIVE_ALERT_SEVERITY = 'MEDIUM'
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Stock forecasting requires NumPy (pip install numpy)")
+
+def forecast_depletion(quantities, max_thresholds, tx_sku, tx_age_days, tx_amount,
+                       window_days=DEFAULT_WINDOW_DAYS, half_life_days=DEFAULT_HALF_LIFE_DAYS,
+                       lead_time_days=DEFAULT_LEAD_TIME_DAYS, review_days=DEFAULT_REVIEW_DAYS,
+                       service_z=DEFAULT_SERVICE_Z):
+    """Project depletion for every SKU in one vectorized pass
+
+    Args:
+        quantities: Current quantity per SKU, shape (n,)
+        max_thresholds: Target stock level per SKU, shape (n,)
+        tx_sku: SKU index of each consumption transaction
+        tx_age_days: Whole days between each transaction and now (0 = today)
+        tx_amount: Units consumed by each transaction (positive)
+
+    Returns:
+        dict: Arrays of shape (n,): rate, std, days_to_zero, reorder_point,
+        suggested_order and predicted_low (bool)
+    """
+    _require_numpy()
+    quantities = np.asarray(quantities, dtype=np.float64)
+    max_thresholds = np.asarray(max_thresholds, dtype=np.float64)
+    tx_sku = np.asarray(tx_sku, dtype=np.int64)
+    tx_age_days = np.asarray(tx_age_days, dtype=np.int64)
+    tx_amount = np.asarray(tx_amount, dtype=np.float64)
+    n = len(quantities)
+
+    # Daily consumption matrix over the window: (n, window_days), column 0 = today
+    in_window = (tx_age_days >= 0) & (tx_age_days < window_days)
+    flat = tx_sku[in_window] * window_days + tx_age_days[in_window]
+    daily = np.bincount(flat, weights=tx_amount[in_window], minlength=n * window_days).reshape(n, window_days)
+
+    weights = 0.5 ** (np.arange(window_days) / half_life_days)
+    rate = daily @ weights / weights.sum()
+    std = daily.std(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_to_zero = np.where(rate > 0, np.maximum(quantities, 0) / rate, np.inf)
+    days_to_zero[quantities <= 0] = 0.0
+
+    safety_stock = service_z * std * np.sqrt(lead_time_days)
+    reorder_point = rate * lead_time_days + safety_stock
+    target = np.maximum(max_thresholds, reorder_point + rate * review_days)
+    needs_order = (quantities <= reorder_point) & (rate > 0)
+    suggested_order = np.where(needs_order, np.ceil(np.maximum(target - quantities, 0)), 0).astype(np.int64)
+    predicted_low = needs_order & (quantities > 0)
+
+    return {
+        'rate': rate,
+        'std': std,
+        'days_to_zero': days_to_zero,
+        'reorder_point': reorder_point,
+        'suggested_order': suggested_order,
+        'predicted_low': predicted_low
+    }
+
+class StockForecaster:
+    def __init__(self, db_path=None, alert_engine=None, window_days=DEFAULT_WINDOW_DAYS,
+                 half_life_days=DEFAULT_HALF_LIFE_DAYS, lead_time_days=DEFAULT_LEAD_TIME_DAYS,
+                 review_days=DEFAULT_REVIEW_DAYS):
+        self.db_path = db_path or project_root / 'barcode_scans.db'
+        self.alert_engine = alert_engine
+        self.window_days = window_days
+        self.half_life_days = half_life_days
+        self.lead_time_days = lead_time_days
+        self.review_days = review_days
+        self.log = ShardedLog(self.db_path)
+
+    def _load(self, cursor, now):
+        """Current stock and windowed consumption, as NumPy arrays"""
+        cursor.execute('SELECT ean, current_quantity, max_threshold FROM inventory_enhanced ORDER BY ean')
+        items = cursor.fetchall()
+        eans = np.array([row[0] for row in items], dtype=str)
+        quantities = np.array([row[1] or 0 for row in items], dtype=np.float64)
+        max_thresholds = np.array([row[2] or 0 for row in items], dtype=np.float64)
+
+        now_ms = to_epoch_ms(now)
+        since_ms = now_ms - self.window_days * 86400000
+        rows = []
+        for conn in self.log.each_segment('inventory_transactions', cursor.connection, since_ms=since_ms):
+            rows += conn.execute('''
+                SELECT ean, (? - timestamp_ms) / 86400000, -quantity_change
+                FROM inventory_transactions
+                WHERE timestamp_ms >= ? AND quantity_change < 0
+            ''', (now_ms, since_ms)).fetchall()
+        if not rows or not len(eans):
+            empty = np.zeros(0, dtype=np.int64)
+            return eans, quantities, max_thresholds, empty, empty, empty
+
+        tx_eans = np.array([row[0] for row in rows], dtype=str)
+        tx_age = np.array([row[1] for row in rows], dtype=np.int64)
+        tx_amount = np.array([row[2] for row in rows], dtype=np.float64)
+
+        # Map transaction EANs onto the sorted inventory EANs
+        tx_sku = np.searchsorted(eans, tx_eans)
+        tx_sku = np.minimum(tx_sku, len(eans) - 1)
+        known = eans[tx_sku] == tx_eans
+        return eans, quantities, max_thresholds, tx_sku[known], tx_age[known], tx_amount[known]
+
+    def run(self, raise_alerts=True):
+        """Forecast every SKU and, optionally, sync predictive LOW_STOCK alerts
+
+        Returns:
+            dict: Result with per-SKU forecasts for the SKUs that need reordering,
+            sorted by days to zero, and alert counts
+        """
+        _require_numpy()
+        migrate(self.db_path)
+        now = datetime.now(timezone.utc)
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        eans, quantities, max_thresholds, tx_sku, tx_age, tx_amount = self._load(cursor, now)
+        forecast = forecast_depletion(
+            quantities, max_thresholds, tx_sku, tx_age, tx_amount,
+            self.window_days, self.half_life_days, self.lead_time_days, self.review_days
+        )
+
+        reorder = []
+        needs_order = np.flatnonzero(forecast['suggested_order'] > 0)
+        for i in needs_order[np.argsort(forecast['days_to_zero'][needs_order], kind='stable')]:
+            reorder.append({
+                'ean': str(eans[i]),
+                'current_quantity': int(quantities[i]),
+                'daily_rate': round(float(forecast['rate'][i]), 3),
+                'days_to_zero': round(float(forecast['days_to_zero'][i]), 1),
+                'reorder_point': round(float(forecast['reorder_point'][i]), 1),
+                'suggested_order': int(forecast['suggested_order'][i])
+            })
+
+        raised = resolved = 0
+        if raise_alerts and self.alert_engine is not None:
+            predicted = {str(eans[i]): i for i in np.flatnonzero(forecast['predicted_low'])}
+            try:
+                for ean, i in predicted.items():
+                    message = (f"Projected to run out in {forecast['days_to_zero'][i]:.1f} days "
+                               f"({forecast['rate'][i]:.2f}/day); suggested order {int(forecast['suggested_order'][i])}")
+                    if self.alert_engine.raise_alert(cursor, ean, PREDICTIVE_ALERT_TYPE, message, PREDICTIVE_ALERT_SEVERITY):
+                        raised += 1
+                cursor.execute("SELECT ean FROM inventory_alerts WHERE alert_type = ? AND status = 'active'",
+                               (PREDICTIVE_ALERT_TYPE,))
+                for (ean,) in cursor.fetchall():
+                    if ean not in predicted and self.alert_engine.resolve(cursor, ean, PREDICTIVE_ALERT_TYPE):
+                        resolved += 1
+                self.alert_engine.commit(conn)
+            except sqlite3.Error:
+                self.alert_engine.rollback(conn)
+                conn.close()
+                raise
+        conn.close()
+
+        return {
+            'success': True,
+            'message': f'Forecast {len(eans)} SKUs: {len(reorder)} need reordering, '
+                       f'{raised} LOW_STOCK alerts raised, {resolved} resolved',
+            'skus': len(eans),
+            'reorder': reorder,
+            'alerts_raised': raised,
+            'alerts_resolved': resolved
+        }
+
+def benchmark(skus=100000, days=365, transactions_per_sku_day=0.3, seed=0):
+    """Time the batch forecast on synthetic history for ``skus`` SKUs over ``days`` days"""
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    count = int(skus * days * transactions_per_sku_day)
+    print(f"Generating {count:,} transactions for {skus:,} SKUs over {days} days...")
+    tx_sku = rng.integers(0, skus, count)
+    tx_age = rng.integers(0, days, count)
+    tx_amount = rng.integers(1, 10, count).astype(np.float64)
+    quantities = rng.integers(0, 200, skus).astype(np.float64)
+    max_thresholds = np.full(skus, 100.0)
+
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        forecast = forecast_depletion(quantities, max_thresholds, tx_sku, tx_age, tx_amount)
+        timings.append(time.perf_counter() - start)
+
+    print(f"Forecast pass: best {min(timings):.3f} s, mean {sum(timings) / len(timings):.3f} s "
+          f"({skus / min(timings):,.0f} SKUs/s)")
+    print(f"SKUs needing reorder: {int((forecast['suggested_order'] > 0).sum()):,}, "
+          f"predicted LOW_STOCK: {int(forecast['predicted_low'].sum()):,}")
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast stock depletion and suggest reorders")
+    parser.add_argument("--no-alerts", action="store_true", help="Do not raise or resolve LOW_STOCK alerts")
+    parser.add_argument("--lead-time", type=int, default=DEFAULT_LEAD_TIME_DAYS, help="Supplier lead time in days")
+    parser.add_argument("--limit", type=int, default=20, help="Reorder suggestions to print")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark on synthetic data instead")
+    parser.add_argument("--skus", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--rate", type=float, default=0.3, help="Benchmark transactions per SKU per day")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.skus, args.days, args.rate)
+        return
+
+    from src.alert_engine import AlertEngine
+    forecaster = StockForecaster(alert_engine=None if args.no_alerts else AlertEngine(), lead_time_days=args.lead_time)
+    result = forecaster.run(raise_alerts=not args.no_alerts)
+    print(result['message'])
+    for item in result['reorder'][:args.limit]:
+        print(f"  {item['ean']}: {item['current_quantity']} left, {item['daily_rate']}/day, "
+              f"{item['days_to_zero']} days to zero, order {item['suggested_order']}")
+
+if __name__ == "__main__":
+    main()
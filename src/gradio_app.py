@@ -8,30 +8,57 @@ import time
 import threading
 import queue
 from datetime import datetime, timezone, timedelta
-from barcode_validator import validate_ean, BarcodeValidationError
 import time
 logger = logging.getLogger(__name__)
 
 current_dir = Path(__file__).resolve().parent
-src_dir = current_dir / 'src'
-sys.path.append(str(src_dir))
-
-from utils.config import load_config
-from iot.hub_client import HubClient
-from database.local_storage import LocalStorage
-from api.api_client import ApiClient
-from inventory_manager import InventoryManager
-from enhanced_device_registration_backup import EnhancedDeviceRegistration
-
-# Initialize database and API client
-local_db = LocalStorage()
-api_client = ApiClient()
-inventory_manager = InventoryManager()
-device_registration = EnhancedDeviceRegistration()
+# Add project root to Python path
+project_root = current_dir.parent
+sys.path.append(str(project_root))
+
+from src.barcode_validator import validate_ean, BarcodeValidationError
+from src.gs1_parser import is_gs1_element_string, parse_gs1
+from src.utils.config import load_config
+from src.utils.lazy import LazySingleton
+from src.iot.hub_client import HubClient
+from src.database.local_storage import LocalStorage
+from src.database.scan_rollups import ScanAnalytics
+from src.database.history_pages import HistoryPages, SOURCES as HISTORY_SOURCES
+from src.api.api_client import ApiClient
+from src.inventory_manager import InventoryManager
+from src.enhanced_device_registration_backup import EnhancedDeviceRegistration
 
 # For testing offline mode
 simulated_offline_mode = False
 
+def patched_is_online_for(client):
+    """
+    Wrap a client's is_online so it respects simulated_offline_mode
+    """
+    orig_is_online = client.is_online
+
+    def patched_is_online():
+        if simulated_offline_mode:
+            return False
+        return orig_is_online()
+
+    return patched_is_online
+
+def create_api_client():
+    client = ApiClient()
+    # Override the is_online method for testing
+    client.is_online = patched_is_online_for(client)
+    return client
+
+# Database, API and registration clients are created on first use so the UI
+# comes up without running schema DDL and config loads at import time
+local_db = LazySingleton(LocalStorage)
+api_client = LazySingleton(create_api_client)
+inventory_manager = LazySingleton(InventoryManager)
+device_registration = LazySingleton(EnhancedDeviceRegistration)
+scan_analytics = LazySingleton(ScanAnalytics)
+history_pages = LazySingleton(HistoryPages)
+
 def simulate_offline_mode():
     """
     Simulate being offline by overriding the is_online method
@@ -52,19 +79,6 @@ def simulate_online_mode():
     result = process_unsent_messages(auto_retry=False)
     return "✅ Online mode restored. Any pending messages will now be sent.\n\n" + (result or "")
 
-# Override the is_online method for testing
-orig_is_online = api_client.is_online
-
-def patched_is_online():
-    """
-    Patched version of is_online that respects simulated_offline_mode
-    """
-    if simulated_offline_mode:
-        return False
-    return orig_is_online()
-    
-api_client.is_online = patched_is_online
-
 # Setup message retry system
 retry_queue = queue.Queue()
 retry_thread = None
@@ -190,9 +204,13 @@ def send_barcode_to_iot_hub(barcode, device_id, quantity=1):
     Enhanced barcode processing with inventory management and device registration
     """
     try:
-        # Validate barcode using the EAN validator
+        # Validate barcode: GS1-128/DataMatrix element strings are parsed,
+        # plain codes go through the EAN validator
         try:
-            barcode = validate_ean(barcode)
+            if is_gs1_element_string(barcode):
+                parse_gs1(barcode)
+            else:
+                barcode = validate_ean(barcode)
         except BarcodeValidationError as e:
             return f"❌ Error: {str(e)}"
             
@@ -241,6 +259,9 @@ The device has been registered across all systems and a test barcode has been ge
         elif scan_result['type'] == 'inventory_update':
             inventory_result = scan_result['inventory_result']
             status = scan_result['status']
+            # GS1 scans are booked against their GTIN with the case quantity applied
+            barcode = scan_result['barcode']
+            quantity = inventory_result['quantity_change']
             
             # Check for inventory alerts
             if status['alert_level'] == 'CRITICAL':
@@ -353,7 +374,7 @@ def check_inventory_status(ean):
         if status['exists']:
             return f"""**Inventory Status for EAN: {ean}**
 
-Product: {status.get('product_name', 'Unknown')}
+Product: {status.get('product_name') or 'Unknown'}
 Current Quantity: {status['current_quantity']}
 Alert Level: {status['alert_level']}
 Status: {status['message']}"""
@@ -379,45 +400,131 @@ def get_inventory_alerts():
     except Exception as e:
         return f"❌ Error getting alerts: {str(e)}"
 
+def _item_label(item):
+    """EAN with the catalogue product name when known"""
+    if item.get('product_name'):
+        return f"{item['ean']} ({item['product_name']})"
+    return item['ean']
+
+# Items listed per status section on the dashboard
+REPORT_SECTION_LIMIT = 20
+
 def get_inventory_report():
-    """Generate inventory report"""
+    """Generate inventory report from the materialized status counters"""
     try:
-        items = inventory_manager.get_inventory_report()
-        if not items:
+        summary = inventory_manager.get_status_summary()
+        if not any(summary.values()):
             return "No inventory items found"
         
         report = "**Inventory Report:**\n\n"
         
-        # Group by status
-        critical = [item for item in items if item['status'] == 'CRITICAL']
-        out_of_stock = [item for item in items if item['status'] == 'OUT_OF_STOCK']
-        low_stock = [item for item in items if item['status'] == 'LOW_STOCK']
-        normal = [item for item in items if item['status'] == 'NORMAL']
-        
-        if critical:
-            report += "🚨 **CRITICAL (Negative Stock):**\n"
-            for item in critical:
-                report += f"- {item['ean']}: {item['current_quantity']}\n"
-            report += "\n"
-        
-        if out_of_stock:
-            report += "❌ **OUT OF STOCK:**\n"
-            for item in out_of_stock:
-                report += f"- {item['ean']}: {item['current_quantity']}\n"
+        sections = [
+            ('CRITICAL', "🚨 **CRITICAL (Negative Stock):**"),
+            ('OUT_OF_STOCK', "❌ **OUT OF STOCK:**"),
+            ('LOW_STOCK', "⚠️ **LOW STOCK:**")
+        ]
+        for status, heading in sections:
+            count = summary[status]
+            if not count:
+                continue
+            report += f"{heading} {count} items\n"
+            for item in inventory_manager.get_inventory_report(status, page=1, page_size=REPORT_SECTION_LIMIT):
+                line = f"- {_item_label(item)}: {item['current_quantity']}"
+                if status == 'LOW_STOCK':
+                    line += f" (threshold: {item['min_threshold']})"
+                report += line + "\n"
+            if count > REPORT_SECTION_LIMIT:
+                report += f"- ... and {count - REPORT_SECTION_LIMIT} more (see Browse Inventory)\n"
             report += "\n"
         
-        if low_stock:
-            report += "⚠️ **LOW STOCK:**\n"
-            for item in low_stock:
-                report += f"- {item['ean']}: {item['current_quantity']} (threshold: {item['min_threshold']})\n"
-            report += "\n"
-        
-        report += f"✅ **NORMAL STOCK:** {len(normal)} items\n"
+        report += f"✅ **NORMAL STOCK:** {summary['NORMAL']} items\n"
         
         return report
     except Exception as e:
         return f"❌ Error generating report: {str(e)}"
 
+def browse_inventory(status, page):
+    """Show one page of the full inventory report, optionally for a single status"""
+    try:
+        status = None if status in (None, "ALL") else status
+        page = max(int(page or 1), 1)
+        items = inventory_manager.get_inventory_report(status, page=page)
+        if not items:
+            return f"No items on page {page}"
+        
+        report = f"**Inventory ({status or 'all statuses'}), page {page}:**\n\n"
+        report += "| EAN | Product | Quantity | Threshold | Status |\n|---|---|---|---|---|\n"
+        for item in items:
+            report += (f"| {item['ean']} | {item['product_name'] or ''} | {item['current_quantity']} | "
+                       f"{item['min_threshold']} | {item['status']} |\n")
+        return report
+    except Exception as e:
+        return f"❌ Error browsing inventory: {str(e)}"
+
+def get_scan_analytics(granularity, days, device_id, ean):
+    """Scan throughput chart and totals, read from the rollup tables"""
+    import pandas as pd
+    
+    columns = ["bucket", "scans", "quantity"]
+    try:
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=float(days or 1))
+        granularity = None if granularity == "auto" else granularity
+        rows = scan_analytics.throughput(
+            granularity, start, end,
+            device_id=device_id.strip() or None if device_id else None,
+            barcode=ean.strip() or None if ean else None
+        )
+        frame = pd.DataFrame(
+            [(datetime.fromtimestamp(row['bucket_start'], timezone.utc), row['scans'], row['quantity']) for row in rows],
+            columns=columns
+        )
+        if not rows:
+            return frame, "No scans in this period"
+        
+        summary = f"**{frame['scans'].sum()} scans, quantity {frame['quantity'].sum()}** over {len(rows)} buckets\n\n"
+        busiest = frame.loc[frame['scans'].idxmax()]
+        summary += f"Busiest bucket: {busiest['bucket']:%Y-%m-%d %H:%M} UTC ({busiest['scans']} scans)\n\n"
+        if not device_id:
+            summary += "**Top devices:**\n"
+            for row in scan_analytics.top('device', start, end, limit=5):
+                summary += f"- {row['device_id']}: {row['scans']} scans\n"
+        if not ean:
+            summary += "\n**Top EANs:**\n"
+            for row in scan_analytics.top('ean', start, end, limit=5):
+                summary += f"- {row['barcode']}: {row['scans']} scans\n"
+        return frame, summary
+    except Exception as e:
+        return pd.DataFrame(columns=columns), f"❌ Error loading analytics: {str(e)}"
+
+def browse_history(source, device_id, ean, since, until, page_size, cursor=None):
+    """Show one keyset page of history; returns the table and the cursor for the next page"""
+    try:
+        result = history_pages.page(
+            source, cursor, int(page_size or 50),
+            device_id=device_id.strip() or None if device_id else None,
+            ean=ean.strip() or None if ean else None,
+            since=since.strip() or None if since else None,
+            until=until.strip() or None if until else None
+        )
+        if not result['success']:
+            return f"❌ {result['message']}", None
+        if not result['items']:
+            return f"No {source} found", None
+        
+        columns = HISTORY_SOURCES[source]['columns']
+        table = f"**{source.title()}** (newest first)\n\n"
+        table += "| # | " + " | ".join(columns) + " |\n"
+        table += "|---" * (len(columns) + 1) + "|\n"
+        for item in result['items']:
+            values = ["" if item[column] is None else str(item[column]).replace("|", "\\|") for column in columns]
+            table += f"| {item['id']} | " + " | ".join(values) + " |\n"
+        if not result['has_more']:
+            table += "\n*End of history*"
+        return table, result['next_cursor']
+    except Exception as e:
+        return f"❌ Error browsing history: {str(e)}", None
+
 def register_new_device_manual(device_id, device_name):
     """Manually register a new device"""
     try:
@@ -500,6 +607,16 @@ with gr.Blocks(title="Enhanced Barcode Scanner & Inventory Management") as app:
                     gr.Markdown("## Inventory Report")
                     generate_report_button = gr.Button("Generate Inventory Report")
                     report_output = gr.Markdown("")
+                    
+                    gr.Markdown("## Browse Inventory")
+                    with gr.Row():
+                        browse_status_input = gr.Dropdown(
+                            choices=["ALL", "CRITICAL", "OUT_OF_STOCK", "LOW_STOCK", "NORMAL"],
+                            value="ALL", label="Status"
+                        )
+                        browse_page_input = gr.Number(value=1, precision=0, label="Page")
+                    browse_button = gr.Button("Show Page")
+                    browse_output = gr.Markdown("")
         
         # Device Registration tab
         with gr.TabItem("Device Registration"):
@@ -524,6 +641,37 @@ with gr.Blocks(title="Enhanced Barcode Scanner & Inventory Management") as app:
                     
                     **Test Barcode Format:** TEST_{device_id}_{date}
                     """)
+        
+        # Scan Analytics tab
+        with gr.TabItem("Scan Analytics"):
+            with gr.Row():
+                analytics_granularity_input = gr.Dropdown(
+                    choices=["auto", "minute", "hour", "day"], value="auto", label="Granularity"
+                )
+                analytics_days_input = gr.Number(value=7, label="Days")
+                analytics_device_input = gr.Textbox(label="Device ID", placeholder="All devices")
+                analytics_ean_input = gr.Textbox(label="EAN", placeholder="All EANs (leave Device ID empty)")
+            analytics_button = gr.Button("Show Throughput", variant="primary")
+            analytics_plot = gr.LinePlot(x="bucket", y="scans", title="Scans per bucket")
+            analytics_output = gr.Markdown("")
+            
+        # History tab
+        with gr.TabItem("History"):
+            with gr.Row():
+                history_source_input = gr.Dropdown(
+                    choices=list(HISTORY_SOURCES), value="scans", label="History"
+                )
+                history_device_input = gr.Textbox(label="Device ID", placeholder="All devices")
+                history_ean_input = gr.Textbox(label="EAN", placeholder="All EANs")
+            with gr.Row():
+                history_since_input = gr.Textbox(label="Since (ISO)", placeholder="e.g. 2025-07-01T00:00:00")
+                history_until_input = gr.Textbox(label="Until (ISO)", placeholder="Now")
+                history_page_size_input = gr.Number(value=50, precision=0, label="Rows per page")
+            with gr.Row():
+                history_first_button = gr.Button("First Page", variant="primary")
+                history_next_button = gr.Button("Next Page")
+            history_cursor = gr.State(None)
+            history_output = gr.Markdown("")
             
     # Add the offline simulation button handlers INSIDE the Blocks context
     simulate_offline_button.click(
@@ -581,6 +729,31 @@ with gr.Blocks(title="Enhanced Barcode Scanner & Inventory Management") as app:
         outputs=[report_output]
     )
     
+    browse_button.click(
+        fn=browse_inventory,
+        inputs=[browse_status_input, browse_page_input],
+        outputs=[browse_output]
+    )
+    
+    analytics_button.click(
+        fn=get_scan_analytics,
+        inputs=[analytics_granularity_input, analytics_days_input, analytics_device_input, analytics_ean_input],
+        outputs=[analytics_plot, analytics_output]
+    )
+    
+    history_inputs = [history_source_input, history_device_input, history_ean_input,
+                      history_since_input, history_until_input, history_page_size_input]
+    history_first_button.click(
+        fn=browse_history,
+        inputs=history_inputs,
+        outputs=[history_output, history_cursor]
+    )
+    history_next_button.click(
+        fn=lambda *args: browse_history(*args) if args[-1] is not None else ("*End of history*", None),
+        inputs=history_inputs + [history_cursor],
+        outputs=[history_output, history_cursor]
+    )
+    
     # Device Registration event handlers
     register_device_button.click(
         fn=register_new_device_manual,
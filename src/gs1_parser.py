@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+GS1 application identifier (AI) parser for GS1-128, GS1 DataMatrix and GS1 QR codes.
+
+Scanners transmit these symbols as an element string: a sequence of AIs and
+their data, with variable-length fields terminated by FNC1 (sent as the GS
+character, 0x1D). The AI table below is compiled at import time into two
+lookups, AI length by two-digit prefix and field spec by AI, so parsing
+is a single left-to-right pass with no regex or backtracking.
+"""
+
+import re
+import sys
+import json
+import calendar
+from pathlib import Path
+from collections import namedtuple
+from datetime import date
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.barcode_validator import BarcodeValidationError, has_valid_check_digit, is_numeric
+
+GS = "\x1d"
+
+# Symbology identifiers some scanners prefix to the data (GS1-128, DataMatrix, QR, DataBar)
+SYMBOLOGY_IDENTIFIERS = ("]C1", "]d2", "]Q3", "]e0")
+
+class GS1ParseError(BarcodeValidationError):
+    """Raised when a GS1 element string cannot be parsed"""
+    pass
+
+AISpec = namedtuple("AISpec", ["ai", "name", "numeric", "length", "fixed", "decimals"])
+
+# (AI, field name, numeric, length, fixed length)
+_AI_DEFINITIONS = [
+    ("00", "sscc", True, 18, True),
+    ("01", "gtin", True, 14, True),
+    ("02", "content_gtin", True, 14, True),
+    ("10", "batch", False, 20, False),
+    ("11", "production_date", True, 6, True),
+    ("12", "due_date", True, 6, True),
+    ("13", "packaging_date", True, 6, True),
+    ("15", "best_before", True, 6, True),
+    ("16", "sell_by", True, 6, True),
+    ("17", "expiry", True, 6, True),
+    ("20", "variant", True, 2, True),
+    ("21", "serial", False, 20, False),
+    ("22", "consumer_product_variant", False, 20, False),
+    ("240", "additional_id", False, 30, False),
+    ("241", "customer_part_number", False, 30, False),
+    ("250", "secondary_serial", False, 30, False),
+    ("30", "count", True, 8, False),
+    ("37", "count", True, 8, False),
+    ("400", "order_number", False, 30, False),
+    ("401", "consignment_number", False, 30, False),
+    ("403", "routing_code", False, 30, False),
+    ("410", "ship_to_gln", True, 13, True),
+    ("411", "bill_to_gln", True, 13, True),
+    ("412", "purchased_from_gln", True, 13, True),
+    ("413", "ship_for_gln", True, 13, True),
+    ("414", "location_gln", True, 13, True),
+    ("415", "invoicing_party_gln", True, 13, True),
+    ("420", "ship_to_postal_code", False, 20, False),
+    ("422", "origin_country", True, 3, True),
+    ("7003", "expiry_time", True, 10, True),
+    ("8005", "price_per_unit", True, 6, True),
+    ("8020", "payment_slip_reference", False, 25, False),
+]
+
+# Measure AIs with an implied decimal point: the fourth digit is the number of decimals
+_DECIMAL_AI_PREFIXES = {
+    "310": "net_weight_kg",
+    "311": "length_m",
+    "320": "net_weight_lb",
+    "330": "gross_weight_kg",
+    "390": "amount_payable",
+    "392": "price",
+}
+
+# AI length by two-digit prefix; AIs not listed here are rejected
+_AI_LENGTH_BY_PREFIX_RANGES = [
+    (("00", "01", "02", "10", "11", "12", "13", "15", "16", "17", "20", "21", "22", "30", "37"), 2),
+    (("24", "25", "40", "41", "42"), 3),
+    (("31", "32", "33", "39", "70", "80"), 4),
+    (tuple(str(prefix) for prefix in range(90, 100)), 2),
+]
+
+def _compile_tables():
+    table = {}
+    for ai, name, numeric, length, fixed in _AI_DEFINITIONS:
+        table[ai] = AISpec(ai, name, numeric, length, fixed, None)
+    for prefix, name in _DECIMAL_AI_PREFIXES.items():
+        fixed = not prefix.startswith("39")
+        for decimals in range(10):
+            ai = f"{prefix}{decimals}"
+            table[ai] = AISpec(ai, name, True, 6 if fixed else 15, fixed, decimals)
+    # Company internal information
+    for prefix in range(90, 100):
+        table[str(prefix)] = AISpec(str(prefix), f"internal_{prefix}", False, 90 if prefix > 90 else 30, False, None)
+
+    lengths = {}
+    for prefixes, length in _AI_LENGTH_BY_PREFIX_RANGES:
+        for prefix in prefixes:
+            lengths[prefix] = length
+    return table, lengths
+
+AI_TABLE, AI_LENGTH_BY_PREFIX = _compile_tables()
+
+_HUMAN_READABLE = re.compile(r"\((\d{2,4})\)([^(]*)")
+
+def is_gs1_element_string(data):
+    """Whether ``data`` looks like a GS1 element string rather than a plain EAN/UPC"""
+    if not data:
+        return False
+    if data.startswith(SYMBOLOGY_IDENTIFIERS) or GS in data or data.startswith("("):
+        return True
+    # Unbracketed element strings longer than a GTIN-14, starting with a known fixed-length AI
+    return len(data) > 14 and data[:2] in ("00", "01", "02")
+
+def _strip_prefix(data):
+    if data.startswith(SYMBOLOGY_IDENTIFIERS):
+        data = data[3:]
+    return data.lstrip(GS)
+
+def parse_element_string(data):
+    """Split a GS1 element string into its AIs
+
+    Accepts the raw scanner output (optionally with a symbology identifier)
+    as well as the human-readable ``(01)...(10)...`` form.
+
+    Returns:
+        dict: AI -> raw data string, in scan order
+
+    Raises:
+        GS1ParseError: On unknown AIs, truncated or over-long fields, or
+            non-numeric data in numeric fields
+    """
+    data = _strip_prefix(data.strip())
+    if data.startswith("("):
+        return _parse_human_readable(data)
+
+    ais = {}
+    i = 0
+    end = len(data)
+    while i < end:
+        if data[i] == GS:
+            i += 1
+            continue
+
+        ai_length = AI_LENGTH_BY_PREFIX.get(data[i:i + 2])
+        ai = data[i:i + ai_length] if ai_length else data[i:i + 2]
+        spec = AI_TABLE.get(ai)
+        if spec is None:
+            raise GS1ParseError(f"Unknown application identifier ({ai}) at position {i}")
+        i += len(ai)
+
+        if spec.fixed:
+            value = data[i:i + spec.length]
+            if len(value) < spec.length or GS in value:
+                raise GS1ParseError(f"AI ({ai}) requires {spec.length} characters")
+            i += spec.length
+        else:
+            field_end = data.find(GS, i)
+            if field_end == -1:
+                field_end = end
+            value = data[i:field_end]
+            if not value or len(value) > spec.length:
+                raise GS1ParseError(f"AI ({ai}) must be 1 to {spec.length} characters, got {len(value)}")
+            i = field_end
+
+        _store(ais, spec, value)
+    return ais
+
+def _parse_human_readable(data):
+    ais = {}
+    for ai, value in _HUMAN_READABLE.findall(data):
+        spec = AI_TABLE.get(ai)
+        if spec is None:
+            raise GS1ParseError(f"Unknown application identifier ({ai})")
+        value = value.strip()
+        if (spec.fixed and len(value) != spec.length) or not value or len(value) > spec.length:
+            raise GS1ParseError(f"AI ({ai}) has invalid length {len(value)}")
+        _store(ais, spec, value)
+    if not ais:
+        raise GS1ParseError("No application identifiers found")
+    return ais
+
+def _store(ais, spec, value):
+    if spec.numeric and not is_numeric(value):
+        raise GS1ParseError(f"AI ({spec.ai}) must be numeric")
+    if spec.ai in ais and ais[spec.ai] != value:
+        raise GS1ParseError(f"AI ({spec.ai}) appears twice with different values")
+    ais[spec.ai] = value
+
+def _parse_date(value, today=None):
+    """Convert a GS1 YYMMDD date to ISO format; day 00 means the last day of the month"""
+    today = today or date.today()
+    year, month, day = int(value[0:2]), int(value[2:4]), int(value[4:6])
+    # GS1 century rule: the year is within 49 years in the past or 50 in the future
+    year += today.year - today.year % 100
+    if year - today.year > 50:
+        year -= 100
+    elif today.year - year > 49:
+        year += 100
+    if not 1 <= month <= 12:
+        raise GS1ParseError(f"Invalid month in date {value}")
+    if day == 0:
+        day = calendar.monthrange(year, month)[1]
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        raise GS1ParseError(f"Invalid date {value}")
+
+def parse_gs1(data):
+    """Parse a GS1 barcode into structured fields
+
+    Returns:
+        dict: ``gtin`` (AI 01, or AI 02 for the contained items of a
+        logistic unit), ``quantity`` (AI 30/37, 1 when absent), ``batch``,
+        ``serial``, ``expiry``, ``best_before`` and ``production_date`` (ISO
+        dates), ``sscc``, measures such as ``net_weight_kg``, and ``ais``
+        with every raw AI value
+
+    Raises:
+        GS1ParseError: If the data is malformed or a GTIN/SSCC check digit is wrong
+    """
+    ais = parse_element_string(data)
+    fields = {}
+    for ai, value in ais.items():
+        spec = AI_TABLE[ai]
+        if spec.decimals is not None:
+            fields[spec.name] = int(value) / 10 ** spec.decimals
+        elif spec.name.endswith("_date") or spec.name in ("expiry", "best_before", "sell_by"):
+            fields[spec.name] = _parse_date(value)
+        else:
+            fields[spec.name] = value
+
+    for key in ("gtin", "content_gtin", "sscc"):
+        if key in fields and not has_valid_check_digit(fields[key]):
+            raise GS1ParseError(f"Invalid check digit in {key} {fields[key]}")
+
+    count = fields.pop("count", None)
+    result = {
+        "gtin": fields.pop("gtin", None) or fields.get("content_gtin"),
+        "quantity": int(count) if count is not None else 1,
+        "batch": fields.pop("batch", None),
+        "serial": fields.pop("serial", None),
+        "expiry": fields.pop("expiry", None),
+        "ais": ais
+    }
+    result.update(fields)
+    if count is not None and int(count) <= 0:
+        raise GS1ParseError("Count (AI 30/37) must be positive")
+    return result
+
+def gs1_transaction_notes(parsed):
+    """Lot, serial and date fields of a parsed GS1 scan as a JSON note"""
+    keys = ("batch", "serial", "expiry", "best_before", "production_date", "sscc")
+    details = {key: parsed[key] for key in keys if parsed.get(key)}
+    if parsed["quantity"] != 1:
+        details["case_quantity"] = parsed["quantity"]
+    return json.dumps(details) if details else None
+
+def main():
+    """Parse the element strings given on the command line"""
+    if len(sys.argv) < 2:
+        print("Usage: python src/gs1_parser.py '(01)09501101530003(17)261231(10)LOT42(37)24'")
+        sys.exit(1)
+    for data in sys.argv[1:]:
+        # Allow typing FNC1 as \x1d or <GS> on the command line
+        data = data.replace("\\x1d", GS).replace("<GS>", GS)
+        try:
+            print(json.dumps(parse_gs1(data), indent=2))
+        except GS1ParseError as e:
+            print(f"{data!r}: {e}")
+
+if __name__ == "__main__":
+    main()
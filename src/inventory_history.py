@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Point-in-time inventory from the transaction log.
+
+``inventory_transactions`` is an append-only log of every quantity change.
+This module adds periodic snapshots of the per-EAN quantity, each anchored
+to the last transaction id it includes. An as-of query starts from the
+nearest snapshot at or before the requested point and replays only the
+transactions after it.
+
+Quantities are replayed from the deltas. An EAN that is not in the starting
+snapshot starts from the ``previous_quantity`` of its first replayed
+transaction, which also covers items migrated in before they had any
+transactions.
+
+With log sharding enabled (database/shards.py) the transactions are read
+from the shard files that overlap the replayed id range. Shards dropped by
+retention are always covered by a snapshot, so rebuilds start from the
+first snapshot after the gap, and as-of queries that would need the dropped
+transactions raise ValueError.
+
+    python src/inventory_history.py snapshot
+    python src/inventory_history.py as-of 2025-07-30T12:00:00 [--ean EAN]
+    python src/inventory_history.py rebuild [--dry-run]
+"""
+
+import sys
+import json
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.timestamps import to_epoch_ms
+from src.database.migrations import migrate
+from src.database.shards import ShardedLog
+
+# Take a snapshot automatically after this many transactions
+SNAPSHOT_INTERVAL = 10000
+# Number of snapshots kept when pruning
+SNAPSHOT_RETENTION = 30
+REPLAY_FETCH_SIZE = 10000
+
+def _replay(rows, state):
+    """Apply ``(ean, previous_quantity, quantity_change)`` rows to ``state`` in place"""
+    for ean, previous_quantity, quantity_change in rows:
+        quantity = state.get(ean)
+        if quantity is None:
+            quantity = previous_quantity or 0
+        state[ean] = quantity + (quantity_change or 0)
+    return state
+
+class InventoryHistory:
+    def __init__(self, db_path=None, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.db_path = db_path or project_root / 'barcode_scans.db'
+        self.snapshot_interval = snapshot_interval
+        self._last_snapshot_tx = None
+        self._snapshot_lock = threading.Lock()
+        self._init_db()
+        self.log = ShardedLog(self.db_path)
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def _init_db(self):
+        migrate(self.db_path)
+
+    def _boundary_id(self, cursor, as_of):
+        """Last transaction id at or before ``as_of`` (None means the latest)"""
+        if as_of is None:
+            query, params, bounds = 'SELECT MAX(id) FROM inventory_transactions', (), {}
+        else:
+            epoch_ms = to_epoch_ms(as_of)
+            if epoch_ms is None:
+                raise ValueError(f"Invalid timestamp: {as_of}")
+            query = 'SELECT MAX(id) FROM inventory_transactions WHERE timestamp_ms <= ?'
+            params, bounds = (epoch_ms,), {'until_ms': epoch_ms}
+        boundary_id = 0
+        for conn in self.log.each_segment('inventory_transactions', cursor.connection, newest_first=True, **bounds):
+            boundary_id = conn.execute(query, params).fetchone()[0]
+            if boundary_id is not None:
+                break
+        boundary_id = boundary_id or 0
+
+        missing = self.log.missing_ids(cursor, 'inventory_transactions')
+        if missing and boundary_id <= missing[1]:
+            # The point falls after the main database rows but into shards dropped by retention
+            settings = self.log.settings(cursor, 'inventory_transactions')
+            if as_of is None or epoch_ms >= settings['dropped_through_ms']:
+                return missing[1]
+            if epoch_ms > (settings['base_last_ms'] or 0):
+                raise ValueError(f"Transactions {missing[0] + 1}-{missing[1]} around {as_of} were dropped by retention")
+        return boundary_id
+
+    def _nearest_snapshot(self, cursor, boundary_id):
+        cursor.execute('''
+            SELECT id, last_transaction_id FROM inventory_snapshots
+            WHERE last_transaction_id <= ?
+            ORDER BY last_transaction_id DESC LIMIT 1
+        ''', (boundary_id,))
+        return cursor.fetchone() or (None, 0)
+
+    def _replay_range(self, cursor, state, start_id, boundary_id=None, ean=None):
+        """Replay transactions with start_id < id <= boundary_id into ``state``
+
+        Returns:
+            int: Number of transactions replayed
+        """
+        conditions = ['id > ?']
+        params = [start_id]
+        if boundary_id is not None:
+            conditions.append('id <= ?')
+            params.append(boundary_id)
+        if ean is not None:
+            conditions.append('ean = ?')
+            params.append(ean)
+        query = f"""
+            SELECT ean, previous_quantity, quantity_change FROM inventory_transactions
+            WHERE {' AND '.join(conditions)} ORDER BY id
+        """
+        replayed = 0
+        for conn in self.log.each_segment('inventory_transactions', cursor.connection,
+                                          after_id=start_id, through_id=boundary_id):
+            segment = conn.execute(query, params)
+            while True:
+                rows = segment.fetchmany(REPLAY_FETCH_SIZE)
+                if not rows:
+                    break
+                _replay(rows, state)
+                replayed += len(rows)
+        return replayed
+
+    def _state_at(self, cursor, boundary_id, ean=None):
+        snapshot_id, start_id = self._nearest_snapshot(cursor, boundary_id)
+        missing = self.log.missing_ids(cursor, 'inventory_transactions')
+        if missing and start_id < missing[1] and boundary_id > missing[0]:
+            raise ValueError(f"Transactions {missing[0] + 1}-{missing[1]} were dropped by retention "
+                             f"and no snapshot covers transaction {boundary_id}")
+        state = {}
+        if snapshot_id is not None:
+            if ean is None:
+                cursor.execute('SELECT ean, quantity FROM inventory_snapshot_items WHERE snapshot_id = ?', (snapshot_id,))
+            else:
+                cursor.execute('SELECT ean, quantity FROM inventory_snapshot_items WHERE snapshot_id = ? AND ean = ?',
+                               (snapshot_id, ean))
+            state.update(cursor.fetchall())
+
+        self._replay_range(cursor, state, start_id, boundary_id, ean)
+        return state, snapshot_id, start_id
+
+    def quantities_as_of(self, as_of=None):
+        """Quantity of every EAN as of a point in time
+
+        Args:
+            as_of: datetime or ISO timestamp; None for the latest state
+
+        Returns:
+            dict: EAN -> quantity
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        boundary_id = self._boundary_id(cursor, as_of)
+        state, _, _ = self._state_at(cursor, boundary_id)
+        conn.close()
+        return state
+
+    def quantity_as_of(self, ean, as_of=None):
+        """Quantity of one EAN as of a point in time (None if it had no history yet)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        boundary_id = self._boundary_id(cursor, as_of)
+        state, _, _ = self._state_at(cursor, boundary_id, ean)
+        conn.close()
+        return state.get(ean)
+
+    def create_snapshot(self, retention=SNAPSHOT_RETENTION):
+        """Snapshot the replayed quantities up to the latest transaction
+
+        Returns:
+            dict: Result with the snapshot id, anchor transaction and item count
+        """
+        with self._snapshot_lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            # Hold the write lock so no transaction lands between replay and insert
+            cursor.execute('BEGIN IMMEDIATE')
+            boundary_id = self._boundary_id(cursor, None)
+            state, snapshot_id, start_id = self._state_at(cursor, boundary_id)
+            if snapshot_id is not None and start_id == boundary_id:
+                conn.rollback()
+                conn.close()
+                self._last_snapshot_tx = boundary_id
+                return {'success': True, 'message': 'Latest snapshot is up to date', 'snapshot_id': snapshot_id,
+                        'last_transaction_id': boundary_id, 'item_count': len(state)}
+
+            cursor.execute('''
+                INSERT INTO inventory_snapshots (taken_at, last_transaction_id, item_count)
+                VALUES (?, ?, ?)
+            ''', (datetime.now(timezone.utc).isoformat(), boundary_id, len(state)))
+            snapshot_id = cursor.lastrowid
+            cursor.executemany(
+                'INSERT INTO inventory_snapshot_items (snapshot_id, ean, quantity) VALUES (?, ?, ?)',
+                ((snapshot_id, ean, quantity) for ean, quantity in state.items())
+            )
+            self._prune(cursor, retention)
+            conn.commit()
+            conn.close()
+            self._last_snapshot_tx = boundary_id
+            return {'success': True, 'message': f'Snapshot {snapshot_id} taken at transaction {boundary_id}',
+                    'snapshot_id': snapshot_id, 'last_transaction_id': boundary_id, 'item_count': len(state)}
+
+    def _prune(self, cursor, retention):
+        if not retention:
+            return
+        cursor.execute('''
+            SELECT id FROM inventory_snapshots ORDER BY last_transaction_id DESC LIMIT -1 OFFSET ?
+        ''', (retention,))
+        old_ids = [(row[0],) for row in cursor.fetchall()]
+        cursor.executemany('DELETE FROM inventory_snapshot_items WHERE snapshot_id = ?', old_ids)
+        cursor.executemany('DELETE FROM inventory_snapshots WHERE id = ?', old_ids)
+
+    def maybe_snapshot(self, transaction_id):
+        """Take a snapshot when ``snapshot_interval`` transactions have accumulated"""
+        if not self.snapshot_interval:
+            return None
+        if self._last_snapshot_tx is None:
+            conn = self._get_connection()
+            row = conn.execute('SELECT MAX(last_transaction_id) FROM inventory_snapshots').fetchone()
+            conn.close()
+            self._last_snapshot_tx = row[0] or 0
+        if transaction_id - self._last_snapshot_tx < self.snapshot_interval:
+            return None
+        return self.create_snapshot()
+
+    def rebuild(self, dry_run=False):
+        """Recompute inventory_enhanced quantities from the log in one streaming pass
+
+        Items whose quantity differs from the replayed log are corrected;
+        items that appear only in the log are inserted. Items without any
+        transactions are left alone.
+
+        Returns:
+            dict: Result with transaction, corrected and inserted counts and the drift found
+
+        Raises:
+            ValueError: Transactions were dropped by retention without a snapshot after them
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        state = {}
+        start_id = 0
+        start = ''
+        missing = self.log.missing_ids(cursor, 'inventory_transactions')
+        if missing:
+            # The log before this point was dropped by retention: start from the first snapshot after it
+            cursor.execute('''
+                SELECT id, last_transaction_id FROM inventory_snapshots
+                WHERE last_transaction_id >= ? ORDER BY last_transaction_id LIMIT 1
+            ''', (missing[1],))
+            row = cursor.fetchone()
+            if row is None:
+                conn.rollback()
+                conn.close()
+                raise ValueError(f"Transactions {missing[0] + 1}-{missing[1]} were dropped by retention "
+                                 f"and no snapshot covers them")
+            snapshot_id, start_id = row
+            cursor.execute('SELECT ean, quantity FROM inventory_snapshot_items WHERE snapshot_id = ?', (snapshot_id,))
+            state.update(cursor.fetchall())
+            start = f' from snapshot {snapshot_id}'
+        replayed = self._replay_range(cursor, state, start_id)
+
+        cursor.execute('SELECT ean, current_quantity FROM inventory_enhanced')
+        current = dict(cursor.fetchall())
+        drift = {ean: {'stored': current[ean], 'replayed': quantity}
+                 for ean, quantity in state.items() if ean in current and current[ean] != quantity}
+        missing = [ean for ean in state if ean not in current]
+
+        if not dry_run:
+            now = datetime.now(timezone.utc).isoformat()
+            cursor.executemany(
+                'UPDATE inventory_enhanced SET current_quantity = ?, last_updated = ? WHERE ean = ?',
+                [(values['replayed'], now, ean) for ean, values in drift.items()]
+            )
+            cursor.executemany(
+                'INSERT INTO inventory_enhanced (ean, current_quantity, last_updated) VALUES (?, ?, ?)',
+                [(ean, state[ean], now) for ean in missing]
+            )
+            conn.commit()
+        else:
+            conn.rollback()
+        conn.close()
+
+        return {
+            'success': True,
+            'message': f'Replayed {replayed} transactions{start}: {len(drift)} items corrected, {len(missing)} inserted'
+                       + (' (dry run)' if dry_run else ''),
+            'transactions': replayed,
+            'corrected': len(drift),
+            'inserted': len(missing),
+            'drift': drift
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Inventory snapshots, as-of queries and rebuilds")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = subparsers.add_parser("snapshot", help="Take a snapshot of the current quantities")
+    snapshot_parser.add_argument("--retention", type=int, default=SNAPSHOT_RETENTION)
+    as_of_parser = subparsers.add_parser("as-of", help="Quantities as of an ISO timestamp")
+    as_of_parser.add_argument("timestamp")
+    as_of_parser.add_argument("--ean")
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recompute inventory_enhanced from the transaction log")
+    rebuild_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        # Go through InventoryManager so status buckets and alerts are rebuilt too
+        from src.inventory_manager import InventoryManager
+        result = InventoryManager().rebuild_from_log(dry_run=args.dry_run)
+        print(result['message'])
+        for ean, values in result['drift'].items():
+            print(f"  {ean}: stored {values['stored']}, log {values['replayed']}")
+        return
+
+    history = InventoryHistory()
+    if args.command == "snapshot":
+        print(history.create_snapshot(args.retention)['message'])
+    elif args.ean:
+        print(f"{args.ean}: {history.quantity_as_of(args.ean, args.timestamp)}")
+    else:
+        print(json.dumps(history.quantities_as_of(args.timestamp), indent=2, sort_keys=True))
+
+if __name__ == "__main__":
+    main()
@@ -10,87 +10,104 @@ import json
 from datetime import datetime, timezone
 from pathlib import Path
 import sys
-import requests
 
 # Add project root to Python path
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from database.local_storage import LocalStorage
-from api.api_client import ApiClient
+from src.database.local_storage import LocalStorage
+from src.database.product_catalogue import GTIN_SQL
+from src.database.migrations import migrate
+from src.database.shards import ShardedLog
+from src.api.api_client import ApiClient
+from src.utils.lazy import lazy_import
+from src.utils.timestamps import to_epoch_ms
+from src.alert_engine import AlertEngine
+from src.inventory_history import InventoryHistory
+from src.gs1_parser import is_gs1_element_string, parse_gs1, gs1_transaction_notes, GS1ParseError
+
+# Imported on first request rather than at startup
+requests = lazy_import("requests")
+# NumPy is only imported when a forecast is requested
+forecasting = lazy_import("forecasting")
 
 logger = logging.getLogger(__name__)
 
+# Stock status buckets, most urgent first
+STOCK_STATUSES = ('CRITICAL', 'OUT_OF_STOCK', 'LOW_STOCK', 'NORMAL')
+DEFAULT_REPORT_PAGE_SIZE = 50
+
+def classify_stock_status(quantity, min_threshold):
+    """Stock status bucket for a quantity; a NULL quantity counts as the column default, 0"""
+    quantity = quantity or 0
+    if quantity < 0:
+        return 'CRITICAL'
+    elif quantity == 0:
+        return 'OUT_OF_STOCK'
+    elif quantity <= (min_threshold or 0):
+        return 'LOW_STOCK'
+    return 'NORMAL'
+
 class InventoryManager:
     def __init__(self):
         self.local_db = LocalStorage()
         self.api_client = ApiClient()
         self.db_path = project_root / 'barcode_scans.db'
         self._init_enhanced_tables()
+        self.alerts = AlertEngine(self.db_path)
+        self.history = InventoryHistory(self.db_path)
+        self.log = ShardedLog(self.db_path)
         
     def _init_enhanced_tables(self):
-        """Initialize enhanced inventory and device tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Enhanced inventory table with product details
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inventory_enhanced (
-                ean TEXT PRIMARY KEY,
-                product_name TEXT,
-                current_quantity INTEGER DEFAULT 0,
-                min_threshold INTEGER DEFAULT 0,
-                max_threshold INTEGER DEFAULT 100,
-                last_updated DATETIME,
-                status TEXT DEFAULT 'active',
-                alerts_enabled BOOLEAN DEFAULT 1
-            )
-        ''')
-        
-        # Device registration table
+        """Initialize enhanced inventory and device tables (applied once by the migration runner)"""
+        migrate(self.db_path)
+        
+    def _rebuild_status_counters(self, cursor):
+        """Recompute every item's stock status and the bucket counts from scratch"""
+        cursor.connection.create_function('classify_stock_status', 2, classify_stock_status, deterministic=True)
+        cursor.execute('UPDATE inventory_enhanced SET stock_status = classify_stock_status(current_quantity, min_threshold)')
+        cursor.execute('DELETE FROM inventory_status_counts')
+        cursor.executemany(
+            'INSERT INTO inventory_status_counts (status, item_count) VALUES (?, 0)',
+            [(status,) for status in STOCK_STATUSES]
+        )
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS device_registry (
-                device_id TEXT PRIMARY KEY,
-                device_name TEXT,
-                connection_string TEXT,
-                registration_date DATETIME,
-                last_seen DATETIME,
-                status TEXT DEFAULT 'active',
-                test_barcode TEXT
+            UPDATE inventory_status_counts SET item_count = (
+                SELECT COUNT(*) FROM inventory_enhanced WHERE stock_status = inventory_status_counts.status
             )
         ''')
         
-        # Inventory transactions table for audit trail
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inventory_transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ean TEXT,
-                device_id TEXT,
-                transaction_type TEXT,
-                quantity_change INTEGER,
-                previous_quantity INTEGER,
-                new_quantity INTEGER,
-                timestamp DATETIME,
-                notes TEXT
+    def _move_status_bucket(self, cursor, previous_status, new_status):
+        """Move one item between status buckets (previous_status is None for new items)"""
+        if previous_status == new_status:
+            return
+        if previous_status is not None:
+            cursor.execute(
+                'UPDATE inventory_status_counts SET item_count = item_count - 1 WHERE status = ?',
+                (previous_status,)
             )
-        ''')
+        cursor.execute(
+            'UPDATE inventory_status_counts SET item_count = item_count + 1 WHERE status = ?',
+            (new_status,)
+        )
         
-        # Alerts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inventory_alerts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ean TEXT,
-                alert_type TEXT,
-                message TEXT,
-                severity TEXT,
-                created_at DATETIME,
-                resolved_at DATETIME,
-                status TEXT DEFAULT 'active'
-            )
-        ''')
+    def rebuild_status_counters(self):
+        """Rebuild the materialized status buckets and stock alerts, e.g. after editing quantities by hand"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        self._rebuild_status_counters(cursor)
+        self.alerts.evaluate_all(cursor)
+        self.alerts.commit(conn)
+        conn.close()
         
-        conn.commit()
+    def get_status_summary(self):
+        """Item counts per stock status, read from the materialized counters"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT status, item_count FROM inventory_status_counts')
+        counts = dict(cursor.fetchall())
         conn.close()
+        return {status: counts.get(status, 0) for status in STOCK_STATUSES}
         
     def check_inventory_status(self, ean):
         """Check current inventory status for a given EAN"""
@@ -98,10 +115,12 @@ class InventoryManager:
         cursor = conn.cursor()
         
         # Get current inventory
-        cursor.execute(
-            'SELECT current_quantity, min_threshold, product_name, status FROM inventory_enhanced WHERE ean = ?',
-            (ean,)
-        )
+        cursor.execute(f'''
+            SELECT ie.current_quantity, ie.min_threshold, COALESCE(ie.product_name, p.name), ie.status
+            FROM inventory_enhanced ie
+            LEFT JOIN products p ON p.gtin = {GTIN_SQL.format(column='ie.ean')}
+            WHERE ie.ean = ?
+        ''', (ean,))
         result = cursor.fetchone()
         
         if not result:
@@ -154,88 +173,100 @@ class InventoryManager:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        status = classify_stock_status(quantity, 0)
         cursor.execute('''
-            INSERT INTO inventory_enhanced (ean, current_quantity, last_updated)
-            VALUES (?, ?, ?)
-        ''', (ean, quantity, datetime.now(timezone.utc).isoformat()))
+            INSERT INTO inventory_enhanced (ean, current_quantity, last_updated, stock_status)
+            VALUES (?, ?, ?, ?)
+        ''', (ean, quantity, datetime.now(timezone.utc).isoformat(), status))
+        self._move_status_bucket(cursor, None, status)
         
         conn.commit()
         conn.close()
         
     def update_inventory(self, ean, quantity_change, device_id, transaction_type='scan', notes=None):
         """Update inventory and create transaction record"""
+        now = datetime.now(timezone.utc)
         conn = sqlite3.connect(self.db_path)
+        # With sharding enabled the transaction row goes into the current shard file
+        shard = self.log.attach(conn, 'inventory_transactions', to_epoch_ms(now))
         cursor = conn.cursor()
         
         # Get current quantity
-        cursor.execute('SELECT current_quantity FROM inventory_enhanced WHERE ean = ?', (ean,))
+        cursor.execute('SELECT current_quantity, min_threshold, stock_status FROM inventory_enhanced WHERE ean = ?', (ean,))
         result = cursor.fetchone()
         
         if result:
-            previous_qty = result[0]
+            previous_qty, min_threshold, previous_status = result
         else:
             # Create new inventory record
             previous_qty = 0
+            min_threshold = 0
+            previous_status = None
             cursor.execute('''
                 INSERT INTO inventory_enhanced (ean, current_quantity, last_updated)
                 VALUES (?, ?, ?)
             ''', (ean, 0, datetime.now(timezone.utc).isoformat()))
             
         new_qty = previous_qty + quantity_change
+        new_status = classify_stock_status(new_qty, min_threshold)
         
         # Update inventory
         cursor.execute('''
             UPDATE inventory_enhanced 
-            SET current_quantity = ?, last_updated = ?
+            SET current_quantity = ?, last_updated = ?, stock_status = ?
             WHERE ean = ?
-        ''', (new_qty, datetime.now(timezone.utc).isoformat(), ean))
+        ''', (new_qty, now.isoformat(), new_status, ean))
+        self._move_status_bucket(cursor, previous_status, new_status)
         
         # Create transaction record
-        cursor.execute('''
-            INSERT INTO inventory_transactions 
-            (ean, device_id, transaction_type, quantity_change, previous_quantity, new_quantity, timestamp, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (ean, device_id, transaction_type, quantity_change, previous_qty, new_qty, 
-              datetime.now(timezone.utc).isoformat(), notes))
-        
-        # Check for alerts
-        if new_qty < 0:
-            self._create_alert(ean, 'NEGATIVE_INVENTORY', 
-                             f'Inventory dropped below zero: {new_qty}', 'CRITICAL')
-        elif new_qty == 0:
-            self._create_alert(ean, 'ZERO_INVENTORY', 
-                             f'Inventory reached zero', 'HIGH')
+        transaction_id = self.log.insert(cursor, shard, 'inventory_transactions', {
+            'ean': ean,
+            'device_id': device_id,
+            'transaction_type': transaction_type,
+            'quantity_change': quantity_change,
+            'previous_quantity': previous_qty,
+            'new_quantity': new_qty,
+            'timestamp': now.isoformat(),
+            'timestamp_ms': to_epoch_ms(now),
+            'notes': notes
+        })
         
-        conn.commit()
-        conn.close()
+        # Raise or auto-resolve stock alerts in the same transaction
+        try:
+            self.alerts.evaluate(cursor, ean, new_qty)
+            self.alerts.commit(conn)
+        except sqlite3.Error:
+            self.alerts.rollback(conn)
+            raise
+        finally:
+            conn.close()
+        
+        # Periodically snapshot quantities so as-of queries replay only recent history
+        self.history.maybe_snapshot(transaction_id)
         
         return {
             'ean': ean,
             'previous_quantity': previous_qty,
             'quantity_change': quantity_change,
             'new_quantity': new_qty,
-            'transaction_type': transaction_type
+            'transaction_type': transaction_type,
+            'status': new_status
         }
         
     def _create_alert(self, ean, alert_type, message, severity):
         """Create an inventory alert"""
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Check if similar alert already exists and is active
-        cursor.execute('''
-            SELECT id FROM inventory_alerts 
-            WHERE ean = ? AND alert_type = ? AND status = 'active'
-        ''', (ean, alert_type))
+        self.alerts.raise_alert(conn.cursor(), ean, alert_type, message, severity)
+        self.alerts.commit(conn)
+        conn.close()
         
-        if not cursor.fetchone():
-            cursor.execute('''
-                INSERT INTO inventory_alerts (ean, alert_type, message, severity, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (ean, alert_type, message, severity, datetime.now(timezone.utc).isoformat()))
-            
-        conn.commit()
+    def evaluate_all_alerts(self):
+        """Re-evaluate stock alerts for every item, e.g. after a batch import"""
+        conn = sqlite3.connect(self.db_path)
+        result = self.alerts.evaluate_all(conn.cursor())
+        self.alerts.commit(conn)
         conn.close()
+        return result
         
     def register_new_device(self, device_id, device_name=None):
         """Register a new device if it doesn't exist in database"""
@@ -329,7 +360,12 @@ class InventoryManager:
         return result[0] if result else None
         
     def process_barcode_scan(self, barcode, device_id, quantity=1):
-        """Process a barcode scan with enhanced inventory management"""
+        """Process a barcode scan with enhanced inventory management
+        
+        GS1-128/DataMatrix scans are booked against their GTIN. A count in
+        AI 30/37 multiplies ``quantity``, so scanning a case label books the
+        whole case. Lot, serial and expiry go into the transaction notes.
+        """
         # First check if it's a test barcode
         if self.api_client.is_test_barcode(barcode):
             return {
@@ -339,6 +375,25 @@ class InventoryManager:
                 'device_id': device_id
             }
             
+        gs1_data = None
+        notes = None
+        if is_gs1_element_string(barcode):
+            try:
+                gs1_data = parse_gs1(barcode)
+            except GS1ParseError as e:
+                return {
+                    'type': 'error',
+                    'message': f'Invalid GS1 barcode: {str(e)}'
+                }
+            if not gs1_data['gtin']:
+                return {
+                    'type': 'error',
+                    'message': 'GS1 barcode does not contain a GTIN (AI 01 or 02)'
+                }
+            barcode = gs1_data['gtin']
+            quantity = quantity * gs1_data['quantity']
+            notes = gs1_transaction_notes(gs1_data)
+            
         # Check if device exists, if not register it
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -355,7 +410,7 @@ class InventoryManager:
             conn.close()
             
         # Update inventory
-        inventory_result = self.update_inventory(barcode, quantity, device_id, 'scan')
+        inventory_result = self.update_inventory(barcode, quantity, device_id, 'scan', notes)
         
         # Check inventory status
         status = self.check_inventory_status(barcode)
@@ -365,79 +420,95 @@ class InventoryManager:
             'inventory_result': inventory_result,
             'status': status,
             'barcode': barcode,
-            'device_id': device_id
+            'device_id': device_id,
+            'gs1': gs1_data
         }
         
-    def get_active_alerts(self):
-        """Get all active inventory alerts"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_inventory_as_of(self, as_of, ean=None):
+        """Quantities as of a point in time, from the nearest snapshot plus later transactions
         
-        cursor.execute('''
-            SELECT ean, alert_type, message, severity, created_at
-            FROM inventory_alerts 
-            WHERE status = 'active'
-            ORDER BY severity DESC, created_at DESC
-        ''')
+        Returns:
+            dict: EAN -> quantity, or the quantity of ``ean`` when given
+        """
+        if ean is not None:
+            return self.history.quantity_as_of(ean, as_of)
+        return self.history.quantities_as_of(as_of)
         
-        alerts = []
-        for row in cursor.fetchall():
-            alerts.append({
-                'ean': row[0],
-                'alert_type': row[1],
-                'message': row[2],
-                'severity': row[3],
-                'created_at': row[4]
-            })
-            
-        conn.close()
-        return alerts
+    def rebuild_from_log(self, dry_run=False):
+        """Recompute inventory_enhanced from inventory_transactions, then status buckets and alerts"""
+        try:
+            result = self.history.rebuild(dry_run)
+        except ValueError as e:
+            return {'success': False, 'message': f'Rebuild failed: {str(e)}', 'drift': {}}
+        if not dry_run:
+            self.rebuild_status_counters()
+        return result
+        
+    def forecast_stock(self, raise_alerts=True, lead_time_days=None):
+        """Project days-to-zero for every item and raise predictive LOW_STOCK alerts
+        
+        Returns:
+            dict: Result with reorder suggestions sorted by days to zero
+        """
+        try:
+            forecaster = forecasting.StockForecaster(
+                self.db_path, self.alerts,
+                lead_time_days=lead_time_days or forecasting.DEFAULT_LEAD_TIME_DAYS
+            )
+            return forecaster.run(raise_alerts)
+        except (RuntimeError, sqlite3.Error) as e:
+            return {'success': False, 'message': f'Forecast failed: {str(e)}', 'reorder': []}
+        
+    def get_active_alerts(self):
+        """Get all active inventory alerts, most severe first"""
+        return self.alerts.get_active_alerts()
         
     def resolve_alert(self, ean, alert_type):
         """Resolve an active alert"""
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.alerts.resolve(conn.cursor(), ean, alert_type)
+        self.alerts.commit(conn)
+        conn.close()
         
-        cursor.execute('''
-            UPDATE inventory_alerts 
-            SET status = 'resolved', resolved_at = ?
-            WHERE ean = ? AND alert_type = ? AND status = 'active'
-        ''', (datetime.now(timezone.utc).isoformat(), ean, alert_type))
+    def get_inventory_report(self, status=None, page=None, page_size=DEFAULT_REPORT_PAGE_SIZE):
+        """Generate inventory report
         
-        conn.commit()
-        conn.close()
+        Args:
+            status (str): Only include items in this stock status bucket
+            page (int): 1-based page number; None returns every matching item
+            page_size (int): Items per page
         
-    def get_inventory_report(self):
-        """Generate comprehensive inventory report"""
+        Returns:
+            list: Items ordered by quantity, lowest first
+        """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Get all inventory items with their status
-        cursor.execute('''
-            SELECT ean, product_name, current_quantity, min_threshold, last_updated
-            FROM inventory_enhanced
-            ORDER BY current_quantity ASC
-        ''')
+        query = f'''
+            SELECT ie.ean, COALESCE(ie.product_name, p.name), ie.current_quantity, ie.min_threshold,
+                   ie.last_updated, ie.stock_status
+            FROM inventory_enhanced ie
+            LEFT JOIN products p ON p.gtin = {GTIN_SQL.format(column='ie.ean')}
+        '''
+        params = []
+        if status is not None:
+            query += ' WHERE ie.stock_status = ?'
+            params.append(status)
+        query += ' ORDER BY ie.current_quantity ASC, ie.ean ASC'
+        if page is not None:
+            query += ' LIMIT ? OFFSET ?'
+            params.extend([page_size, (max(page, 1) - 1) * page_size])
+        cursor.execute(query, params)
         
         items = []
         for row in cursor.fetchall():
-            ean, product_name, current_qty, min_threshold, last_updated = row
-            
-            if current_qty < 0:
-                status = 'CRITICAL'
-            elif current_qty == 0:
-                status = 'OUT_OF_STOCK'
-            elif current_qty <= min_threshold:
-                status = 'LOW_STOCK'
-            else:
-                status = 'NORMAL'
-                
+            ean, product_name, current_qty, min_threshold, last_updated, stock_status = row
             items.append({
                 'ean': ean,
                 'product_name': product_name,
                 'current_quantity': current_qty,
                 'min_threshold': min_threshold,
-                'status': status,
+                'status': stock_status or classify_stock_status(current_qty, min_threshold),
                 'last_updated': last_updated
             })
             
@@ -449,7 +520,7 @@ def main():
     manager = InventoryManager()
     
     # Test the problematic EAN
-    ean = "23541523652145"
+    ean = "23541523652143"
     print(f"Checking inventory for EAN: {ean}")
     status = manager.check_inventory_status(ean)
     print(json.dumps(status, indent=2))
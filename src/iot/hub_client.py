@@ -1,12 +1,11 @@
-from azure.iot.device import IoTHubDeviceClient, Message
-from azure.iot.device.exceptions import ConnectionDroppedError, ConnectionFailedError
 import json
 import logging
 from datetime import datetime, timezone, timedelta
 import time
 import traceback
 import threading
-import redis
+
+# azure.iot.device and redis are imported on first use to keep startup fast
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,7 +23,8 @@ class HubClient:
         self.connection_string = connection_string
         self.client = None
         self.redis_ttl = 7 * 24 * 3600
-        self.redis = redis.Redis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
+        self.redis_settings = {"host": redis_host, "port": redis_port, "db": redis_db}
+        self._redis = None
         self.messages_sent = 0
         self.last_message_time = None
         self.connected = False
@@ -46,6 +46,14 @@ class HubClient:
             logger.error(f"Error parsing connection string: {e}")
             raise
 
+    @property
+    def redis(self):
+        """Redis client, created on first use"""
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis(decode_responses=True, **self.redis_settings)
+        return self._redis
+
     def _on_connection_state_change(self, *args):
         """Handle connection state changes"""
         try:
@@ -106,6 +114,8 @@ class HubClient:
         
     def connect(self):
         """Connect to IoT Hub and return connection status"""
+        from azure.iot.device import IoTHubDeviceClient
+        from azure.iot.device.exceptions import ConnectionDroppedError, ConnectionFailedError
         try:
             # Create client if it doesn't exist
             if not self.client:
@@ -236,6 +246,8 @@ class HubClient:
         msg_device_id = message_data.get("deviceId", device_id or self.device_id)
         
         # Prepare IoT Hub message
+        from azure.iot.device import Message
+        from azure.iot.device.exceptions import ConnectionDroppedError
         message = Message(json.dumps(message_data))
         message.message_id = f"{msg_device_id}-{int(time.time())}"
 
@@ -17,6 +17,8 @@ from src.utils.config import load_config
 from src.iot.hub_client import HubClient
 from src.database.local_storage import LocalStorage
 from src.ota.update_client import OTAUpdateClient
+from src.scanner.input_engine import create_scanner_engine
+from src.scanner.coalescer import ScanCoalescer
 
 class BarcodeReader:
     def __init__(self):
@@ -27,6 +29,10 @@ class BarcodeReader:
         # Initialize local storage first
         self.storage = LocalStorage()
         
+        # Optional rolling shard files for scans and transactions (storage.sharding)
+        self.storage.log.configure(self.config.get("storage"))
+        self.last_retention_run = 0
+        
         # Try to get device ID from local storage first
         saved_id = self.storage.get_device_id()
         if saved_id:
@@ -42,11 +48,23 @@ class BarcodeReader:
         # Track IoT Hub connection status
         self.hub_connected = False
         
-        # Initialize test mode (for manual input testing)
-        self.test_mode = False
+        # Test mode reads barcodes typed at the console (manual input testing)
+        scanner_config = self.config.get("barcode_scanner", {})
+        self.test_mode = scanner_config.get("test_mode", False)
+        
+        # HID scanners read from /dev/input; started by start_scanner()
+        self.scanner = None
+        self.last_scan_device = None
+        
+        # Duplicate reads are merged into one event with a quantity before processing
+        self.coalescer = ScanCoalescer.from_config(scanner_config, self._process_scan_event)
+        
+        # Serializes IoT Hub sends between the scan pipeline and unsent-scan retries
+        self.hub_lock = threading.Lock()
         
-        # Initialize OTA update client
-        self.ota_client = OTAUpdateClient()
+        # OTA update client is created lazily by the update checker thread,
+        # keeping its config load and cache setup off the startup path
+        self.ota_client = None
         
         # Flag to control update checking
         self.check_for_updates = True
@@ -77,11 +95,40 @@ class BarcodeReader:
             print(f"✗ System check failed: {e}")
             return False
 
-    def read_barcode(self, prompt="Ready for barcode scan..."):
-        """Read barcode from USB handreader scanner or manual input in test mode"""
+    def start_scanner(self):
+        """Start reading the HID scanners listed in config (all keyboards by default)
+        
+        Falls back to line reads from stdin when no scanner device is available.
+        """
+        if self.test_mode or self.scanner is not None:
+            return self.scanner is not None
+        
+        engine = create_scanner_engine(self.config.get("barcode_scanner", {}))
+        if engine is not None and engine.start():
+            self.scanner = engine
+            print(f"✓ Listening on scanner(s): {', '.join(engine.devices)}")
+            return True
+        
+        print("! No scanner input devices available - reading barcodes from stdin")
+        return False
+
+    def read_barcode(self, prompt="Ready for barcode scan...", timeout=None):
+        """Read barcode from USB handreader scanner or manual input in test mode
+        
+        With HID scanners this blocks until a scan arrives, or until ``timeout``
+        seconds have passed (used to wake up for retrying unsent scans).
+        """
         try:
             print(prompt)
             
+            if self.scanner is not None:
+                scan = self.scanner.get_scan(timeout)
+                if scan is None:
+                    return None
+                self.last_scan_device = scan.device
+                print(f"Barcode scanned on {scan.device}: {scan.barcode}")
+                return scan.barcode
+            
             if self.test_mode:
                 # For testing: use manual input
                 barcode = input("Enter barcode manually (test mode): ").strip()
@@ -92,10 +139,10 @@ class BarcodeReader:
             else:
                 # The handreader typically sends the barcode followed by a carriage return
                 # We'll use a timeout to avoid blocking indefinitely
-                timeout = self.config.get("barcode_scanner", {}).get("scan_timeout", 5000) / 1000  # Convert ms to seconds
+                scan_timeout = self.config.get("barcode_scanner", {}).get("scan_timeout", 5000) / 1000  # Convert ms to seconds
                 
                 # Check if there's input available within the timeout period
-                ready, _, _ = select.select([sys.stdin], [], [], timeout)
+                ready, _, _ = select.select([sys.stdin], [], [], scan_timeout)
                 if ready:
                     barcode = sys.stdin.readline().strip()
                     if barcode:
@@ -111,34 +158,58 @@ class BarcodeReader:
             print(f"Error reading barcode: {e}")
             return None
 
-    def process_barcode(self, barcode):
+    def submit_scan(self, barcode):
+        """Hand a read to the coalescing stage; processing happens once its window closes"""
+        self.coalescer.add(barcode, self.last_scan_device)
+
+    def _process_scan_event(self, event):
+        if event.reads > 1:
+            print(f"Coalesced {event.reads} reads of {event.barcode} into quantity {event.quantity}")
+        self.process_barcode(event.barcode, event.quantity)
+
+    def process_barcode(self, barcode, quantity=1):
         """Process scanned barcode and handle data storage"""
-        try:
-            # Store in local database first to ensure data is not lost and get timestamp
-            timestamp = self.storage.save_scan(self.device_id, barcode)
-            print(f"✓ Saved barcode to local database: {barcode}")
+        # Runs on the coalescer thread; hold the lock so retry_unsent_scans cannot
+        # pick up this scan between saving it and marking it sent
+        with self.hub_lock:
+            try:
+                # Store in local database first to ensure data is not lost and get timestamp
+                timestamp = self.storage.save_scan(self.device_id, barcode, quantity)
+                print(f"✓ Saved barcode to local database: {barcode} (quantity {quantity})")
             
-            # Only try to send to IoT Hub if we're connected
-            if self.hub_connected:
-                try:
-                    success = self.hub_client.send_message(barcode, self.device_id)
-                    if success:
-                        # Mark as sent in local storage
-                        self.storage.mark_sent_to_hub(self.device_id, barcode, timestamp)
-                        print(f"✓ Sent barcode to IoT Hub and marked as sent: {barcode}")
-                    else:
-                        print(f"! Failed to send to IoT Hub, will retry later: {barcode}")
-                except Exception as e:
-                    print(f"! Exception sending to IoT Hub, will retry later: {e}")
-                    # Try to reconnect for next time
-                    self.hub_connected = False
-            else:
-                print(f"! IoT Hub not connected, barcode saved locally for later sending: {barcode}")
+                # Only try to send to IoT Hub if we're connected
+                if self.hub_connected:
+                    try:
+                        success = self.hub_client.send_message(barcode, self.device_id, quantity)
+                        if success:
+                            # Mark as sent in local storage
+                            self.storage.mark_sent_to_hub(self.device_id, barcode, timestamp)
+                            print(f"✓ Sent barcode to IoT Hub and marked as sent: {barcode}")
+                        else:
+                            print(f"! Failed to send to IoT Hub, will retry later: {barcode}")
+                    except Exception as e:
+                        print(f"! Exception sending to IoT Hub, will retry later: {e}")
+                        # Try to reconnect for next time
+                        self.hub_connected = False
+                else:
+                    print(f"! IoT Hub not connected, barcode saved locally for later sending: {barcode}")
              
-            return True
+                return True
+            except Exception as e:
+                print(f"✗ Error processing barcode: {e}")
+                return False
+
+    def apply_retention(self, interval=3600):
+        """Drop log shard files past storage.retention_days, at most once per ``interval`` seconds"""
+        if time.time() - self.last_retention_run < interval:
+            return
+        self.last_retention_run = time.time()
+        try:
+            result = self.storage.apply_retention()
+            if result['dropped']:
+                print(f"✓ {result['message']}")
         except Exception as e:
-            print(f"✗ Error processing barcode: {e}")
-            return False
+            print(f"! Failed to apply storage retention: {e}")
 
     def retry_unsent_scans(self):
         """Attempt to resend unsent scans stored locally"""
@@ -152,19 +223,36 @@ class BarcodeReader:
                 # Still not connected, skip retrying for now
                 return
         
-        scans = self.storage.get_unsent_scans()
+        # Read the batch under the lock: every scan in it has finished its first send
+        # attempt in process_barcode, so none can be sent twice
+        with self.hub_lock:
+            scans = self.storage.get_unsent_scans()
         if scans and self.hub_connected:
             print(f"\nRetrying {len(scans)} unsent scans...")
             for rec in scans:
-                try:
-                    success = self.hub_client.send_message(rec['barcode'], rec['device_id'])
-                    if success:
-                        self.storage.mark_sent_to_hub(rec['device_id'], rec['barcode'], rec['timestamp'])
-                        print(f"✓ Retried unsent scan: {rec['barcode']}")
-                except Exception as e:
-                    print(f"! Failed to resend scan {rec['barcode']}: {e}")
-                    self.hub_connected = False
-                    break  # Stop trying if we lose connection
+                # Lock per message so live scans are not queued behind the whole batch
+                with self.hub_lock:
+                    try:
+                        success = self.hub_client.send_message(rec['barcode'], rec['device_id'], rec['quantity'])
+                        if success:
+                            self.storage.mark_sent_to_hub(rec['device_id'], rec['barcode'], rec['timestamp'])
+                            print(f"✓ Retried unsent scan: {rec['barcode']}")
+                    except Exception as e:
+                        print(f"! Failed to resend scan {rec['barcode']}: {e}")
+                        self.hub_connected = False
+                        break  # Stop trying if we lose connection
+    
+    def _upload_inventory(self):
+        """Upload inventory transactions to the OTA server's aggregator (aggregator.upload)"""
+        if not self.config.get("aggregator", {}).get("upload", False):
+            return
+        try:
+            from src.ota.aggregator import InventoryUploader
+            server_url = self.config.get("ota_server", {}).get("url", "http://localhost:8000")
+            result = InventoryUploader(server_url, self.device_id).upload()
+            print(f"{'✓' if result['success'] else '!'} {result['message']}")
+        except Exception as e:
+            print(f"! Failed to upload inventory transactions: {e}")
     
     def _update_checker(self):
         """Background thread to periodically check for OTA updates"""
@@ -175,6 +263,9 @@ class BarcodeReader:
         # Initial delay to allow system to stabilize
         time.sleep(30)
         
+        if self.ota_client is None:
+            self.ota_client = OTAUpdateClient()
+        
         while self.check_for_updates:
             try:
                 print("\nChecking for OTA updates...")
@@ -186,6 +277,9 @@ class BarcodeReader:
                 else:
                     print("✓ No updates available or update not needed")
                 
+                # Push new inventory transactions to the fleet aggregator on the same server
+                self._upload_inventory()
+                
                 # Check for updates every hour
                 for _ in range(60):
                     if not self.check_for_updates:
@@ -219,8 +313,8 @@ def main():
         print("\nInitializing barcode reader...")
         barcode_reader = BarcodeReader()
         
-        # Set test mode for manual input (change to False for production with real handreader)
-        barcode_reader.test_mode = True
+        # Start HID scanner input (set barcode_scanner.test_mode for manual input)
+        barcode_reader.start_scanner()
         
         # Check system status
         if not barcode_reader.check_system_status():
@@ -243,12 +337,13 @@ def main():
 
         # Main scanning loop
         print("\nReady to scan barcodes... (Ctrl+C to exit)")
+        retry_interval = config.get("offline", {}).get("retry_interval_seconds", 300)
         while True:
             barcode_reader.retry_unsent_scans()
-            barcode = barcode_reader.read_barcode()
+            barcode_reader.apply_retention()
+            barcode = barcode_reader.read_barcode(timeout=retry_interval)
             if barcode:
-                barcode_reader.process_barcode(barcode)
-                time.sleep(0.5)  # Small delay between scans
+                barcode_reader.submit_scan(barcode)
 
     except KeyboardInterrupt:
         print("\nExiting gracefully...")
@@ -259,6 +354,10 @@ def main():
     finally:
         if barcode_reader is not None:
             try:
+                if barcode_reader.scanner is not None:
+                    barcode_reader.scanner.stop()
+                # Process scans still waiting in the coalescing window
+                barcode_reader.coalescer.close()
                 if hasattr(barcode_reader, 'hub_client'):
                     # Old method
                     # device = registry_manager.create_or_update_device(device_id, device_info, if_match='*')
@@ -15,13 +15,16 @@ import sys
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from api.api_client import ApiClient
+from src.api.api_client import ApiClient
+from src.utils.timestamps import to_epoch_ms
+from src.database.migrations import migrate
 
 logger = logging.getLogger(__name__)
 
 class NotificationService:
     def __init__(self):
         self.api_client = ApiClient()
+        migrate(project_root / 'barcode_scans.db')
         
     def send_device_registration_notification(self, device_id, test_barcode, success=True):
         """
@@ -123,25 +126,13 @@ class NotificationService:
             conn = sqlite3.connect(project_root / 'barcode_scans.db')
             cursor = conn.cursor()
             
-            # Create notifications table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS notifications (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    device_id TEXT,
-                    message TEXT,
-                    date TEXT,
-                    status TEXT,
-                    timestamp DATETIME,
-                    api_response TEXT
-                )
-            ''')
-            
             # Insert notification record
+            now = datetime.now(timezone.utc)
             cursor.execute('''
-                INSERT INTO notifications (device_id, message, date, status, timestamp, api_response)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO notifications (device_id, message, date, status, timestamp, timestamp_ms, api_response)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (device_id, message, date, status, 
-                  datetime.now(timezone.utc).isoformat(), 
+                  now.isoformat(), to_epoch_ms(now),
                   json.dumps(api_response)))
             
             conn.commit()
@@ -164,14 +155,14 @@ class NotificationService:
                     SELECT device_id, message, date, status, timestamp
                     FROM notifications 
                     WHERE device_id = ?
-                    ORDER BY timestamp DESC 
+                    ORDER BY id DESC 
                     LIMIT ?
                 ''', (device_id, limit))
             else:
                 cursor.execute('''
                     SELECT device_id, message, date, status, timestamp
                     FROM notifications 
-                    ORDER BY timestamp DESC 
+                    ORDER BY id DESC 
                     LIMIT ?
                 ''', (limit,))
             
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Fleet inventory aggregation on the OTA server.
+
+Each device uploads its ``inventory_transactions`` as id ranges: "every
+transaction with ``after_id < id <= through_id``". The server keeps one
+high-water mark per device and accepts a range only when it starts at or
+below that mark, so nothing is silently skipped. Rows are merged with
+``INSERT ... ON CONFLICT DO NOTHING`` on ``(source_device, id)`` and the
+per-device quantities with an upsert that only moves forward by transaction
+id, so retried or overlapping uploads are harmless.
+
+The central store is a SQLite file next to the server's ``updates/`` and
+``devices/`` directories, with indexes for the cross-device queries:
+quantity of an EAN on every device, fleet totals per EAN, and transactions
+by EAN, device and time range.
+
+    python src/ota/aggregator.py upload [--server URL]    (on a device)
+    python src/ota/aggregator.py inventory [EAN]          (on the server)
+"""
+
+import os
+import sys
+import sqlite3
+import logging
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.lazy import lazy_import
+from src.utils.timestamps import to_epoch_ms, format_hub
+
+logger = logging.getLogger("Aggregator")
+
+# Imported on first upload rather than at startup
+requests = lazy_import("requests")
+
+AGGREGATE_DB_PATH = project_root / "fleet_inventory.db"
+
+# Largest range a device may upload in one request
+MAX_UPLOAD_ROWS = 5000
+DEFAULT_UPLOAD_BATCH = 1000
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+TRANSACTION_COLUMNS = ('id', 'ean', 'device_id', 'transaction_type', 'quantity_change', 'previous_quantity',
+                       'new_quantity', 'timestamp', 'timestamp_ms', 'notes')
+
+# Accepted JSON type of each uploaded column besides id; any column may be null
+COLUMN_TYPES = {
+    'ean': str,
+    'device_id': str,
+    'transaction_type': str,
+    'quantity_change': int,
+    'previous_quantity': int,
+    'new_quantity': int,
+    'timestamp': str,
+    'timestamp_ms': int,
+    'notes': str
+}
+
+# Stores whose schema this process already created
+_ready = set()
+_ready_lock = threading.Lock()
+
+def ensure_schema(conn):
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fleet_transactions (
+            seq INTEGER PRIMARY KEY,
+            source_device TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            ean TEXT,
+            device_id TEXT,
+            transaction_type TEXT,
+            quantity_change INTEGER,
+            previous_quantity INTEGER,
+            new_quantity INTEGER,
+            timestamp TEXT,
+            timestamp_ms INTEGER,
+            notes TEXT,
+            received_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fleet_inventory (
+            source_device TEXT NOT NULL,
+            ean TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            last_timestamp_ms INTEGER,
+            PRIMARY KEY (source_device, ean)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fleet_sources (
+            source_device TEXT PRIMARY KEY,
+            high_water_mark INTEGER NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            last_upload_at TEXT
+        )
+    ''')
+    for statement in (
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_fleet_transactions_source_id ON fleet_transactions (source_device, id)',
+        'CREATE INDEX IF NOT EXISTS idx_fleet_transactions_ean_time ON fleet_transactions (ean, timestamp_ms)',
+        'CREATE INDEX IF NOT EXISTS idx_fleet_transactions_source_time ON fleet_transactions (source_device, timestamp_ms)',
+        'CREATE INDEX IF NOT EXISTS idx_fleet_transactions_time ON fleet_transactions (timestamp_ms)',
+        'CREATE INDEX IF NOT EXISTS idx_fleet_inventory_ean ON fleet_inventory (ean)',
+    ):
+        conn.execute(statement)
+    conn.commit()
+
+def _is_int(value):
+    # JSON true/false arrive as bool, which is an int subclass
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _validate_range(after_id, through_id, transactions):
+    """Check an upload and return its rows as tuples in TRANSACTION_COLUMNS order"""
+    if not _is_int(after_id) or not _is_int(through_id) or after_id < 0 or through_id < after_id:
+        raise ValueError("after_id and through_id must be integers with 0 <= after_id <= through_id")
+    if not isinstance(transactions, list):
+        raise ValueError("transactions must be a list")
+    if len(transactions) > MAX_UPLOAD_ROWS:
+        raise ValueError(f"At most {MAX_UPLOAD_ROWS} transactions per upload")
+    rows = []
+    for transaction in transactions:
+        if not isinstance(transaction, dict):
+            raise ValueError("Each transaction must be an object")
+        transaction_id = transaction.get('id')
+        if not _is_int(transaction_id) or not after_id < transaction_id <= through_id:
+            raise ValueError(f"Transaction id {transaction_id!r} is outside ({after_id}, {through_id}]")
+        for column, column_type in COLUMN_TYPES.items():
+            value = transaction.get(column)
+            valid = _is_int(value) if column_type is int else isinstance(value, column_type)
+            if value is not None and not valid:
+                raise ValueError(f"Transaction {transaction_id}: {column} must be {column_type.__name__} or null")
+        row = dict(transaction)
+        if row.get('timestamp_ms') is None:
+            row['timestamp_ms'] = to_epoch_ms(row.get('timestamp'))
+        rows.append(tuple(row.get(column) for column in TRANSACTION_COLUMNS))
+    return rows
+
+def _time_bound(value):
+    epoch_ms = to_epoch_ms(value)
+    if epoch_ms is None:
+        raise ValueError(f"Invalid timestamp: {value}")
+    return epoch_ms
+
+class FleetInventoryStore:
+    """Central store of every device's transactions and latest quantities"""
+
+    def __init__(self, db_path=None):
+        self.db_path = str(db_path or AGGREGATE_DB_PATH)
+        with _ready_lock:
+            if self.db_path not in _ready:
+                conn = self._get_connection()
+                ensure_schema(conn)
+                conn.close()
+                _ready.add(self.db_path)
+
+    def _get_connection(self):
+        # Several uvicorn workers may merge at once; wait for the write lock
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def high_water_mark(self, source_device):
+        conn = self._get_connection()
+        row = conn.execute('SELECT high_water_mark FROM fleet_sources WHERE source_device = ?',
+                           (source_device,)).fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def merge(self, source_device, after_id, through_id, transactions):
+        """Merge one uploaded id range
+
+        Args:
+            source_device (str): Device that uploaded the range
+            after_id, through_id (int): The range covers after_id < id <= through_id
+            transactions (list): Transaction dicts (TRANSACTION_COLUMNS) in the range
+
+        Returns:
+            dict: Result with accepted and duplicate counts and the new high_water_mark.
+            ``conflict`` is True when the range starts above the mark (resend from the mark).
+        """
+        rows = _validate_range(after_id, through_id, transactions)
+        now = datetime.now(timezone.utc).isoformat()
+        conn = self._get_connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT high_water_mark FROM fleet_sources WHERE source_device = ?',
+                               (source_device,)).fetchone()
+            high_water_mark = row[0] if row else 0
+            if after_id > high_water_mark:
+                conn.rollback()
+                return {'success': False, 'conflict': True, 'high_water_mark': high_water_mark,
+                        'message': f'Range starts after {after_id}; server has up to {high_water_mark}'}
+
+            changes = conn.total_changes
+            conn.executemany(f'''
+                INSERT INTO fleet_transactions (source_device, {', '.join(TRANSACTION_COLUMNS)}, received_at)
+                VALUES (?, {', '.join('?' * len(TRANSACTION_COLUMNS))}, ?)
+                ON CONFLICT(source_device, id) DO NOTHING
+            ''', [(source_device,) + row + (now,) for row in rows])
+            accepted = conn.total_changes - changes
+
+            # Latest quantity per EAN in this range; older transactions never overwrite newer ones
+            latest = {}
+            for row in rows:
+                transaction_id, ean, new_quantity, timestamp_ms = row[0], row[1], row[6], row[8]
+                if ean is not None and new_quantity is not None and transaction_id > latest.get(ean, (0,))[0]:
+                    latest[ean] = (transaction_id, new_quantity, timestamp_ms)
+            conn.executemany('''
+                INSERT INTO fleet_inventory (source_device, ean, quantity, last_id, last_timestamp_ms)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(source_device, ean) DO UPDATE SET
+                    quantity = excluded.quantity,
+                    last_id = excluded.last_id,
+                    last_timestamp_ms = excluded.last_timestamp_ms
+                WHERE excluded.last_id > fleet_inventory.last_id
+            ''', [(source_device, ean, quantity, transaction_id, timestamp_ms)
+                  for ean, (transaction_id, quantity, timestamp_ms) in latest.items()])
+
+            high_water_mark = max(high_water_mark, through_id)
+            conn.execute('''
+                INSERT INTO fleet_sources (source_device, high_water_mark, transaction_count, last_upload_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(source_device) DO UPDATE SET
+                    high_water_mark = excluded.high_water_mark,
+                    transaction_count = transaction_count + excluded.transaction_count,
+                    last_upload_at = excluded.last_upload_at
+            ''', (source_device, high_water_mark, accepted, now))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        return {
+            'success': True,
+            'conflict': False,
+            'message': f'Merged {accepted} transactions from {source_device} ({len(rows) - accepted} duplicates)',
+            'accepted': accepted,
+            'duplicates': len(rows) - accepted,
+            'high_water_mark': high_water_mark
+        }
+
+    def item(self, ean):
+        """Quantity of one EAN on every device, and the fleet total"""
+        conn = self._get_connection()
+        rows = conn.execute('''
+            SELECT source_device, quantity, last_timestamp_ms FROM fleet_inventory
+            WHERE ean = ? ORDER BY source_device
+        ''', (ean,)).fetchall()
+        conn.close()
+        devices = [{'source_device': source_device, 'quantity': quantity, 'last_updated': format_hub(timestamp_ms)}
+                   for source_device, quantity, timestamp_ms in rows]
+        return {'ean': ean, 'total_quantity': sum(device['quantity'] for device in devices), 'devices': devices}
+
+    def totals(self, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Fleet quantity per EAN in EAN order; pass ``next_cursor`` back for the next page"""
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        conn = self._get_connection()
+        rows = conn.execute('''
+            SELECT ean, SUM(quantity), COUNT(*) FROM fleet_inventory
+            WHERE ean > ? GROUP BY ean ORDER BY ean LIMIT ?
+        ''', (cursor or '', limit + 1)).fetchall()
+        conn.close()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'items': [{'ean': ean, 'total_quantity': total, 'devices': devices} for ean, total, devices in rows],
+            'next_cursor': rows[-1][0] if has_more else None,
+            'has_more': has_more
+        }
+
+    def transactions(self, ean=None, source_device=None, since=None, until=None, cursor=None,
+                     limit=DEFAULT_PAGE_SIZE):
+        """Transactions across devices, newest first
+
+        The cursor is ``"<timestamp_ms>:<seq>"`` of the last row of the previous page
+        (``":<seq>"`` when it has no timestamp; those rows come last).
+        """
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        conditions = []
+        params = []
+        if ean is not None:
+            conditions.append('ean = ?')
+            params.append(ean)
+        if source_device is not None:
+            conditions.append('source_device = ?')
+            params.append(source_device)
+        if since is not None:
+            conditions.append('timestamp_ms >= ?')
+            params.append(_time_bound(since))
+        if until is not None:
+            conditions.append('timestamp_ms <= ?')
+            params.append(_time_bound(until))
+        if cursor:
+            try:
+                cursor_ms, cursor_seq = str(cursor).split(':')
+                cursor_ms, cursor_seq = int(cursor_ms) if cursor_ms else None, int(cursor_seq)
+            except ValueError:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            if cursor_ms is None:
+                conditions.append('(timestamp_ms IS NULL AND seq < ?)')
+                params.append(cursor_seq)
+            else:
+                # Rows without a timestamp sort after every timestamped row
+                conditions.append('(timestamp_ms < ? OR (timestamp_ms = ? AND seq < ?) OR timestamp_ms IS NULL)')
+                params.extend((cursor_ms, cursor_ms, cursor_seq))
+
+        query = f"SELECT seq, source_device, {', '.join(TRANSACTION_COLUMNS)} FROM fleet_transactions"
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY timestamp_ms DESC, seq DESC LIMIT ?'
+        params.append(limit + 1)
+        conn = self._get_connection()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [dict(zip(('source_device',) + TRANSACTION_COLUMNS, row[1:])) for row in rows]
+        return {
+            'items': items,
+            'next_cursor': f"{'' if rows[-1][10] is None else rows[-1][10]}:{rows[-1][0]}" if has_more else None,
+            'has_more': has_more
+        }
+
+    def sources(self):
+        """Devices that have uploaded, with their high-water marks"""
+        conn = self._get_connection()
+        rows = conn.execute('''
+            SELECT source_device, high_water_mark, transaction_count, last_upload_at
+            FROM fleet_sources ORDER BY source_device
+        ''').fetchall()
+        conn.close()
+        return [dict(zip(('source_device', 'high_water_mark', 'transactions', 'last_upload_at'), row)) for row in rows]
+
+class InventoryUploader:
+    """Device side: push local transactions past the server's high-water mark"""
+
+    def __init__(self, server_url, device_id, db_path=None, batch_size=DEFAULT_UPLOAD_BATCH, timeout=30):
+        from src.database.shards import ShardedLog
+        self.server_url = server_url.rstrip('/')
+        self.device_id = device_id
+        self.batch_size = min(batch_size, MAX_UPLOAD_ROWS)
+        self.timeout = timeout
+        self.log = ShardedLog(db_path)
+
+    def _url(self, suffix):
+        return f"{self.server_url}/aggregate/devices/{self.device_id}/{suffix}"
+
+    def _read_batch(self, after_id):
+        """The next ``batch_size`` local transactions after ``after_id``, in id order"""
+        columns = ', '.join(TRANSACTION_COLUMNS)
+        rows = []
+        for conn in self.log.each_segment('inventory_transactions', after_id=after_id):
+            rows += conn.execute(f'SELECT {columns} FROM inventory_transactions WHERE id > ? ORDER BY id LIMIT ?',
+                                 (after_id, self.batch_size - len(rows))).fetchall()
+            if len(rows) >= self.batch_size:
+                break
+        return [dict(zip(TRANSACTION_COLUMNS, row)) for row in rows]
+
+    def _local_last_id(self):
+        for conn in self.log.each_segment('inventory_transactions', newest_first=True):
+            last_id = conn.execute('SELECT MAX(id) FROM inventory_transactions').fetchone()[0]
+            if last_id is not None:
+                return last_id
+        return 0
+
+    def upload(self, max_batches=None):
+        """Upload until the server has every local transaction
+
+        Fails without sending when the server already holds ids past the
+        local log: the device database was reset or replaced, and its new
+        transactions would reuse ids the server treats as uploaded.
+
+        Returns:
+            dict: Result with the number of transactions sent and the final high_water_mark
+        """
+        response = requests.get(self._url('high_water_mark'), timeout=self.timeout)
+        response.raise_for_status()
+        high_water_mark = response.json()['high_water_mark']
+        local_last_id = self._local_last_id()
+        if local_last_id < high_water_mark:
+            message = (f'Server has transactions up to {high_water_mark} from {self.device_id}, '
+                       f'but the local log ends at {local_last_id}; was the database reset?')
+            logger.error(message)
+            return {'success': False, 'message': message, 'sent': 0, 'high_water_mark': high_water_mark}
+        sent = batches = 0
+        while max_batches is None or batches < max_batches:
+            transactions = self._read_batch(high_water_mark)
+            if not transactions:
+                break
+            payload = {
+                'after_id': high_water_mark,
+                'through_id': transactions[-1]['id'],
+                'transactions': transactions
+            }
+            response = requests.post(self._url('transactions'), json=payload, timeout=self.timeout)
+            if response.status_code == 409:
+                # The server is behind what we assumed; resend from its mark
+                high_water_mark = response.json()['detail']['high_water_mark']
+                batches += 1
+                continue
+            response.raise_for_status()
+            high_water_mark = response.json()['high_water_mark']
+            sent += len(transactions)
+            batches += 1
+        logger.info(f"Uploaded {sent} inventory transactions; server has up to {high_water_mark}")
+        return {
+            'success': True,
+            'message': f'Uploaded {sent} transactions in {batches} batches',
+            'sent': sent,
+            'high_water_mark': high_water_mark
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet inventory aggregation")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    upload_parser = subparsers.add_parser("upload", help="Upload this device's transactions to the server")
+    upload_parser.add_argument("--server", help="Server URL (default: ota_server.url)")
+    upload_parser.add_argument("--device", help="Device ID (default: the one stored locally)")
+    inventory_parser = subparsers.add_parser("inventory", help="Fleet quantities from the central store")
+    inventory_parser.add_argument("ean", nargs="?")
+    inventory_parser.add_argument("--db", default=str(AGGREGATE_DB_PATH))
+    sources_parser = subparsers.add_parser("sources", help="Devices that have uploaded")
+    sources_parser.add_argument("--db", default=str(AGGREGATE_DB_PATH))
+    args = parser.parse_args()
+
+    if args.command == "upload":
+        from src.utils.config import load_config
+        from src.database.local_storage import LocalStorage
+        config = load_config() or {}
+        server_url = args.server or config.get("ota_server", {}).get("url", "http://localhost:8000")
+        device_id = args.device or LocalStorage().get_device_id()
+        if not device_id:
+            print("No device ID stored yet; pass --device")
+            return
+        print(InventoryUploader(server_url, device_id).upload()['message'])
+        return
+
+    store = FleetInventoryStore(args.db)
+    if args.command == "sources":
+        for source in store.sources():
+            print(f"{source['source_device']}: up to {source['high_water_mark']}, "
+                  f"{source['transactions']} transactions, last upload {source['last_upload_at']}")
+    elif args.ean:
+        item = store.item(args.ean)
+        print(f"{item['ean']}: {item['total_quantity']} across {len(item['devices'])} devices")
+        for device in item['devices']:
+            print(f"  {device['source_device']}: {device['quantity']} ({device['last_updated']})")
+    else:
+        for item in store.totals(limit=MAX_PAGE_SIZE)['items']:
+            print(f"{item['ean']}: {item['total_quantity']} across {item['devices']} devices")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Concurrent request benchmark for the OTA update server.
+
+Simulates many devices checking in at once and reports throughput and
+latency percentiles, e.g.::
+
+    python src/ota/update_server.py --workers 4
+    python src/ota/load_test.py --devices 500 --concurrency 64 --requests 5000
+"""
+
+import sys
+import time
+import argparse
+import statistics
+import requests
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.config import load_config
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_benchmark(server_url, devices=200, concurrency=32, total_requests=2000, list_ratio=0.1):
+    """Fire concurrent check-ins (plus some catalogue listings) at the server
+
+    Returns:
+        dict: Throughput, error count and latency percentiles in milliseconds
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    list_every = int(1 / list_ratio) if list_ratio else 0
+
+    def one_request(i):
+        start = time.perf_counter()
+        try:
+            if list_every and i % list_every == 0:
+                response = session.get(f"{server_url}/updates/list", timeout=30)
+            else:
+                device_id = f"loadtest-{i % devices:05d}"
+                response = session.post(
+                    f"{server_url}/devices/{device_id}/check",
+                    params={"current_version": "0.0.0"},
+                    timeout=30
+                )
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_request, range(total_requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(total_requests / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 2) if latencies else 0.0,
+            "p50": round(_percentile(latencies, 0.50), 2),
+            "p95": round(_percentile(latencies, 0.95), 2),
+            "p99": round(_percentile(latencies, 0.99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent device check-ins against the OTA server")
+    parser.add_argument("--server-url", help="URL of the OTA update server")
+    parser.add_argument("--devices", type=int, default=200, help="Number of distinct simulated devices")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent in-flight requests")
+    parser.add_argument("--requests", type=int, default=2000, help="Total number of requests")
+    parser.add_argument("--list-ratio", type=float, default=0.1, help="Fraction of requests that list updates")
+    args = parser.parse_args()
+
+    server_url = args.server_url
+    if server_url is None:
+        config = load_config() or {}
+        server_url = config.get("ota_server", {}).get("url", "http://localhost:8000")
+
+    result = run_benchmark(server_url, args.devices, args.concurrency, args.requests, args.list_ratio)
+    latency = result["latency_ms"]
+    print(f"{result['requests']} requests, concurrency {result['concurrency']}, {result['errors']} errors")
+    print(f"Throughput: {result['requests_per_second']} req/s over {result['elapsed_seconds']} s")
+    print(f"Latency ms: mean {latency['mean']}  p50 {latency['p50']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+
+if __name__ == "__main__":
+    main()
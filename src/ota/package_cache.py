@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of verified OTA packages on the device.
+
+Packages are stored under their SHA256 ``file_hash`` so a rollback or a
+re-apply of a recently installed version can reuse the bytes instead of
+downloading them again. The cache is bounded in size and evicts the least
+recently used packages first.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import logging
+from pathlib import Path
+
+logger = logging.getLogger("OTA_Client")
+
+# Default cache size limit (256 MB)
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Sent in place of an empty hash list, which HTTP query encoding would drop
+EMPTY_CACHE_MARKER = ""
+
+class PackageCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = self.cache_dir / "index.json"
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    def _load_index(self):
+        """Load the cache index, dropping entries whose blobs are missing"""
+        index = {}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, "r") as f:
+                    index = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Package cache index unreadable, rebuilding: {e}")
+                index = {}
+        return {h: entry for h, entry in index.items() if self._blob_path(h).exists()}
+
+    def _save_index(self):
+        """Atomically persist the cache index"""
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _blob_path(self, file_hash):
+        return self.cache_dir / f"{file_hash}.pkg"
+
+    def get(self, file_hash):
+        """Return the cached package path for a hash, or None on a miss"""
+        with self._lock:
+            entry = self._index.get(file_hash)
+            if not entry:
+                return None
+            blob_path = self._blob_path(file_hash)
+            if not blob_path.exists():
+                del self._index[file_hash]
+                self._save_index()
+                return None
+            entry["last_used"] = time.time()
+            self._save_index()
+            return blob_path
+
+    def find_version(self, version):
+        """Return (file_hash, path) of the most recently used package for a version"""
+        with self._lock:
+            candidates = [
+                (entry.get("last_used", 0), file_hash)
+                for file_hash, entry in self._index.items()
+                if entry.get("version") == version
+            ]
+        if not candidates:
+            return None
+        _, file_hash = max(candidates)
+        blob_path = self.get(file_hash)
+        return (file_hash, blob_path) if blob_path else None
+
+    def put(self, file_hash, source_path, version=None, filename=None):
+        """Add a verified package to the cache and return its cached path
+
+        The caller is responsible for having verified ``file_hash`` against
+        the package contents.
+        """
+        with self._lock:
+            blob_path = self._blob_path(file_hash)
+            if not blob_path.exists():
+                tmp_path = blob_path.with_suffix(".part")
+                shutil.copyfile(source_path, tmp_path)
+                os.replace(tmp_path, blob_path)
+            entry = self._index.setdefault(file_hash, {})
+            entry.update({
+                "size_bytes": blob_path.stat().st_size,
+                "last_used": time.time(),
+            })
+            if version:
+                entry["version"] = version
+            if filename:
+                entry["filename"] = filename
+            self._evict(keep=file_hash)
+            self._save_index()
+            return blob_path
+
+    def _evict(self, keep=None):
+        """Evict least recently used packages until the cache fits its budget"""
+        total = sum(entry.get("size_bytes", 0) for entry in self._index.values())
+        for _, file_hash in sorted((e.get("last_used", 0), h) for h, e in self._index.items()):
+            if total <= self.max_bytes:
+                break
+            if file_hash == keep:
+                continue
+            entry = self._index.pop(file_hash)
+            total -= entry.get("size_bytes", 0)
+            try:
+                self._blob_path(file_hash).unlink()
+            except FileNotFoundError:
+                pass
+            logger.info(f"Evicted cached package {file_hash[:12]} ({entry.get('version')})")
+
+    def list_hashes(self):
+        """List the hashes of all cached packages, most recently used first"""
+        with self._lock:
+            return [
+                file_hash for file_hash, _ in sorted(
+                    self._index.items(), key=lambda item: item[1].get("last_used", 0), reverse=True
+                )
+            ]
+
+    def entries(self):
+        """Return a copy of the cache index"""
+        with self._lock:
+            return {h: dict(entry) for h, entry in self._index.items()}
@@ -3,10 +3,14 @@
 import os
 import sys
 import json
-import zipfile
+import zlib
+import struct
+import fnmatch
+import hashlib
 import argparse
 import requests
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import datetime
 from datetime import timezone
 
@@ -16,52 +20,195 @@ sys.path.append(str(project_root))
 
 from src.utils.config import load_config
 
-def create_update_package(version, description, output_dir=None):
-    """Create an update package from the current codebase"""
+# Default include/exclude manifest (glob patterns relative to the project root)
+DEFAULT_MANIFEST = {
+    "include": ["src/*"],
+    "exclude": [
+        "*/__pycache__/*",
+        "*.pyc",
+        "*.pyo",
+        "*.log",
+        "*.db"
+    ]
+}
+
+# Fixed entry timestamp (1980-01-01 00:00:00, the DOS epoch) for reproducible archives
+ZIP_DOS_TIME = 0
+ZIP_DOS_DATE = (0 << 9) | (1 << 5) | 1
+COMPRESSION_LEVEL = 9
+
+def load_manifest(manifest_path=None):
+    """Load include/exclude patterns, defaulting to ota_manifest.json if present"""
+    if manifest_path is None:
+        manifest_path = project_root / "ota_manifest.json"
+        if not manifest_path.exists():
+            return DEFAULT_MANIFEST
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    return {
+        "include": manifest.get("include", DEFAULT_MANIFEST["include"]),
+        "exclude": manifest.get("exclude", DEFAULT_MANIFEST["exclude"])
+    }
+
+def _include_roots(manifest):
+    """Directories to walk: the literal leading path of each include pattern"""
+    roots = set()
+    for pattern in manifest["include"]:
+        parts = []
+        for part in pattern.split("/")[:-1]:
+            if any(char in part for char in "*?["):
+                break
+            parts.append(part)
+        roots.add(project_root.joinpath(*parts))
+    # Skip roots nested in another root so no file is visited twice
+    return sorted(root for root in roots
+                  if not any(other != root and other in root.parents for other in roots))
+
+def _walk_selected(include_root, manifest):
+    for root, dirs, files in os.walk(include_root):
+        dirs.sort()
+        for file in files:
+            arcname = Path(os.path.relpath(os.path.join(root, file), project_root)).as_posix()
+            if not any(fnmatch.fnmatch(arcname, pattern) for pattern in manifest["include"]):
+                continue
+            if any(fnmatch.fnmatch(arcname, pattern) for pattern in manifest["exclude"]):
+                continue
+            yield arcname
+
+def collect_files(manifest):
+    """Return sorted archive names of all files selected by the manifest"""
+    selected = set()
+    for include_root in _include_roots(manifest):
+        selected.update(_walk_selected(include_root, manifest))
+    return sorted(selected)
+
+def _deflate(data, level=COMPRESSION_LEVEL):
+    """Raw DEFLATE stream as stored in zip entries"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+def _compress_entry(file_path, cache_dir, level=COMPRESSION_LEVEL):
+    """Hash and compress one file, reusing the content-addressed cache
+
+    Runs in a worker process. Returns the metadata needed for the zip headers;
+    the compressed bytes are left in the cache.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    cache_path = Path(cache_dir) / f"{content_hash}.l{level}.deflate"
+    if not cache_path.exists():
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_deflate(data, level))
+        os.replace(tmp_path, cache_path)
+        cached = False
+    else:
+        cached = True
+    return {
+        "crc": zlib.crc32(data),
+        "size": len(data),
+        "compressed_path": str(cache_path),
+        "cached": cached
+    }
+
+def write_deterministic_zip(package_path, entries):
+    """Write a zip archive from precompressed entries with fixed metadata
+
+    Args:
+        entries: List of (arcname, crc, size, compressed_bytes), written in order
+    """
+    central_directory = []
+    with open(package_path, "wb") as f:
+        for arcname, crc, size, compressed in entries:
+            name = arcname.encode("utf-8")
+            if size > 0xFFFFFFFF or len(compressed) > 0xFFFFFFFF:
+                raise ValueError(f"{arcname} is too large for a non-ZIP64 archive")
+            offset = f.tell()
+            # Local file header: version 2.0, UTF-8 names, DEFLATE
+            f.write(struct.pack(
+                "<IHHHHHIIIHH", 0x04034B50, 20, 0x800, 8, ZIP_DOS_TIME, ZIP_DOS_DATE,
+                crc, len(compressed), size, len(name), 0
+            ))
+            f.write(name)
+            f.write(compressed)
+            central_directory.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 20, 20, 0x800, 8, ZIP_DOS_TIME, ZIP_DOS_DATE,
+                crc, len(compressed), size, len(name), 0, 0, 0, 0, (0o100644 << 16), offset
+            ) + name)
+
+        cd_offset = f.tell()
+        for record in central_directory:
+            f.write(record)
+        cd_size = f.tell() - cd_offset
+        f.write(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, len(central_directory), len(central_directory),
+            cd_size, cd_offset, 0
+        ))
+
+def create_update_package(version, description, output_dir=None, manifest_path=None, workers=None, cache_dir=None):
+    """Create an update package from the current codebase
+    
+    Files selected by the include/exclude manifest are compressed in a process
+    pool. Compressed entries are cached by content hash across builds and the
+    archive uses fixed timestamps and ordering, so identical inputs always
+    produce a byte-identical package.
+    """
     if output_dir is None:
         output_dir = project_root / "updates"
         output_dir.mkdir(exist_ok=True)
+    if cache_dir is None:
+        cache_dir = project_root / ".build_cache"
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
     
     # Create a timestamp for the package name
     timestamp = datetime.datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
     package_name = f"update_{version.replace('.', '_')}_{timestamp}.zip"
     package_path = output_dir / package_name
     
-    # Create the zip file
-    with zipfile.ZipFile(package_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-        # Add source files
-        src_dir = project_root / "src"
-        for root, _, files in os.walk(src_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, project_root)
-                zipf.write(file_path, arcname)
+    # Compress source files in parallel (cache hits only hash and read)
+    arcnames = collect_files(load_manifest(manifest_path))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            _compress_entry,
+            [project_root / arcname for arcname in arcnames],
+            [str(cache_dir)] * len(arcnames),
+            chunksize=16
+        ))
+    
+    entries = []
+    for arcname, result in zip(arcnames, results):
+        with open(result["compressed_path"], "rb") as f:
+            entries.append((arcname, result["crc"], result["size"], f.read()))
+    
+    # Add config files (excluding credentials)
+    config_file = project_root / "config.json"
+    if config_file.exists():
+        # Load config but remove sensitive information
+        with open(config_file, "r") as f:
+            config = json.load(f)
         
-        # Add config files (excluding credentials)
-        config_file = project_root / "config.json"
-        if config_file.exists():
-            # Load config but remove sensitive information
-            with open(config_file, "r") as f:
-                config = json.load(f)
-            
-            # Remove connection strings or other sensitive data
-            if "iot_hub" in config:
-                if "connection_string" in config["iot_hub"]:
-                    config["iot_hub"]["connection_string"] = ""
-            
-            # Add app version to config
-            config["app_version"] = version
-            
-            # Write modified config to zip
-            with zipf.open("config.json", "w") as f:
-                f.write(json.dumps(config, indent=2).encode("utf-8"))
+        # Remove connection strings or other sensitive data
+        if "iot_hub" in config:
+            if "connection_string" in config["iot_hub"]:
+                config["iot_hub"]["connection_string"] = ""
+        
+        # Add app version to config
+        config["app_version"] = version
         
-        # Add requirements.txt
-        req_file = project_root / "requirements.txt"
-        if req_file.exists():
-            zipf.write(req_file, "requirements.txt")
+        data = json.dumps(config, indent=2).encode("utf-8")
+        entries.append(("config.json", zlib.crc32(data), len(data), _deflate(data)))
+    
+    # Add requirements.txt
+    req_file = project_root / "requirements.txt"
+    if req_file.exists():
+        data = req_file.read_bytes()
+        entries.append(("requirements.txt", zlib.crc32(data), len(data), _deflate(data)))
+    
+    write_deterministic_zip(package_path, entries)
     
-    print(f"Update package created: {package_path}")
+    cache_hits = sum(1 for result in results if result["cached"])
+    print(f"Update package created: {package_path} ({len(entries)} files, {cache_hits} compressed entries reused)")
     return package_path
 
 def upload_to_server(package_path, version, description, server_url=None):
@@ -96,13 +243,16 @@ def main():
     parser.add_argument("--output-dir", help="Directory to save the update package")
     parser.add_argument("--server-url", help="URL of the OTA update server")
     parser.add_argument("--no-upload", action="store_true", help="Don't upload the package to the server")
+    parser.add_argument("--manifest", help="Include/exclude manifest (default: ota_manifest.json or built-in)")
+    parser.add_argument("--workers", type=int, help="Number of compression processes (default: CPU count)")
     
     args = parser.parse_args()
     
     output_dir = Path(args.output_dir) if args.output_dir else None
     
     # Create the update package
-    package_path = create_update_package(args.version, args.description, output_dir)
+    manifest_path = Path(args.manifest) if args.manifest else None
+    package_path = create_update_package(args.version, args.description, output_dir, manifest_path, args.workers)
     
     # Upload to server if requested
     if not args.no_upload:
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+LAN peer server for OTA packages.
+
+Serves verified packages from the device's PackageCache so other devices
+on the same site can fetch them over the local network instead of from the
+OTA server. Packages are addressed by their SHA256 ``file_hash`` and peers
+re-verify the hash after downloading, so a peer can never inject content.
+"""
+
+import re
+import shutil
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger("OTA_Client")
+
+DEFAULT_PEER_PORT = 8765
+
+_HASH_PATH = re.compile(r"^/packages/([0-9a-f]{64})$")
+
+class _PackageRequestHandler(BaseHTTPRequestHandler):
+    # Set on the subclass created by PeerServer
+    package_cache = None
+
+    def do_GET(self):
+        match = _HASH_PATH.match(self.path)
+        if not match:
+            self.send_error(404, "Not found")
+            return
+
+        package_path = self.package_cache.get(match.group(1))
+        if not package_path:
+            self.send_error(404, "Package not cached")
+            return
+
+        try:
+            with open(package_path, "rb") as f:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(package_path.stat().st_size))
+                self.end_headers()
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+        except (OSError, ConnectionError) as e:
+            logger.warning(f"Failed to serve package to peer {self.client_address[0]}: {e}")
+
+    def log_message(self, format, *args):
+        logger.debug(f"Peer request from {self.client_address[0]}: {format % args}")
+
+class PeerServer:
+    def __init__(self, package_cache, host="0.0.0.0", port=DEFAULT_PEER_PORT):
+        self.package_cache = package_cache
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        """Start serving cached packages in a background thread"""
+        if self.httpd is not None:
+            return True
+        handler = type("PackageRequestHandler", (_PackageRequestHandler,), {"package_cache": self.package_cache})
+        try:
+            self.httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            logger.error(f"Could not start peer package server on port {self.port}: {e}")
+            return False
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Serving cached packages to LAN peers on port {self.port}")
+        return True
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Staged rollout scheduling for OTA updates.
+
+A rollout policy controls which devices are offered an update and when:
+
+- ``rings``: cumulative fleet percentages (e.g. ``[1, 10, 50, 100]``). A device
+  is in the rollout when the deterministic hash of its ID for this update
+  falls below the current ring's percentage.
+- ``ring_interval_seconds``: optionally advance to the next ring automatically.
+- ``max_concurrent_downloads``: cap on outstanding download leases.
+- ``bandwidth_budget_bytes`` / ``window_seconds``: bytes that may be handed
+  out per window.
+- ``failure_threshold`` / ``min_reports``: pause automatically when the failure
+  rate reported through ``/update_status`` exceeds the threshold.
+
+The scheduler only manipulates a JSON-serializable state dict and takes an
+injectable clock, so the same logic drives the server and the simulator.
+"""
+
+import time
+import random
+import hashlib
+import argparse
+import json
+
+DEFAULT_POLICY = {
+    "rings": [100],
+    "ring_interval_seconds": None,
+    "max_concurrent_downloads": None,
+    "bandwidth_budget_bytes": None,
+    "window_seconds": 3600,
+    "lease_seconds": 1800,
+    "failure_threshold": 0.2,
+    "min_reports": 5
+}
+
+def device_bucket(update_id, device_id):
+    """Map a device to a stable position in [0, 100) for an update"""
+    digest = hashlib.sha256(f"{update_id}:{device_id}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % 10000 / 100.0
+
+def new_rollout_state(now):
+    return {
+        "ring": 0,
+        "ring_started_at": now,
+        "paused": False,
+        "pause_reason": None,
+        "leases": {},
+        "window_started_at": now,
+        "window_bytes": 0,
+        "reports": {}
+    }
+
+class RolloutScheduler:
+    def __init__(self, update_id, policy=None, state=None, clock=time.time):
+        self.update_id = update_id
+        self.policy = dict(DEFAULT_POLICY)
+        self.policy.update(policy or {})
+        self.clock = clock
+        self.state = state if state is not None else new_rollout_state(clock())
+
+    def to_dict(self):
+        return {"policy": self.policy, "state": self.state}
+
+    @classmethod
+    def from_dict(cls, update_id, data, clock=time.time):
+        return cls(update_id, data.get("policy"), data.get("state"), clock)
+
+    def current_percentage(self):
+        rings = self.policy["rings"] or [100]
+        return rings[min(self.state["ring"], len(rings) - 1)]
+
+    def in_rollout(self, device_id):
+        """Whether the device falls inside the current ring"""
+        return device_bucket(self.update_id, device_id) < self.current_percentage()
+
+    def _tick(self, now):
+        """Expire stale leases, roll the bandwidth window and auto-advance rings"""
+        lease_seconds = self.policy["lease_seconds"]
+        self.state["leases"] = {
+            device: granted_at for device, granted_at in self.state["leases"].items()
+            if now - granted_at < lease_seconds
+        }
+
+        if now - self.state["window_started_at"] >= self.policy["window_seconds"]:
+            self.state["window_started_at"] = now
+            self.state["window_bytes"] = 0
+
+        interval = self.policy["ring_interval_seconds"]
+        if interval and not self.state["paused"] and now - self.state["ring_started_at"] >= interval:
+            self.advance_ring(now)
+
+    def advance_ring(self, now=None):
+        """Move to the next ring; returns the new fleet percentage"""
+        now = self.clock() if now is None else now
+        if self.state["ring"] < len(self.policy["rings"]) - 1:
+            self.state["ring"] += 1
+            self.state["ring_started_at"] = now
+        return self.current_percentage()
+
+    def pause(self, reason="manual"):
+        self.state["paused"] = True
+        self.state["pause_reason"] = reason
+
+    def resume(self):
+        self.state["paused"] = False
+        self.state["pause_reason"] = None
+        self.state["ring_started_at"] = self.clock()
+
+    def request(self, device_id, size_bytes):
+        """Ask whether a device may start downloading now
+
+        Returns:
+            tuple: (granted, reason)
+        """
+        now = self.clock()
+        self._tick(now)
+
+        if device_id in self.state["leases"]:
+            return True, "lease_active"
+        if self.state["paused"]:
+            return False, "paused"
+        if not self.in_rollout(device_id):
+            return False, "not_in_ring"
+
+        max_concurrent = self.policy["max_concurrent_downloads"]
+        if max_concurrent is not None and len(self.state["leases"]) >= max_concurrent:
+            return False, "concurrency_limit"
+
+        budget = self.policy["bandwidth_budget_bytes"]
+        if budget is not None and self.state["window_bytes"] + (size_bytes or 0) > budget:
+            return False, "bandwidth_budget"
+
+        self.state["leases"][device_id] = now
+        self.state["window_bytes"] += size_bytes or 0
+        return True, "granted"
+
+    def retry_after(self):
+        """Seconds until capacity is likely to free up"""
+        now = self.clock()
+        waits = [self.policy["window_seconds"] - (now - self.state["window_started_at"])]
+        if self.state["leases"]:
+            waits.append(self.policy["lease_seconds"] - (now - min(self.state["leases"].values())))
+        return max(1, int(min(waits)))
+
+    def report(self, device_id, success):
+        """Record an install outcome, release the lease and auto-pause on failures"""
+        self.state["leases"].pop(device_id, None)
+        self.state["reports"][device_id] = "success" if success else "failed"
+
+        stats = self.stats()
+        if stats["reported"] >= self.policy["min_reports"] and stats["failure_rate"] > self.policy["failure_threshold"]:
+            self.pause(f"failure rate {stats['failure_rate']:.0%} exceeds {self.policy['failure_threshold']:.0%}")
+
+    def stats(self):
+        reports = self.state["reports"]
+        failed = sum(1 for outcome in reports.values() if outcome == "failed")
+        reported = len(reports)
+        return {
+            "ring": self.state["ring"],
+            "percentage": self.current_percentage(),
+            "paused": self.state["paused"],
+            "pause_reason": self.state["pause_reason"],
+            "active_downloads": len(self.state["leases"]),
+            "window_bytes": self.state["window_bytes"],
+            "reported": reported,
+            "succeeded": reported - failed,
+            "failed": failed,
+            "failure_rate": failed / reported if reported else 0.0
+        }
+
+def simulate_rollout(policy, fleet_size=1000, size_bytes=10 * 1024 * 1024, failure_rate=0.01,
+                     download_seconds=120, check_interval=300, duration=7 * 24 * 3600,
+                     step_seconds=60, seed=0, update_id="simulated_update"):
+    """Replay a rollout policy against a synthetic fleet
+
+    Devices check in every ``check_interval`` seconds (with a random phase),
+    download for ``download_seconds`` once granted and fail with probability
+    ``failure_rate``.
+
+    Returns:
+        dict: Final stats plus a timeline sampled every simulated hour
+    """
+    rng = random.Random(seed)
+    clock_now = [0.0]
+    scheduler = RolloutScheduler(update_id, policy, clock=lambda: clock_now[0])
+
+    devices = [f"sim-{i:05d}" for i in range(fleet_size)]
+    next_check = {device: rng.uniform(0, check_interval) for device in devices}
+    finishing = {}
+    updated = set()
+    peak_downloads = 0
+    timeline = []
+
+    t = 0.0
+    while t <= duration and len(updated) < fleet_size:
+        clock_now[0] = t
+
+        for device, done_at in list(finishing.items()):
+            if done_at <= t:
+                del finishing[device]
+                success = rng.random() >= failure_rate
+                scheduler.report(device, success)
+                if success:
+                    updated.add(device)
+
+        for device in devices:
+            if device in updated or device in finishing or next_check[device] > t:
+                continue
+            next_check[device] = t + check_interval
+            granted, _ = scheduler.request(device, size_bytes)
+            if granted:
+                finishing[device] = t + download_seconds
+
+        peak_downloads = max(peak_downloads, len(finishing))
+        if t % 3600 < step_seconds:
+            stats = scheduler.stats()
+            timeline.append({
+                "time": t,
+                "updated": len(updated),
+                "downloading": len(finishing),
+                "ring": stats["ring"],
+                "paused": stats["paused"]
+            })
+        if scheduler.state["paused"] and not finishing:
+            break
+        t += step_seconds
+
+    result = scheduler.stats()
+    result.update({
+        "fleet_size": fleet_size,
+        "updated": len(updated),
+        "elapsed_seconds": t,
+        "peak_concurrent_downloads": peak_downloads,
+        "timeline": timeline
+    })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate an OTA rollout policy against a synthetic fleet")
+    parser.add_argument("--policy", default="{}", help="Rollout policy as JSON")
+    parser.add_argument("--fleet-size", type=int, default=1000)
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--download-seconds", type=int, default=120)
+    parser.add_argument("--check-interval", type=int, default=300)
+    args = parser.parse_args()
+
+    result = simulate_rollout(
+        json.loads(args.policy),
+        fleet_size=args.fleet_size,
+        size_bytes=int(args.size_mb * 1024 * 1024),
+        failure_rate=args.failure_rate,
+        download_seconds=args.download_seconds,
+        check_interval=args.check_interval
+    )
+    timeline = result.pop("timeline")
+    for point in timeline:
+        print(f"t={point['time'] / 3600:6.1f}h updated={point['updated']:6d} "
+              f"downloading={point['downloading']:5d} ring={point['ring']} paused={point['paused']}")
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+A/B install slots for atomic OTA updates.
+
+Updates are installed into the inactive slot while the application keeps
+running from the active one. Once the slot is fully populated and its
+bytecode compiled, the ``current`` symlink is flipped in a single atomic
+rename. Rolling back is the same flip in the other direction.
+
+Layout under the slots directory::
+
+    a/                  full application tree (src/, config.json, ...)
+    b/                  full application tree
+    current -> a        symlink the application is launched through
+    data/               device state shared by both slots (database, caches, credentials)
+
+Each slot reaches the shared state through symlinks at the paths the
+application already uses (``a/barcode_scans.db -> ../data/barcode_scans.db``),
+so a flip keeps the database and rebuilding the inactive slot never deletes
+it. State found in the running install when a slot is first prepared is
+moved into ``data/`` once and replaced by a link. A rename keeps the file,
+so the running application (and connections it already has open) keep
+writing to the state the new slot will use.
+
+The application must be started through ``current`` (for example
+``python <slots_dir>/current/src/main.py``) for the flip to take effect on
+restart.
+"""
+
+import os
+import json
+import shutil
+import sqlite3
+import logging
+import compileall
+from pathlib import Path
+from datetime import datetime, timezone
+
+logger = logging.getLogger("OTA_Client")
+
+SLOT_NAMES = ("a", "b")
+SLOT_INFO_FILE = ".slot.json"
+DATA_DIR_NAME = "data"
+
+# Device state kept in data/ and linked into every slot
+SHARED_FILES = ("barcode_scans.db", "credentials.json")
+SHARED_DIRS = ("barcode_scans_shards", "package_cache", "backup", "update_temp", "exports")
+
+def default_slots_dir(app_root):
+    """Slots directory for an install rooted at ``app_root``
+
+    When the application already runs from a slot, that is the slot's parent
+    directory, never a directory inside the slot.
+    """
+    resolved = Path(app_root).resolve()
+    if resolved.name in SLOT_NAMES and (resolved / SLOT_INFO_FILE).exists():
+        return resolved.parent
+    return Path(app_root) / "slots"
+
+def _adopt_state(source, target):
+    """Move running-install state to ``target`` and leave a link behind
+
+    Returns:
+        bool: True if moved, False if it had to be copied (different filesystem)
+    """
+    try:
+        os.rename(source, target)
+    except OSError:
+        _copy_state(source, target)
+        return False
+    os.symlink(os.path.relpath(target, source.parent), source)
+    return True
+
+def _copy_state(source, target):
+    if source.is_dir():
+        shutil.copytree(source, target, symlinks=True)
+    elif source.suffix == ".db":
+        # The backup API takes a consistent copy while the application writes
+        src_conn = sqlite3.connect(str(source))
+        dst_conn = sqlite3.connect(str(target))
+        try:
+            src_conn.backup(dst_conn)
+        finally:
+            dst_conn.close()
+            src_conn.close()
+    else:
+        shutil.copy2(source, target)
+
+class SlotManager:
+    def __init__(self, slots_dir):
+        self.slots_dir = Path(slots_dir)
+        self.slots_dir.mkdir(parents=True, exist_ok=True)
+        self.current_link = self.slots_dir / "current"
+        self.data_dir = self.slots_dir / DATA_DIR_NAME
+        self.data_dir.mkdir(exist_ok=True)
+
+    def slot_path(self, name):
+        return self.slots_dir / name
+
+    def active_slot(self):
+        """Return the name of the slot ``current`` points to, or None"""
+        if not self.current_link.is_symlink():
+            return None
+        target = Path(os.readlink(self.current_link)).name
+        return target if target in SLOT_NAMES else None
+
+    def inactive_slot(self):
+        """Return the name of the slot that is safe to overwrite"""
+        active = self.active_slot()
+        return SLOT_NAMES[1] if active == SLOT_NAMES[0] else SLOT_NAMES[0]
+
+    def active_root(self):
+        """Return the active slot path, or None before the first activation"""
+        active = self.active_slot()
+        return self.slot_path(active) if active else None
+
+    def slot_info(self, name):
+        """Return the metadata recorded when a slot was installed"""
+        info_path = self.slot_path(name) / SLOT_INFO_FILE
+        if not info_path.exists():
+            return None
+        with open(info_path, "r") as f:
+            return json.load(f)
+
+    def prepare(self, extract_dir, carry_over_root, carry_over_files=(), version=None, file_hash=None):
+        """Populate the inactive slot from an extracted update package
+
+        Args:
+            extract_dir: Extracted package contents
+            carry_over_root: Running application root to copy device files from
+            carry_over_files: Files copied from the running install (config)
+            version: Version being installed
+            file_hash: Hash of the package being installed
+
+        Returns:
+            Path: The prepared slot, or None if it failed to compile
+        """
+        name = self.inactive_slot()
+        slot = self.slot_path(name)
+
+        # The inactive slot is not serving, so it can be rebuilt from scratch
+        if slot.exists():
+            shutil.rmtree(slot)
+        shutil.copytree(extract_dir, slot)
+
+        # Device-specific files (full config) come from the running install
+        for rel_path in carry_over_files:
+            source = Path(carry_over_root) / rel_path
+            if source.is_file():
+                shutil.copy2(source, slot / rel_path)
+
+        self._link_shared_state(slot, carry_over_root)
+
+        # Compile bytecode now so the first start after the flip does not pay for it,
+        # and so a release with syntax errors never becomes active
+        if not compileall.compile_dir(str(slot), quiet=1, workers=0):
+            logger.error(f"Bytecode compilation failed in slot {name}")
+            return None
+
+        with open(slot / SLOT_INFO_FILE, "w") as f:
+            json.dump({
+                "slot": name,
+                "version": version,
+                "file_hash": file_hash,
+                "installed_at": datetime.now(timezone.utc).isoformat()
+            }, f, indent=2)
+
+        logger.info(f"Slot {name} prepared for version {version}")
+        return slot
+
+    def _link_shared_state(self, slot, running_root):
+        """Point the slot's state paths at data/, adopting state from the running install"""
+        for name in SHARED_FILES + SHARED_DIRS:
+            shared = self.data_dir / name
+            if not (shared.exists() or shared.is_symlink()):
+                source = Path(running_root) / name
+                if source.exists() and not source.is_symlink():
+                    if _adopt_state(source, shared):
+                        logger.info(f"Moved {name} into the shared data directory")
+                    else:
+                        logger.warning(f"Copied {name} into the shared data directory; "
+                                       f"writes to {source} after this point are not carried over")
+                elif name in SHARED_DIRS:
+                    shared.mkdir()
+
+            link = slot / name
+            if link.is_symlink() or link.is_file():
+                link.unlink()
+            elif link.is_dir():
+                shutil.rmtree(link)
+            os.symlink(Path("..") / DATA_DIR_NAME / name, link)
+
+    def activate(self, name):
+        """Atomically point ``current`` at a slot"""
+        if name not in SLOT_NAMES or not self.slot_path(name).exists():
+            raise ValueError(f"Slot {name} is not installed")
+
+        # Create the new link beside the old one and rename over it (atomic on POSIX)
+        tmp_link = self.slots_dir / "current.tmp"
+        if tmp_link.is_symlink() or tmp_link.exists():
+            tmp_link.unlink()
+        os.symlink(name, tmp_link)
+        os.replace(tmp_link, self.current_link)
+        logger.info(f"Activated slot {name}")
+
+    def rollback(self):
+        """Flip ``current`` back to the other slot
+
+        Returns:
+            str: The slot now active, or None if there is nothing to roll back to
+        """
+        previous = self.inactive_slot()
+        if self.active_slot() is None or not (self.slot_path(previous) / SLOT_INFO_FILE).exists():
+            logger.error("No previous slot available for rollback")
+            return None
+        self.activate(previous)
+        return previous
+
+    def launch_path(self, path, app_root=None):
+        """Map an application path to the same path through ``current``
+
+        Paths inside either slot are re-rooted directly. Paths under
+        ``app_root`` (an install not yet running from a slot, as on the first
+        A/B update) are re-rooted relative to it.
+        """
+        path = Path(path).resolve()
+        for name in SLOT_NAMES:
+            slot = self.slot_path(name).resolve()
+            if slot in path.parents:
+                return self.current_link / path.relative_to(slot)
+        if app_root is not None and Path(app_root).resolve() in path.parents:
+            return self.current_link / path.relative_to(Path(app_root).resolve())
+        return path
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Incremental, deduplicated application snapshots for OTA rollbacks.
+
+Each snapshot is a JSON manifest mapping relative paths to the SHA256 of
+their contents. File contents live once in a content-addressed object store,
+so a new snapshot only writes files that changed since the previous one and
+a restore only rewrites files that differ from the snapshot.
+
+Layout under the backup directory::
+
+    objects/ab/abcdef...      file contents keyed by SHA256
+    snapshots/<id>.json       snapshot manifests
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+
+logger = logging.getLogger("OTA_Client")
+
+# Default number of snapshots kept in the backup directory
+DEFAULT_RETENTION = 5
+
+# Paths that are regenerated at runtime and never snapshotted or restored
+EXCLUDED_DIRS = {"__pycache__"}
+EXCLUDED_SUFFIXES = {".pyc", ".pyo", ".log"}
+
+def _hash_file(file_path):
+    """Calculate SHA256 hash of a file"""
+    sha256_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for byte_block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
+class SnapshotStore:
+    def __init__(self, backup_dir, root_dir, tree_dirs=("src",), extra_files=(), retention=DEFAULT_RETENTION):
+        """
+        Args:
+            backup_dir: Directory holding objects and snapshot manifests
+            root_dir: Application root all snapshot paths are relative to
+            tree_dirs: Directories (relative to root_dir) snapshotted recursively
+            extra_files: Individual files (relative to root_dir) to include
+            retention: Number of snapshots to keep
+        """
+        self.backup_dir = Path(backup_dir)
+        self.root_dir = Path(root_dir)
+        self.tree_dirs = tuple(tree_dirs)
+        self.extra_files = tuple(extra_files)
+        self.retention = retention
+        self.objects_dir = self.backup_dir / "objects"
+        self.snapshots_dir = self.backup_dir / "snapshots"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+
+    def _object_path(self, file_hash):
+        return self.objects_dir / file_hash[:2] / file_hash
+
+    def _is_excluded(self, rel_path):
+        parts = Path(rel_path).parts
+        return any(part in EXCLUDED_DIRS for part in parts) or Path(rel_path).suffix in EXCLUDED_SUFFIXES
+
+    def _iter_files(self):
+        """Yield relative paths of all files covered by a snapshot"""
+        for tree in self.tree_dirs:
+            tree_path = self.root_dir / tree
+            if not tree_path.exists():
+                continue
+            for root, dirs, files in os.walk(tree_path):
+                dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+                for file in files:
+                    rel_path = os.path.relpath(os.path.join(root, file), self.root_dir)
+                    if not self._is_excluded(rel_path):
+                        yield rel_path
+        for extra in self.extra_files:
+            if (self.root_dir / extra).is_file():
+                yield extra
+
+    def list_snapshots(self):
+        """Return snapshot manifest paths, oldest first"""
+        return sorted(self.snapshots_dir.glob("*.json"))
+
+    def load_manifest(self, manifest_path):
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+
+    def create(self, version=None):
+        """Create a snapshot of the application, storing only new file contents
+
+        Returns:
+            Path: The snapshot manifest path
+        """
+        snapshots = self.list_snapshots()
+        previous = self.load_manifest(snapshots[-1])["files"] if snapshots else {}
+
+        files = {}
+        new_objects = 0
+        for rel_path in self._iter_files():
+            file_path = self.root_dir / rel_path
+            stat = file_path.stat()
+            prev = previous.get(rel_path)
+
+            # Unchanged size and mtime: reuse the previous hash without reading the file
+            if prev and prev["size"] == stat.st_size and prev["mtime_ns"] == stat.st_mtime_ns \
+                    and self._object_path(prev["hash"]).exists():
+                file_hash = prev["hash"]
+            else:
+                file_hash = _hash_file(file_path)
+                object_path = self._object_path(file_hash)
+                if not object_path.exists():
+                    object_path.parent.mkdir(exist_ok=True)
+                    tmp_path = object_path.with_suffix(".part")
+                    shutil.copyfile(file_path, tmp_path)
+                    os.replace(tmp_path, object_path)
+                    new_objects += 1
+
+            files[rel_path] = {
+                "hash": file_hash,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "mode": stat.st_mode & 0o777
+            }
+
+        snapshot_id = f"snapshot_{time.strftime('%Y%m%d%H%M%S')}_{time.time_ns() % 1000000:06d}"
+        manifest = {
+            "snapshot_id": snapshot_id,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "version": version,
+            "files": files
+        }
+        manifest_path = self.snapshots_dir / f"{snapshot_id}.json"
+        tmp_path = manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+        logger.info(f"Snapshot {snapshot_id} created: {len(files)} files, {new_objects} new objects")
+        self.apply_retention()
+        return manifest_path
+
+    def restore(self, manifest_path):
+        """Restore the application to a snapshot, rewriting only differing files
+
+        Returns:
+            dict: Counts of restored, unchanged and removed files
+        """
+        manifest = self.load_manifest(manifest_path)
+        files = manifest["files"]
+
+        # Verify every object is present before touching the application
+        missing = [p for p, entry in files.items() if not self._object_path(entry["hash"]).exists()]
+        if missing:
+            raise FileNotFoundError(f"Snapshot {manifest['snapshot_id']} is missing objects for: {missing[:5]}")
+
+        restored = unchanged = removed = 0
+        for rel_path, entry in files.items():
+            dest_path = self.root_dir / rel_path
+            if dest_path.is_file():
+                stat = dest_path.stat()
+                if stat.st_size == entry["size"] and (
+                    stat.st_mtime_ns == entry["mtime_ns"] or _hash_file(dest_path) == entry["hash"]
+                ):
+                    unchanged += 1
+                    continue
+
+            # Copy (never hardlink) so later in-place writes cannot corrupt the object store
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = dest_path.with_name(f".{dest_path.name}.restore")
+            shutil.copyfile(self._object_path(entry["hash"]), tmp_path)
+            os.chmod(tmp_path, entry["mode"])
+            os.utime(tmp_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            os.replace(tmp_path, dest_path)
+            restored += 1
+
+        # Remove files the update added that are not part of the snapshot
+        for rel_path in list(self._iter_files()):
+            if rel_path not in files and rel_path not in self.extra_files:
+                (self.root_dir / rel_path).unlink()
+                removed += 1
+
+        logger.info(
+            f"Snapshot {manifest['snapshot_id']} restored: "
+            f"{restored} restored, {unchanged} unchanged, {removed} removed"
+        )
+        return {"restored": restored, "unchanged": unchanged, "removed": removed}
+
+    def apply_retention(self):
+        """Keep the newest snapshots and drop objects no longer referenced"""
+        snapshots = self.list_snapshots()
+        expired = snapshots[:-self.retention] if self.retention > 0 else []
+        for manifest_path in expired:
+            manifest_path.unlink()
+
+        # Legacy full zip backups follow the same retention
+        legacy = sorted(self.backup_dir.glob("backup_*.zip"))
+        for zip_path in legacy[:-self.retention] if self.retention > 0 else []:
+            zip_path.unlink()
+
+        referenced = set()
+        for manifest_path in self.list_snapshots():
+            referenced.update(entry["hash"] for entry in self.load_manifest(manifest_path)["files"].values())
+
+        freed = 0
+        for object_path in self.objects_dir.glob("*/*"):
+            if object_path.name not in referenced:
+                object_path.unlink()
+                freed += 1
+
+        if expired or freed:
+            logger.info(f"Backup retention: removed {len(expired)} snapshots and {freed} objects")
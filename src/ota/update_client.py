@@ -5,11 +5,11 @@ import sys
 import json
 import time
 import hashlib
-import requests
 import zipfile
 import shutil
 import subprocess
 import logging
+import compileall
 from pathlib import Path
 import tempfile
 
@@ -18,6 +18,11 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from src.utils.config import load_config
+from src.utils.lazy import lazy_import
+from src.ota.package_cache import PackageCache, DEFAULT_MAX_CACHE_BYTES, EMPTY_CACHE_MARKER
+from src.ota.snapshots import SnapshotStore, DEFAULT_RETENTION
+from src.ota.slots import SlotManager, default_slots_dir
+from src.ota.peer_server import PeerServer, DEFAULT_PEER_PORT
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +35,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("OTA_Client")
 
+# Imported on first request rather than at startup
+requests = lazy_import("requests")
+
 # Device ID from memory
 DEVICE_ID = "694833b1b872"
 
@@ -39,13 +47,45 @@ class OTAUpdateClient:
         self.device_id = DEVICE_ID
         self.server_url = self.config.get("ota_server", {}).get("url", "http://localhost:8000")
         self.current_version = self.config.get("app_version", "0.0.0")
+        self.ota_config = self.config.get("ota", {})
         self.update_dir = project_root / "update_temp"
         self.update_dir.mkdir(exist_ok=True)
         
+        # Content-addressed cache of verified packages (survives _cleanup)
+        self.package_cache = PackageCache(
+            project_root / "package_cache",
+            self.ota_config.get("cache_max_bytes", DEFAULT_MAX_CACHE_BYTES)
+        )
+        
         # Ensure we have a backup directory
         self.backup_dir = project_root / "backup"
         self.backup_dir.mkdir(exist_ok=True)
         
+        # Incremental snapshots: only changed files are stored per backup
+        self.snapshots = SnapshotStore(
+            self.backup_dir,
+            project_root,
+            tree_dirs=["src"],
+            extra_files=["config.json", "credentials.json", "requirements.txt"],
+            retention=self.ota_config.get("backup_retention", DEFAULT_RETENTION)
+        )
+        
+        # Optional A/B slot layout: install beside the running copy, flip a symlink
+        self.slots = None
+        if self.ota_config.get("install_mode", "in_place") == "slots":
+            self.slots = SlotManager(self.ota_config.get("slots_dir") or default_slots_dir(project_root))
+            logger.info(f"A/B slot install enabled (active slot: {self.slots.active_slot()})")
+        
+        # Optional LAN sharing: serve verified cached packages to peers on the same site
+        self.peer_server = None
+        if self.ota_config.get("peer_sharing", False):
+            self.peer_server = PeerServer(
+                self.package_cache,
+                port=self.ota_config.get("peer_port", DEFAULT_PEER_PORT)
+            )
+            if not self.peer_server.start():
+                self.peer_server = None
+        
         logger.info(f"OTA Update Client initialized for device {self.device_id}")
         logger.info(f"Current version: {self.current_version}")
         logger.info(f"Update server: {self.server_url}")
@@ -54,7 +94,17 @@ class OTAUpdateClient:
         """Check if updates are available from the server"""
         try:
             url = f"{self.server_url}/devices/{self.device_id}/check"
-            response = requests.post(url, params={"current_version": self.current_version})
+            params = {
+                "current_version": self.current_version,
+                # Let the server know which packages we already hold so it can pick deltas;
+                # requests drops an empty list, so an empty cache is sent as [""]
+                "cached_hashes": self.package_cache.list_hashes() or [EMPTY_CACHE_MARKER]
+            }
+            if self.peer_server:
+                params["peer_port"] = self.peer_server.port
+            if self.ota_config.get("site"):
+                params["site"] = self.ota_config["site"]
+            response = requests.post(url, params=params)
             
             if response.status_code == 200:
                 update_info = response.json()
@@ -73,8 +123,44 @@ class OTAUpdateClient:
             logger.error(f"Error checking for updates: {e}")
             return None
     
-    def download_update(self, update_id):
-        """Download an update package from the server"""
+    def _download_verified(self, url, dest_path, expected_hash, timeout=None):
+        """Stream a package to disk, hashing while writing; True if the hash matches"""
+        response = requests.get(url, stream=True, timeout=timeout)
+        if response.status_code != 200:
+            logger.warning(f"Download from {url} failed: {response.status_code}")
+            return False
+        
+        sha256_hash = hashlib.sha256()
+        with open(dest_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                sha256_hash.update(chunk)
+                f.write(chunk)
+        
+        file_hash = sha256_hash.hexdigest()
+        if file_hash != expected_hash:
+            logger.error(f"Hash verification failed for {url}: {file_hash} != {expected_hash}")
+            dest_path.unlink()
+            return False
+        return True
+    
+    def _download_from_peers(self, peers, update_info, dest_path):
+        """Try LAN peers first; returns the peer used or None"""
+        file_hash = update_info.get("file_hash")
+        for peer in peers or []:
+            try:
+                if self._download_verified(f"{peer}/packages/{file_hash}", dest_path, file_hash, timeout=10):
+                    return peer
+            except Exception as e:
+                logger.warning(f"Peer {peer} unavailable: {e}")
+        return None
+    
+    def download_update(self, update_id, peers=None):
+        """Download an update package, preferring LAN peers over the server
+        
+        Args:
+            update_id: Update to download
+            peers: Base URLs of peers that hold the verified package
+        """
         try:
             # Get update info
             url = f"{self.server_url}/updates/{update_id}"
@@ -85,31 +171,38 @@ class OTAUpdateClient:
                 return None
             
             update_info = response.json()
-            logger.info(f"Downloading update: {update_info.get('version')}")
             
-            # Download update file
-            download_url = f"{self.server_url}/updates/{update_id}/download"
-            response = requests.get(download_url, stream=True)
-            
-            if response.status_code != 200:
-                logger.error(f"Failed to download update: {response.status_code} - {response.text}")
-                return None
+            # Reuse a previously verified package if we already hold it
+            cached_path = self._get_cached_package(update_info.get("file_hash"))
+            if cached_path:
+                logger.info(f"Using cached package for update {update_info.get('version')}")
+                return update_info, cached_path
             
-            # Save update file
+            logger.info(f"Downloading update: {update_info.get('version')}")
             update_file_path = self.update_dir / update_info.get("filename")
-            with open(update_file_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            logger.info(f"Update downloaded to {update_file_path}")
+            file_hash = update_info.get("file_hash")
             
-            # Verify file hash
-            file_hash = self._calculate_file_hash(update_file_path)
-            if file_hash != update_info.get("file_hash"):
-                logger.error(f"Hash verification failed: {file_hash} != {update_info.get('file_hash')}")
-                return None
+            peer = self._download_from_peers(peers, update_info, update_file_path)
+            if peer:
+                logger.info(f"Update downloaded from LAN peer {peer}")
+            else:
+                # Download update file from the server, verifying the hash while writing
+                download_url = f"{self.server_url}/updates/{update_id}/download"
+                if not self._download_verified(download_url, update_file_path, file_hash):
+                    return None
+                logger.info(f"Update downloaded to {update_file_path}")
             
             logger.info("Hash verification successful")
+            
+            try:
+                self.package_cache.put(
+                    file_hash, update_file_path,
+                    version=update_info.get("version"),
+                    filename=update_info.get("filename")
+                )
+            except OSError as e:
+                logger.warning(f"Could not cache update package: {e}")
+            
             return update_info, update_file_path
         except Exception as e:
             logger.error(f"Error downloading update: {e}")
@@ -123,29 +216,28 @@ class OTAUpdateClient:
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
     
+    def _get_cached_package(self, file_hash):
+        """Return the path of a cached package after re-verifying its hash"""
+        if not file_hash:
+            return None
+        cached_path = self.package_cache.get(file_hash)
+        if not cached_path:
+            return None
+        if self._calculate_file_hash(cached_path) != file_hash:
+            logger.warning(f"Cached package {file_hash[:12]} is corrupt, ignoring it")
+            return None
+        return cached_path
+    
     def _create_backup(self):
-        """Create a backup of the current application"""
+        """Create an incremental snapshot of the current application
+        
+        Returns:
+            Path: The snapshot manifest path, or None on failure
+        """
         try:
-            timestamp = time.strftime("%Y%m%d%H%M%S")
-            backup_path = self.backup_dir / f"backup_{timestamp}.zip"
-            
-            with zipfile.ZipFile(backup_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-                # Add source files
-                src_dir = project_root / "src"
-                for root, _, files in os.walk(src_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, project_root)
-                        zipf.write(file_path, arcname)
-                
-                # Add config files
-                for config_file in ["config.json", "credentials.json", "requirements.txt"]:
-                    file_path = project_root / config_file
-                    if file_path.exists():
-                        zipf.write(file_path, config_file)
-            
-            logger.info(f"Backup created at {backup_path}")
-            return backup_path
+            manifest_path = self.snapshots.create(version=self.current_version)
+            logger.info(f"Backup created at {manifest_path}")
+            return manifest_path
         except Exception as e:
             logger.error(f"Error creating backup: {e}")
             return None
@@ -213,16 +305,64 @@ class OTAUpdateClient:
                 else:
                     shutil.copy2(item, dest_path)
             
+            # Pre-compile bytecode so the restart after the update does not pay for it
+            if not compileall.compile_dir(str(project_root / "src"), quiet=1, workers=0):
+                logger.warning("Some modules failed to compile; they will be compiled on import")
+            
             logger.info("Update applied successfully")
             return True
         except Exception as e:
             logger.error(f"Error applying update: {e}")
             return False
     
-    def _update_version(self, version):
+    def _apply_update_to_slot(self, extract_dir, update_info):
+        """Install the extracted update into the inactive slot and flip to it"""
+        try:
+            requirements_path = extract_dir / "requirements.txt"
+            if requirements_path.exists():
+                if not self._install_requirements(requirements_path):
+                    return False
+            
+            # Keep the device's own config, not the sanitized package copy; the database,
+            # caches and credentials are linked in from the shared data directory
+            slot = self.slots.prepare(
+                extract_dir,
+                self._config_root(),
+                carry_over_files=["config.json"],
+                version=update_info.get("version"),
+                file_hash=update_info.get("file_hash")
+            )
+            if not slot:
+                return False
+            
+            # Record the version before the flip so the new slot starts consistent
+            if not self._update_version(update_info.get("version"), slot / "config.json"):
+                return False
+            
+            self.slots.activate(slot.name)
+            logger.info(f"Update applied to slot {slot.name}")
+            return True
+        except Exception as e:
+            logger.error(f"Error applying update to slot: {e}")
+            return False
+    
+    def _install_extracted(self, extract_dir, update_info):
+        """Install an extracted package using the configured install mode"""
+        if self.slots:
+            return self._apply_update_to_slot(extract_dir, update_info)
+        return self._apply_update(extract_dir)
+    
+    def _config_root(self):
+        """Directory holding the config.json of the running install"""
+        if self.slots and self.slots.active_root():
+            return self.slots.active_root()
+        return project_root
+    
+    def _update_version(self, version, config_path=None):
         """Update the application version in config"""
         try:
-            config_path = project_root / "config.json"
+            if config_path is None:
+                config_path = self._config_root() / "config.json"
             with open(config_path, "r") as f:
                 config = json.load(f)
             
@@ -250,7 +390,8 @@ class OTAUpdateClient:
                 "status": status
             }
             
-            response = requests.post(url, json=data)
+            # The server reads version and status as query parameters
+            response = requests.post(url, params=data)
             
             if response.status_code == 200:
                 logger.info(f"Server notified of update status: {status}")
@@ -265,9 +406,13 @@ class OTAUpdateClient:
     def _cleanup(self):
         """Clean up temporary files"""
         try:
-            if self.update_dir.exists():
-                shutil.rmtree(self.update_dir)
+            # Empty the directory rather than removing it: with A/B slots it is a link into data/
             self.update_dir.mkdir(exist_ok=True)
+            for item in self.update_dir.iterdir():
+                if item.is_dir() and not item.is_symlink():
+                    shutil.rmtree(item)
+                else:
+                    item.unlink()
             
             logger.info("Cleanup completed")
             return True
@@ -275,12 +420,43 @@ class OTAUpdateClient:
             logger.error(f"Error during cleanup: {e}")
             return False
     
-    def _restore_backup(self, backup_path):
-        """Restore from backup in case of failure"""
+    def _restore_from_cache(self, version):
+        """Reinstall a recently installed version from the package cache"""
+        cached = self.package_cache.find_version(version)
+        if not cached:
+            logger.info(f"No cached package for version {version}")
+            return False
+        
+        file_hash, _ = cached
+        cached_path = self._get_cached_package(file_hash)
+        if not cached_path:
+            return False
+        
+        logger.info(f"Restoring version {version} from cached package {file_hash[:12]}")
+        extract_dir = self._extract_update(cached_path)
+        if not extract_dir:
+            return False
+        return self._install_extracted(extract_dir, {"version": version, "file_hash": file_hash})
+    
+    def _restore_backup(self, backup_path, version=None):
+        """Restore from backup in case of failure
+        
+        If the backup is missing or cannot be restored and ``version`` is given,
+        the cached package for that version is reinstalled instead.
+        """
+        if not backup_path or not Path(backup_path).exists():
+            logger.warning(f"Backup not available: {backup_path}")
+            return bool(version) and self._restore_from_cache(version)
+        
         try:
             logger.info(f"Restoring from backup: {backup_path}")
             
-            # Extract backup to temporary directory
+            if Path(backup_path).suffix == ".json":
+                self.snapshots.restore(backup_path)
+                logger.info("Backup restored successfully")
+                return True
+            
+            # Legacy full zip backup: extract to temporary directory
             extract_dir = tempfile.mkdtemp()
             with zipfile.ZipFile(backup_path, "r") as zipf:
                 zipf.extractall(extract_dir)
@@ -304,6 +480,63 @@ class OTAUpdateClient:
             return True
         except Exception as e:
             logger.error(f"Error restoring backup: {e}")
+            if version:
+                return self._restore_from_cache(version)
+            return False
+    
+    def rollback_slot(self):
+        """Roll back to the previously active slot (constant-time symlink flip)"""
+        if not self.slots:
+            logger.error("Slot rollback requested but A/B slots are not enabled")
+            return False
+        
+        slot_name = self.slots.rollback()
+        if not slot_name:
+            return False
+        
+        info = self.slots.slot_info(slot_name) or {}
+        version = info.get("version") or self.current_version
+        self.config["app_version"] = version
+        self.current_version = version
+        self._notify_server({"version": version}, "rolled_back")
+        logger.info(f"Rolled back to slot {slot_name} (version {version})")
+        return True
+    
+    def rollback_to_version(self, version):
+        """Roll back to a recently installed version using cached package bytes"""
+        try:
+            # The previous slot may already hold this version
+            if self.slots:
+                info = self.slots.slot_info(self.slots.inactive_slot()) or {}
+                if info.get("version") == version:
+                    return self.rollback_slot()
+                
+                if not self._restore_from_cache(version):
+                    logger.error(f"Rollback to {version} failed, running slot left untouched")
+                    return False
+                self._notify_server({"version": version}, "rolled_back")
+                self._cleanup()
+                logger.info(f"Rolled back to version {version}")
+                return True
+            
+            previous_version = self.current_version
+            backup_path = self._create_backup()
+            if not backup_path:
+                return False
+            
+            if not self._restore_from_cache(version):
+                logger.error(f"Rollback to {version} failed, restoring from backup")
+                self._restore_backup(backup_path, previous_version)
+                return False
+            
+            self._update_version(version)
+            self._notify_server({"version": version}, "rolled_back")
+            self._cleanup()
+            
+            logger.info(f"Rolled back to version {version}")
+            return True
+        except Exception as e:
+            logger.error(f"Error during rollback: {e}")
             return False
     
     def apply_update(self):
@@ -315,26 +548,39 @@ class OTAUpdateClient:
                 return False
             
             # Download update
-            download_result = self.download_update(update_info.get("update_id"))
+            download_result = self.download_update(update_info.get("update_id"), update_info.get("peers"))
             if not download_result:
                 return False
             
             update_info, update_file_path = download_result
-            
-            # Create backup
-            backup_path = self._create_backup()
-            if not backup_path:
-                return False
+            previous_version = self.current_version
             
             # Extract update
             extract_dir = self._extract_update(update_file_path)
             if not extract_dir:
                 return False
             
+            # A/B slots: the running slot is never modified, so no backup is needed
+            if self.slots:
+                if not self._apply_update_to_slot(extract_dir, update_info):
+                    logger.error("Failed to prepare inactive slot, keeping current slot")
+                    self._notify_server(update_info, "failed")
+                    return False
+                
+                self._notify_server(update_info, "success")
+                self._cleanup()
+                logger.info(f"Update to version {update_info.get('version')} completed successfully")
+                return True
+            
+            # Create backup
+            backup_path = self._create_backup()
+            if not backup_path:
+                return False
+            
             # Apply update
             if not self._apply_update(extract_dir):
                 logger.error("Failed to apply update, restoring from backup")
-                self._restore_backup(backup_path)
+                self._restore_backup(backup_path, previous_version)
                 self._notify_server(update_info, "failed")
                 return False
             
@@ -361,8 +607,11 @@ def main():
     if client.apply_update():
         logger.info("Update process completed successfully")
         print("Update process completed successfully")
-        # Restart the application
-        os.execv(sys.executable, [sys.executable] + sys.argv)
+        # Restart the application (through the current slot link when using A/B slots)
+        argv = list(sys.argv)
+        if client.slots:
+            argv[0] = str(client.slots.launch_path(argv[0], project_root))
+        os.execv(sys.executable, [sys.executable] + argv)
     else:
         logger.info("No updates applied")
         print("No updates applied")
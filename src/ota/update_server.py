@@ -6,20 +6,33 @@ import hashlib
 import datetime
 import shutil
 import zipfile
+import argparse
+import threading
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks, Query
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks, Query, Body, Request
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 from typing import List, Optional
 from datetime import timezone, datetime as dt
 
+try:
+    import fcntl
+except ImportError:  # Non-POSIX platforms: fall back to in-process locking only
+    fcntl = None
+
 # Add project root to Python path
 import sys
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from src.utils.config import load_config
+from src.ota.rollout import RolloutScheduler, simulate_rollout
+from src.ota.aggregator import FleetInventoryStore, DEFAULT_PAGE_SIZE
+from src.ota.package_cache import EMPTY_CACHE_MARKER
 
 app = FastAPI(title="Raspberry Pi OTA Update Server", 
               description="Server for managing Over-the-Air updates for Raspberry Pi devices")
@@ -44,10 +57,53 @@ DEVICES_DIR.mkdir(exist_ok=True)
 # Device ID from memory
 DEFAULT_DEVICE_ID = "694833b1b872"
 
+# Buffer size for streaming package uploads and hashing (1 MiB)
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Maximum number of LAN peers suggested to a device per check
+MAX_PEERS = 5
+
+# Storage helpers below are blocking; handlers call them through run_in_threadpool
+# so slow disk I/O never stalls the event loop. Writes are atomic (write + rename)
+# and read-modify-write cycles hold a file lock, so several uvicorn worker
+# processes can share the same updates/ and devices/ directories.
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive lock shared by threads and worker processes"""
+    with _local_locks_guard:
+        local_lock = _local_locks.setdefault(str(lock_path), threading.Lock())
+    with local_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def write_json_atomic(path, data):
+    """Write JSON so concurrent readers never observe a partial file"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def update_dir_for(update_id):
+    """Directory of an update, or None if the id is not a plain name inside updates/"""
+    if not update_id or update_id in (".", "..") or "/" in update_id or "\\" in update_id:
+        return None
+    return UPDATES_DIR / update_id
+
 def get_update_info(update_id):
     """Get information about a specific update"""
-    update_path = UPDATES_DIR / update_id
-    if not update_path.exists():
+    update_path = update_dir_for(update_id)
+    if update_path is None or not update_path.exists():
         return None
     
     info_file = update_path / "info.json"
@@ -57,24 +113,34 @@ def get_update_info(update_id):
     with open(info_file, "r") as f:
         return json.load(f)
 
-def get_device_info(device_id):
-    """Get information about a specific device"""
+def device_lock(device_id):
+    return file_lock(DEVICES_DIR / f".{device_id}.lock")
+
+def _read_device_file(device_id):
+    """Read a device record, or build the default one for a new device"""
     device_file = DEVICES_DIR / f"{device_id}.json"
     if not device_file.exists():
-        # Create a new device file with default settings
-        device_info = {
+        return {
             "device_id": device_id,
             "current_version": None,
             "last_check": None,
             "last_update": None,
             "status": "registered"
-        }
-        with open(device_file, "w") as f:
-            json.dump(device_info, f, indent=2)
-        return device_info
+        }, False
     
     with open(device_file, "r") as f:
-        return json.load(f)
+        return json.load(f), True
+
+def get_device_info(device_id):
+    """Get information about a specific device"""
+    device_info, exists = _read_device_file(device_id)
+    if not exists:
+        with device_lock(device_id):
+            # Create a new device file with default settings
+            device_info, exists = _read_device_file(device_id)
+            if not exists:
+                write_json_atomic(DEVICES_DIR / f"{device_id}.json", device_info)
+    return device_info
 
 def get_current_time_iso():
     """Get current time in ISO format with timezone"""
@@ -84,23 +150,243 @@ def get_current_time_iso():
 
 def update_device_info(device_id, updates):
     """Update device information"""
-    device_info = get_device_info(device_id)
-    device_info.update(updates)
-    device_info["last_check"] = get_current_time_iso()
-    
-    with open(DEVICES_DIR / f"{device_id}.json", "w") as f:
-        json.dump(device_info, f, indent=2)
+    with device_lock(device_id):
+        device_info, _ = _read_device_file(device_id)
+        device_info.update(updates)
+        device_info["last_check"] = get_current_time_iso()
+        write_json_atomic(DEVICES_DIR / f"{device_id}.json", device_info)
     
     return device_info
 
+# Catalogue of updates, cached per worker and validated against a generation
+# token that publish_update_info rewrites (atomically) after each info.json.
+# Directory mtimes are not used: they change before info.json exists and can
+# repeat on filesystems with coarse timestamps.
+CATALOGUE_GENERATION_FILE = UPDATES_DIR / ".generation"
+_catalogue_cache = {"stamp": None, "updates": []}
+_catalogue_lock = threading.Lock()
+
+def _catalogue_generation():
+    try:
+        return CATALOGUE_GENERATION_FILE.read_text()
+    except FileNotFoundError:
+        return ""
+
+def read_catalogue():
+    """All updates with an info.json, newest first"""
+    stamp = _catalogue_generation()
+    with _catalogue_lock:
+        if _catalogue_cache["stamp"] == stamp:
+            return list(_catalogue_cache["updates"])
+    
+    updates = []
+    for update_dir in UPDATES_DIR.iterdir():
+        if update_dir.is_dir():
+            info_file = update_dir / "info.json"
+            if info_file.exists():
+                with open(info_file, "r") as f:
+                    updates.append(json.load(f))
+    
+    # Sort by creation date (newest first)
+    updates.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+    with _catalogue_lock:
+        _catalogue_cache["stamp"] = stamp
+        _catalogue_cache["updates"] = updates
+    return list(updates)
+
+def publish_update_info(update_dir, update_info):
+    """Write info.json and invalidate every worker's catalogue cache"""
+    write_json_atomic(update_dir / "info.json", update_info)
+    # A fresh token per publish, so concurrent workers never produce the same value
+    write_json_atomic(CATALOGUE_GENERATION_FILE, {"generation": uuid.uuid4().hex})
+
+def read_devices():
+    """All device records"""
+    devices = []
+    for device_file in DEVICES_DIR.iterdir():
+        if device_file.is_file() and device_file.suffix == ".json":
+            with open(device_file, "r") as f:
+                devices.append(json.load(f))
+    return devices
+
 def calculate_file_hash(file_path):
     """Calculate SHA256 hash of a file"""
     sha256_hash = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
+        for byte_block in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
+def save_stream_with_hash(source, file_path, chunk_size=STREAM_CHUNK_SIZE):
+    """Write a file-like object to disk, hashing it in the same pass
+
+    Returns:
+        tuple: (sha256 hex digest, size in bytes)
+    """
+    sha256_hash = hashlib.sha256()
+    size = 0
+    with open(file_path, "wb") as f:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            sha256_hash.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return sha256_hash.hexdigest(), size
+
+def rollout_lock(update_id):
+    """Serializes read-modify-write of an update's rollout state
+
+    The update must exist: the lock file lives in its directory.
+    """
+    if get_update_info(update_id) is None:
+        raise KeyError(f"Update {update_id} not found")
+    return file_lock(update_dir_for(update_id) / "rollout.lock")
+
+def load_rollout(update_id):
+    """Load the rollout scheduler for an update, or None if it has no policy"""
+    if update_dir_for(update_id) is None:
+        return None
+    rollout_file = update_dir_for(update_id) / "rollout.json"
+    if not rollout_file.exists():
+        return None
+    with open(rollout_file, "r") as f:
+        return RolloutScheduler.from_dict(update_id, json.load(f))
+
+def save_rollout(scheduler):
+    """Persist rollout policy and state next to the update's info.json"""
+    write_json_atomic(UPDATES_DIR / scheduler.update_id / "rollout.json", scheduler.to_dict())
+
+def modify_rollout(update_id, action):
+    """Apply ``action`` to an update's rollout under its lock and persist it
+
+    Returns:
+        tuple: (scheduler, action result); scheduler is None without a policy
+    """
+    with rollout_lock(update_id):
+        scheduler = load_rollout(update_id)
+        if scheduler is None:
+            return None, None
+        result = action(scheduler)
+        save_rollout(scheduler)
+        return scheduler, result
+
+def site_for(client_host, site=None):
+    """Group devices by explicit site name, else by their /24 network"""
+    if site:
+        return site
+    if client_host and client_host.count(".") == 3:
+        return client_host.rsplit(".", 1)[0] + ".0/24"
+    return client_host
+
+def find_peers(device_id, site, file_hash):
+    """List peer URLs on the same site that advertise a verified copy of a package"""
+    candidates = []
+    for peer in read_devices():
+        if peer.get("device_id") == device_id or peer.get("site") != site:
+            continue
+        if not peer.get("peer_address") or file_hash not in peer.get("cached_packages", []):
+            continue
+        candidates.append(peer)
+    
+    # Prefer peers that checked in most recently (most likely to be online)
+    candidates.sort(key=lambda peer: peer.get("last_check") or "", reverse=True)
+    return [f"http://{peer['peer_address']}" for peer in candidates[:MAX_PEERS]]
+
+async def require_update(update_id):
+    """Update info, or a 404 before any per-update file is touched"""
+    update_info = await run_in_threadpool(get_update_info, update_id)
+    if not update_info:
+        raise HTTPException(status_code=404, detail="Update not found")
+    return update_info
+
+def require_rollout(scheduler):
+    if scheduler is None:
+        raise HTTPException(status_code=404, detail="No rollout policy for this update")
+    return scheduler
+
+def process_update_check(device_id, current_version, cached_hashes, client_host, peer_port, site):
+    """Record a device check-in and decide whether to offer it the latest update"""
+    # Update device info
+    updates = {"last_check": get_current_time_iso()}
+    if current_version:
+        updates["current_version"] = current_version
+    if cached_hashes is None and peer_port:
+        # Peer-serving clients always send their cache; nothing sent means it is empty
+        cached_hashes = []
+    if cached_hashes is not None:
+        # Packages the device already holds, usable as delta bases and by LAN peers
+        updates["cached_packages"] = [file_hash for file_hash in cached_hashes if file_hash != EMPTY_CACHE_MARKER]
+    
+    # Record where the device can be reached by LAN peers
+    updates["site"] = site_for(client_host, site)
+    updates["peer_address"] = f"{client_host}:{peer_port}" if peer_port and client_host else None
+    
+    device_info = update_device_info(device_id, updates)
+    
+    # Get latest update
+    all_updates = read_catalogue()
+    if not all_updates:
+        return {"device_id": device_id, "has_update": False}
+    
+    latest_update = all_updates[0]
+    
+    # Check if device needs update
+    has_update = True
+    if device_info.get("current_version") == latest_update.get("version"):
+        has_update = False
+    
+    response = {
+        "device_id": device_id,
+        "current_version": device_info.get("current_version"),
+        "latest_version": latest_update.get("version"),
+        "has_update": has_update,
+        "update_id": latest_update.get("update_id") if has_update else None
+    }
+    
+    # Staged rollout: only offer the update when the policy grants a download slot
+    if has_update:
+        scheduler, decision = modify_rollout(
+            latest_update["update_id"],
+            lambda scheduler: scheduler.request(device_id, latest_update.get("size_bytes", 0))
+        )
+        if scheduler is not None:
+            granted, reason = decision
+            response["rollout_status"] = reason
+            if not granted:
+                response["has_update"] = False
+                response["update_id"] = None
+                response["retry_after"] = scheduler.retry_after()
+    
+    # Suggest LAN peers that already hold the verified package
+    if response["has_update"]:
+        response["file_hash"] = latest_update.get("file_hash")
+        response["peers"] = find_peers(device_id, device_info.get("site"), latest_update.get("file_hash"))
+    
+    return response
+
+# Device statuses that end an install, and whether they count as a success
+ROLLOUT_OUTCOMES = {"success": True, "failed": False}
+
+def process_update_status(device_id, version, status):
+    """Record an install outcome and feed it to the matching rollout"""
+    updates = {
+        "current_version": version,
+        "last_update": get_current_time_iso(),
+        "status": status
+    }
+    
+    device_info = update_device_info(device_id, updates)
+    
+    # Feed final install outcomes to the rollout of the matching update (may auto-pause it);
+    # rollbacks and progress statuses are not install outcomes
+    if status in ROLLOUT_OUTCOMES:
+        for update in read_catalogue():
+            if update.get("version") == version:
+                modify_rollout(update["update_id"],
+                               lambda scheduler: scheduler.report(device_id, ROLLOUT_OUTCOMES[status]))
+                break
+    
+    return device_info
+
 @app.get("/")
 async def root():
     return {"message": "Raspberry Pi OTA Update Server", "status": "running"}
@@ -116,15 +402,11 @@ async def create_update(
     # Generate a unique update ID
     update_id = f"update_{version.replace('.', '_')}_{dt.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
     update_dir = UPDATES_DIR / update_id
-    update_dir.mkdir(exist_ok=True)
+    await run_in_threadpool(update_dir.mkdir, exist_ok=True)
     
-    # Save the uploaded file
+    # Save the uploaded file, hashing it while writing (one disk pass, off the event loop)
     file_path = update_dir / update_file.filename
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(update_file.file, f)
-    
-    # Calculate file hash
-    file_hash = calculate_file_hash(file_path)
+    file_hash, size_bytes = await run_in_threadpool(save_stream_with_hash, update_file.file, file_path)
     
     # Create update info
     update_info = {
@@ -134,34 +416,23 @@ async def create_update(
         "filename": update_file.filename,
         "file_hash": file_hash,
         "created_at": get_current_time_iso(),
-        "size_bytes": os.path.getsize(file_path)
+        "size_bytes": size_bytes
     }
     
     # Save update info
-    with open(update_dir / "info.json", "w") as f:
-        json.dump(update_info, f, indent=2)
+    await run_in_threadpool(publish_update_info, update_dir, update_info)
     
     return update_info
 
 @app.get("/updates/list")
 async def list_updates():
     """List all available updates"""
-    updates = []
-    for update_dir in UPDATES_DIR.iterdir():
-        if update_dir.is_dir():
-            info_file = update_dir / "info.json"
-            if info_file.exists():
-                with open(info_file, "r") as f:
-                    updates.append(json.load(f))
-    
-    # Sort by creation date (newest first)
-    updates.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return updates
+    return await run_in_threadpool(read_catalogue)
 
 @app.get("/updates/{update_id}")
 async def get_update(update_id: str):
     """Get information about a specific update"""
-    update_info = get_update_info(update_id)
+    update_info = await run_in_threadpool(get_update_info, update_id)
     if not update_info:
         raise HTTPException(status_code=404, detail="Update not found")
     return update_info
@@ -169,7 +440,7 @@ async def get_update(update_id: str):
 @app.get("/updates/{update_id}/download")
 async def download_update(update_id: str):
     """Download a specific update package"""
-    update_info = get_update_info(update_id)
+    update_info = await run_in_threadpool(get_update_info, update_id)
     if not update_info:
         raise HTTPException(status_code=404, detail="Update not found")
     
@@ -186,69 +457,180 @@ async def download_update(update_id: str):
 @app.get("/devices/list")
 async def list_devices():
     """List all registered devices"""
-    devices = []
-    for device_file in DEVICES_DIR.iterdir():
-        if device_file.is_file() and device_file.suffix == ".json":
-            with open(device_file, "r") as f:
-                devices.append(json.load(f))
-    return devices
+    return await run_in_threadpool(read_devices)
 
 @app.get("/devices/{device_id}")
 async def get_device(device_id: str):
     """Get information about a specific device"""
-    device_info = get_device_info(device_id)
+    device_info = await run_in_threadpool(get_device_info, device_id)
     return device_info
 
 @app.post("/devices/{device_id}/check")
-async def check_for_updates(device_id: str, current_version: Optional[str] = None):
+async def check_for_updates(
+    request: Request,
+    device_id: str,
+    current_version: Optional[str] = None,
+    cached_hashes: Optional[List[str]] = Query(None),
+    peer_port: Optional[int] = None,
+    site: Optional[str] = None
+):
     """Check if updates are available for a device"""
-    # Update device info
-    updates = {"last_check": get_current_time_iso()}
-    if current_version:
-        updates["current_version"] = current_version
-    
-    device_info = update_device_info(device_id, updates)
-    
-    # Get latest update
-    all_updates = await list_updates()
-    if not all_updates:
-        return {"device_id": device_id, "has_update": False}
-    
-    latest_update = all_updates[0]
-    
-    # Check if device needs update
-    has_update = True
-    if device_info.get("current_version") == latest_update.get("version"):
-        has_update = False
-    
-    return {
-        "device_id": device_id,
-        "current_version": device_info.get("current_version"),
-        "latest_version": latest_update.get("version"),
-        "has_update": has_update,
-        "update_id": latest_update.get("update_id") if has_update else None
-    }
+    client_host = request.client.host if request.client else None
+    return await run_in_threadpool(
+        process_update_check, device_id, current_version, cached_hashes, client_host, peer_port, site
+    )
 
 @app.post("/devices/{device_id}/update_status")
 async def update_status(device_id: str, version: str, status: str):
     """Update the status of a device after applying an update"""
-    updates = {
-        "current_version": version,
-        "last_update": get_current_time_iso(),
-        "status": status
-    }
+    return await run_in_threadpool(process_update_status, device_id, version, status)
+
+@app.get("/updates/{update_id}/rollout")
+async def get_rollout(update_id: str):
+    """Get rollout policy and progress for an update"""
+    await require_update(update_id)
+    scheduler = require_rollout(await run_in_threadpool(load_rollout, update_id))
+    return {"update_id": update_id, "policy": scheduler.policy, "stats": scheduler.stats()}
+
+def replace_rollout_policy(update_id, policy):
+    with rollout_lock(update_id):
+        existing = load_rollout(update_id)
+        scheduler = RolloutScheduler(update_id, policy, existing.state if existing else None)
+        save_rollout(scheduler)
+    return scheduler
+
+@app.post("/updates/{update_id}/rollout")
+async def set_rollout(update_id: str, policy: dict = Body(...)):
+    """Create or replace the rollout policy for an update, keeping its progress"""
+    await require_update(update_id)
+    scheduler = await run_in_threadpool(replace_rollout_policy, update_id, policy)
+    return {"update_id": update_id, "policy": scheduler.policy, "stats": scheduler.stats()}
+
+@app.post("/updates/{update_id}/rollout/advance")
+async def advance_rollout(update_id: str):
+    """Move the rollout to its next ring"""
+    await require_update(update_id)
+    scheduler, _ = await run_in_threadpool(modify_rollout, update_id, lambda scheduler: scheduler.advance_ring())
+    return require_rollout(scheduler).stats()
+
+@app.post("/updates/{update_id}/rollout/pause")
+async def pause_rollout(update_id: str, reason: str = "manual"):
+    """Stop offering the update to further devices"""
+    await require_update(update_id)
+    scheduler, _ = await run_in_threadpool(modify_rollout, update_id, lambda scheduler: scheduler.pause(reason))
+    return require_rollout(scheduler).stats()
+
+@app.post("/updates/{update_id}/rollout/resume")
+async def resume_rollout(update_id: str):
+    """Resume a paused rollout"""
+    await require_update(update_id)
+    scheduler, _ = await run_in_threadpool(modify_rollout, update_id, lambda scheduler: scheduler.resume())
+    return require_rollout(scheduler).stats()
+
+@app.post("/updates/{update_id}/rollout/simulate")
+async def simulate_update_rollout(
+    update_id: str,
+    policy: Optional[dict] = Body(None),
+    fleet_size: int = 1000,
+    failure_rate: float = 0.01,
+    download_seconds: int = 120,
+    check_interval: int = 300
+):
+    """Replay a rollout policy (or the update's current one) against a synthetic fleet"""
+    update_info = await run_in_threadpool(get_update_info, update_id)
+    if not update_info:
+        raise HTTPException(status_code=404, detail="Update not found")
+    if policy is None:
+        policy = require_rollout(await run_in_threadpool(load_rollout, update_id)).policy
     
-    device_info = update_device_info(device_id, updates)
-    return device_info
+    return await run_in_threadpool(
+        simulate_rollout,
+        policy,
+        fleet_size=fleet_size,
+        size_bytes=update_info.get("size_bytes", 0),
+        failure_rate=failure_rate,
+        download_seconds=download_seconds,
+        check_interval=check_interval,
+        update_id=update_id
+    )
+
+# Fleet inventory aggregation: devices upload inventory_transactions id ranges
+_fleet_store = None
+
+def fleet_store():
+    global _fleet_store
+    if _fleet_store is None:
+        _fleet_store = FleetInventoryStore()
+    return _fleet_store
+
+def merge_transactions(device_id, payload):
+    try:
+        return fleet_store().merge(device_id, payload.get("after_id"), payload.get("through_id"),
+                                   payload.get("transactions", []))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/aggregate/devices/{device_id}/high_water_mark")
+async def get_high_water_mark(device_id: str):
+    """Highest transaction id the server holds every transaction up to, for a device"""
+    high_water_mark = await run_in_threadpool(fleet_store().high_water_mark, device_id)
+    return {"device_id": device_id, "high_water_mark": high_water_mark}
+
+@app.post("/aggregate/devices/{device_id}/transactions")
+async def upload_transactions(device_id: str, payload: dict = Body(...)):
+    """Merge a range of a device's inventory transactions (idempotent)"""
+    result = await run_in_threadpool(merge_transactions, device_id, payload)
+    if result["conflict"]:
+        raise HTTPException(status_code=409, detail=result)
+    return result
+
+@app.get("/aggregate/sources")
+async def list_sources():
+    """Devices that have uploaded transactions"""
+    return await run_in_threadpool(fleet_store().sources)
+
+@app.get("/aggregate/inventory")
+async def fleet_inventory(cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Fleet quantity per EAN, paged in EAN order"""
+    return await run_in_threadpool(fleet_store().totals, cursor, limit)
+
+@app.get("/aggregate/inventory/{ean}")
+async def fleet_item(ean: str):
+    """Quantity of an EAN on every device"""
+    return await run_in_threadpool(fleet_store().item, ean)
+
+@app.get("/aggregate/transactions")
+async def fleet_transactions(
+    ean: Optional[str] = None,
+    device: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+):
+    """Transactions across devices, newest first"""
+    try:
+        return await run_in_threadpool(fleet_store().transactions, ean, device, since, until, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 def main():
     """Run the update server"""
-    config = load_config()
+    parser = argparse.ArgumentParser(description="Run the OTA update server")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: ota_server.workers or 1)")
+    args = parser.parse_args()
+    
+    config = load_config() or {}
     host = config.get("ota_server", {}).get("host", "0.0.0.0")
     port = config.get("ota_server", {}).get("port", 8000)
+    workers = args.workers or config.get("ota_server", {}).get("workers", 1)
     
-    print(f"Starting OTA Update Server on {host}:{port}")
-    uvicorn.run(app, host=host, port=port)
+    print(f"Starting OTA Update Server on {host}:{port} with {workers} worker(s)")
+    if workers > 1:
+        # Workers re-import the app by name; they share state only through the filesystem
+        uvicorn.run("src.ota.update_server:app", host=host, port=port, workers=workers)
+    else:
+        uvicorn.run(app, host=host, port=port)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,3 @@
+"""
+Barcode scanner input handling for HID (keyboard-wedge) scanners
+"""
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Debouncing and burst coalescing for barcode scans.
+
+Hand scanners often fire twice for one trigger pull, and operators scan the
+same item repeatedly when booking several units. Instead of writing every
+read as its own scan row, inventory update and hub message, reads of the
+same barcode from the same scanner are merged:
+
+- reads closer together than ``debounce_seconds`` are one physical scan
+  (a double-fire) and are dropped;
+- further reads within ``window_seconds`` of the previous one add to the
+  pending event's quantity.
+
+An event is emitted once its window passes without another read, or as
+soon as the scanner reads a different barcode.
+"""
+
+import time
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger("Scanner")
+
+DEFAULT_DEBOUNCE_SECONDS = 0.08
+DEFAULT_WINDOW_SECONDS = 0.5
+
+ScanEvent = namedtuple("ScanEvent", ["barcode", "device", "quantity", "first_seen", "last_seen", "reads"])
+
+class _PendingEvent:
+    __slots__ = ("barcode", "device", "quantity", "first_seen", "last_seen", "reads")
+
+    def __init__(self, barcode, device, timestamp):
+        self.barcode = barcode
+        self.device = device
+        self.quantity = 1
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.reads = 1
+
+    def freeze(self):
+        return ScanEvent(self.barcode, self.device, self.quantity, self.first_seen, self.last_seen, self.reads)
+
+class ScanCoalescer:
+    """Merges duplicate reads and hands finished events to ``on_event``
+
+    ``on_event`` is called from the coalescer's worker thread, one event at
+    a time and in scan order per device.
+    """
+
+    def __init__(self, on_event, window_seconds=DEFAULT_WINDOW_SECONDS,
+                 debounce_seconds=DEFAULT_DEBOUNCE_SECONDS, clock=time.time):
+        self.on_event = on_event
+        self.window_seconds = window_seconds
+        self.debounce_seconds = debounce_seconds
+        self.clock = clock
+        self.pending = {}
+        self.ready = []
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_config(cls, scanner_config, on_event):
+        """Build a coalescer from ``barcode_scanner.coalesce_window_ms`` / ``debounce_ms``"""
+        window_ms = scanner_config.get("coalesce_window_ms", DEFAULT_WINDOW_SECONDS * 1000)
+        debounce_ms = scanner_config.get("debounce_ms", DEFAULT_DEBOUNCE_SECONDS * 1000)
+        return cls(on_event, window_ms / 1000, debounce_ms / 1000)
+
+    def add(self, barcode, device=None, timestamp=None):
+        """Record one read from ``device``"""
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("ScanCoalescer is closed")
+            event = self.pending.get(device)
+            if event is not None and event.barcode == barcode and timestamp - event.last_seen <= self.window_seconds:
+                event.reads += 1
+                if timestamp - event.last_seen >= self.debounce_seconds:
+                    event.quantity += 1
+                event.last_seen = timestamp
+            else:
+                if event is not None:
+                    self.ready.append(event)
+                self.pending[device] = _PendingEvent(barcode, device, timestamp)
+            self.condition.notify()
+
+    def _collect_due(self, now):
+        for device, event in list(self.pending.items()):
+            if now - event.last_seen > self.window_seconds:
+                del self.pending[device]
+                self.ready.append(event)
+
+    def _next_deadline(self):
+        if not self.pending:
+            return None
+        return min(event.last_seen for event in self.pending.values()) + self.window_seconds
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    self._collect_due(self.clock())
+                    if self.ready or self.closed:
+                        break
+                    deadline = self._next_deadline()
+                    timeout = None if deadline is None else max(0.0, deadline - self.clock()) + 0.001
+                    self.condition.wait(timeout)
+                ready, self.ready = self.ready, []
+                if self.closed and not ready:
+                    return
+
+            for event in ready:
+                try:
+                    self.on_event(event.freeze())
+                except Exception as e:
+                    logger.error(f"Error handling scan event {event.barcode}: {e}")
+
+    def close(self):
+        """Emit all pending events and stop the worker"""
+        with self.condition:
+            self.ready.extend(self.pending.values())
+            self.pending.clear()
+            self.closed = True
+            self.condition.notify()
+        self.thread.join(timeout=30)
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Scanner input engine reading HID barcode scanners straight from /dev/input.
+
+Each scanner is a keyboard-wedge device exposing a Linux evdev node. All
+nodes are multiplexed in a single selector loop that blocks until a device
+has events, key codes are decoded with a precomputed keymap and every
+completed barcode is tagged with the device it came from:
+
+    engine = ScannerInputEngine([EvdevSource(path) for path in find_scanner_devices()])
+    engine.start()
+    scan = engine.get_scan()          # Scan(barcode, device, timestamp)
+
+``ReplaySource`` is a drop-in test double that replays recorded key events
+through the same loop, so the pipeline can be exercised without hardware:
+
+    python src/scanner/input_engine.py --record scans.jsonl
+    python src/scanner/input_engine.py --replay scans.jsonl
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import fcntl
+import struct
+import logging
+import argparse
+import selectors
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger("Scanner")
+
+# linux/input.h
+EV_KEY = 0x01
+KEY_RELEASE = 0
+KEY_PRESS = 1
+KEY_REPEAT = 2
+EVIOCGRAB = 0x40044590
+
+# struct input_event { struct timeval time; __u16 type; __u16 code; __s32 value; }
+INPUT_EVENT = struct.Struct("llHHi")
+READ_EVENTS = 64
+
+DEFAULT_DEVICE_PATTERNS = ["/dev/input/by-id/*-event-kbd"]
+
+KEY_TAB = 15
+KEY_ENTER = 28
+KEY_KPENTER = 96
+KEY_RIGHTBRACE = 27
+DEFAULT_TERMINATORS = (KEY_ENTER, KEY_KPENTER)
+SHIFT_KEYS = frozenset((42, 54))      # KEY_LEFTSHIFT, KEY_RIGHTSHIFT
+CTRL_KEYS = frozenset((29, 97))       # KEY_LEFTCTRL, KEY_RIGHTCTRL
+
+# US layout: key code -> (plain, shifted)
+_US_LAYOUT = {
+    2: ("1", "!"), 3: ("2", "@"), 4: ("3", "#"), 5: ("4", "$"), 6: ("5", "%"),
+    7: ("6", "^"), 8: ("7", "&"), 9: ("8", "*"), 10: ("9", "("), 11: ("0", ")"),
+    12: ("-", "_"), 13: ("=", "+"),
+    16: ("q", "Q"), 17: ("w", "W"), 18: ("e", "E"), 19: ("r", "R"), 20: ("t", "T"),
+    21: ("y", "Y"), 22: ("u", "U"), 23: ("i", "I"), 24: ("o", "O"), 25: ("p", "P"),
+    26: ("[", "{"), 27: ("]", "}"),
+    30: ("a", "A"), 31: ("s", "S"), 32: ("d", "D"), 33: ("f", "F"), 34: ("g", "G"),
+    35: ("h", "H"), 36: ("j", "J"), 37: ("k", "K"), 38: ("l", "L"),
+    39: (";", ":"), 40: ("'", '"'), 41: ("`", "~"), 43: ("\\", "|"),
+    44: ("z", "Z"), 45: ("x", "X"), 46: ("c", "C"), 47: ("v", "V"), 48: ("b", "B"),
+    49: ("n", "N"), 50: ("m", "M"), 51: (",", "<"), 52: (".", ">"), 53: ("/", "?"),
+    55: ("*", "*"), 57: (" ", " "),
+    71: ("7", "7"), 72: ("8", "8"), 73: ("9", "9"), 74: ("-", "-"),
+    75: ("4", "4"), 76: ("5", "5"), 77: ("6", "6"), 78: ("+", "+"),
+    79: ("1", "1"), 80: ("2", "2"), 81: ("3", "3"), 82: ("0", "0"), 83: (".", "."),
+    98: ("/", "/")
+}
+
+def _build_keymap(layout):
+    """Flatten a layout into a list indexed by ``code * 2 + shifted``"""
+    keymap = [None] * 512
+    for code, (plain, shifted) in layout.items():
+        keymap[code * 2] = plain
+        keymap[code * 2 + 1] = shifted
+    return keymap
+
+KEYMAP = _build_keymap(_US_LAYOUT)
+
+# Ctrl+] is how keyboard-wedge scanners transmit GS (the GS1 FNC1 separator)
+CTRL_KEYMAP = {KEY_RIGHTBRACE: "\x1d"}
+
+# Reverse map used to synthesize key events for replays
+CHAR_TO_KEY = {}
+for _code, (_plain, _shifted) in sorted(_US_LAYOUT.items(), reverse=True):
+    CHAR_TO_KEY[_shifted] = (_code, _shifted != _plain)
+    CHAR_TO_KEY[_plain] = (_code, False)
+
+Scan = namedtuple("Scan", ["barcode", "device", "timestamp"])
+
+class KeyDecoder:
+    """Turns one device's key events into barcode strings"""
+
+    def __init__(self, terminators=DEFAULT_TERMINATORS):
+        self.terminators = frozenset(terminators)
+        self.shift = False
+        self.ctrl = False
+        self.buffer = []
+
+    def feed(self, code, value):
+        """Feed an EV_KEY event; returns the barcode when a terminator is pressed"""
+        if code in SHIFT_KEYS:
+            self.shift = value != KEY_RELEASE
+            return None
+        if code in CTRL_KEYS:
+            self.ctrl = value != KEY_RELEASE
+            return None
+        if value != KEY_PRESS:
+            return None
+
+        if code in self.terminators:
+            barcode = "".join(self.buffer)
+            self.buffer = []
+            return barcode or None
+
+        if self.ctrl:
+            char = CTRL_KEYMAP.get(code)
+        else:
+            char = KEYMAP[code * 2 + self.shift] if code < 256 else None
+        if char is not None:
+            self.buffer.append(char)
+        return None
+
+class EvdevSource:
+    """A scanner's /dev/input/event* node"""
+
+    def __init__(self, path, grab=True):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.grab = grab
+        self.fd = None
+
+    def open(self):
+        self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        if self.grab:
+            # Keep scanned keystrokes from also reaching the console
+            try:
+                fcntl.ioctl(self.fd, EVIOCGRAB, 1)
+            except OSError as e:
+                logger.warning(f"Could not grab {self.path}: {e}")
+
+    def fileno(self):
+        return self.fd
+
+    def read_events(self):
+        """Read the pending events
+
+        Returns:
+            list: (timestamp, type, code, value) tuples, or None at end of input
+        """
+        try:
+            data = os.read(self.fd, INPUT_EVENT.size * READ_EVENTS)
+        except BlockingIOError:
+            return []
+        if not data:
+            return None
+        return [
+            (sec + usec / 1e6, ev_type, code, value)
+            for sec, usec, ev_type, code, value in INPUT_EVENT.iter_unpack(data)
+        ]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class ReplaySource(EvdevSource):
+    """Test double that replays recorded key events through a pipe
+
+    ``events`` are ``(timestamp, code, value)`` EV_KEY events. With ``speed``
+    set the original gaps between events are reproduced (``speed=2`` replays
+    twice as fast); otherwise events are written as fast as the loop reads.
+    """
+
+    def __init__(self, name, events, speed=None):
+        super().__init__(name, grab=False)
+        self.events = list(events)
+        self.speed = speed
+        self._writer = None
+
+    @classmethod
+    def from_file(cls, path, device=None, speed=None):
+        """Load events recorded with ``--record``, optionally for a single device"""
+        events = []
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if device is None or record.get("device") == device:
+                    events.append((record["time"], record["code"], record["value"]))
+        return cls(device or os.path.basename(path), events, speed)
+
+    @classmethod
+    def from_barcodes(cls, name, barcodes, interval=0.0, key_interval=0.0):
+        """Synthesize the key events a scanner would send for ``barcodes``"""
+        events = []
+        t = 0.0
+
+        def press(code):
+            nonlocal t
+            events.append((t, code, KEY_PRESS))
+            events.append((t, code, KEY_RELEASE))
+            t += key_interval
+
+        for barcode in barcodes:
+            for char in barcode:
+                if char == "\x1d":
+                    events.append((t, 29, KEY_PRESS))
+                    press(KEY_RIGHTBRACE)
+                    events.append((t, 29, KEY_RELEASE))
+                    continue
+                code, shifted = CHAR_TO_KEY[char]
+                if shifted:
+                    events.append((t, 42, KEY_PRESS))
+                press(code)
+                if shifted:
+                    events.append((t, 42, KEY_RELEASE))
+            press(KEY_ENTER)
+            t += interval
+        return cls(name, events)
+
+    def open(self):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        self.fd = read_fd
+        self._writer = threading.Thread(target=self._write_events, args=(write_fd,), daemon=True)
+        self._writer.start()
+
+    def _write_events(self, write_fd):
+        try:
+            started = time.time()
+            first = self.events[0][0] if self.events else 0.0
+            for timestamp, code, value in self.events:
+                offset = timestamp - first
+                if self.speed:
+                    delay = offset / self.speed - (time.time() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                now = started + offset
+                os.write(write_fd, INPUT_EVENT.pack(int(now), int(now % 1 * 1e6), EV_KEY, code, value))
+        except OSError:
+            pass
+        finally:
+            os.close(write_fd)
+
+class ScannerInputEngine:
+    """Multiplexes any number of scanner sources in one blocking event loop
+
+    Scans go to ``on_scan`` when given, otherwise into a queue read with
+    ``get_scan``.
+    """
+
+    def __init__(self, sources, on_scan=None, terminators=DEFAULT_TERMINATORS):
+        self.sources = list(sources)
+        self.on_scan = on_scan
+        self.terminators = terminators
+        self.scans = queue.Queue()
+        self.finished = threading.Event()
+        self.selector = None
+        self.thread = None
+        self.running = False
+        self._wakeup = None
+
+    @property
+    def devices(self):
+        return [source.name for source in self.sources]
+
+    def start(self):
+        """Open every source and start the event loop thread"""
+        if self.running:
+            return True
+        self.selector = selectors.DefaultSelector()
+        self._wakeup = os.pipe()
+        self.selector.register(self._wakeup[0], selectors.EVENT_READ, None)
+
+        opened = 0
+        for source in self.sources:
+            try:
+                source.open()
+            except OSError as e:
+                logger.error(f"Could not open scanner {source.path}: {e}")
+                continue
+            self.selector.register(source.fileno(), selectors.EVENT_READ, (source, KeyDecoder(self.terminators)))
+            opened += 1
+
+        if not opened:
+            logger.error("No scanner devices could be opened")
+            self._close_selector()
+            return False
+
+        self.running = True
+        self.finished.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info(f"Listening on {opened} scanner(s)")
+        return True
+
+    def _run(self):
+        try:
+            while self.running:
+                for key, _ in self.selector.select():
+                    if key.data is None:
+                        return
+                    source, decoder = key.data
+                    try:
+                        events = source.read_events()
+                    except OSError as e:
+                        logger.warning(f"Scanner {source.name} disconnected: {e}")
+                        events = None
+                    if events is None:
+                        self._remove_source(source)
+                        continue
+                    for timestamp, ev_type, code, value in events:
+                        if ev_type != EV_KEY:
+                            continue
+                        barcode = decoder.feed(code, value)
+                        if barcode:
+                            self._emit(Scan(barcode, source.name, timestamp))
+                if len(self.selector.get_map()) <= 1:
+                    return
+        finally:
+            self.running = False
+            self.finished.set()
+
+    def _emit(self, scan):
+        if self.on_scan is None:
+            self.scans.put(scan)
+            return
+        try:
+            self.on_scan(scan)
+        except Exception as e:
+            logger.error(f"Error handling scan {scan.barcode} from {scan.device}: {e}")
+
+    def _remove_source(self, source):
+        try:
+            self.selector.unregister(source.fileno())
+        except (KeyError, ValueError):
+            pass
+        source.close()
+
+    def get_scan(self, timeout=None):
+        """Block until the next scan arrives, or return None after ``timeout`` seconds"""
+        try:
+            return self.scans.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def wait(self, timeout=None):
+        """Wait until every source has reached end of input (replays) or the engine stopped"""
+        return self.finished.wait(timeout)
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            os.write(self._wakeup[1], b"\0")
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        for source in self.sources:
+            source.close()
+        self._close_selector()
+
+    def _close_selector(self):
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+        if self._wakeup is not None:
+            for fd in self._wakeup:
+                os.close(fd)
+            self._wakeup = None
+
+def find_scanner_devices(patterns=None):
+    """Resolve device globs to unique /dev/input/event* paths"""
+    devices = []
+    for pattern in patterns or DEFAULT_DEVICE_PATTERNS:
+        for path in sorted(glob.glob(pattern)):
+            resolved = os.path.realpath(path)
+            if resolved not in devices:
+                devices.append(resolved)
+    return devices
+
+def create_scanner_engine(scanner_config, on_scan=None):
+    """Build an engine from the ``barcode_scanner`` config section
+
+    Recognised keys: ``devices`` (paths or globs), ``grab`` and
+    ``terminators`` (key codes ending a barcode, Enter by default).
+
+    Devices are grabbed (exclusive access) only when ``devices`` lists them:
+    auto-discovery matches every keyboard, including the operator's, and
+    grabbing that one would take away console input and Ctrl+C.
+
+    Returns:
+        ScannerInputEngine: or None when no scanner devices are present
+    """
+    devices = find_scanner_devices(scanner_config.get("devices"))
+    if not devices:
+        return None
+    grab = scanner_config.get("grab", bool(scanner_config.get("devices")))
+    terminators = scanner_config.get("terminators", DEFAULT_TERMINATORS)
+    return ScannerInputEngine([EvdevSource(path, grab) for path in devices], on_scan, terminators)
+
+def record_events(sources, output_path):
+    """Append raw key events from ``sources`` to a JSON lines file until Ctrl+C"""
+    selector = selectors.DefaultSelector()
+    for source in sources:
+        source.open()
+        selector.register(source.fileno(), selectors.EVENT_READ, source)
+    count = 0
+    try:
+        with open(output_path, "a") as f:
+            while selector.get_map():
+                for key, _ in selector.select():
+                    events = key.data.read_events()
+                    if events is None:
+                        selector.unregister(key.fd)
+                        continue
+                    for timestamp, ev_type, code, value in events:
+                        if ev_type == EV_KEY:
+                            f.write(json.dumps({"device": key.data.name, "time": timestamp, "code": code, "value": value}) + "\n")
+                            count += 1
+                    f.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for source in sources:
+            source.close()
+        selector.close()
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Read, record or replay HID barcode scanner input")
+    parser.add_argument("--device", action="append", help="Device path or glob (repeatable, default: all keyboards by id)")
+    parser.add_argument("--list", action="store_true", help="List scanner devices and exit")
+    parser.add_argument("--record", metavar="FILE", help="Record key events to a JSON lines file")
+    parser.add_argument("--replay", metavar="FILE", help="Replay key events recorded with --record")
+    parser.add_argument("--speed", type=float, help="Replay speed factor (default: as fast as possible)")
+    parser.add_argument("--no-grab", action="store_true",
+                        help="Do not take exclusive access to the --device devices (auto-discovered ones are never grabbed)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.replay:
+        with open(args.replay) as f:
+            names = sorted({json.loads(line).get("device") for line in f if line.strip()})
+        sources = [ReplaySource.from_file(args.replay, name, args.speed) for name in names]
+        engine = ScannerInputEngine(sources, on_scan=lambda scan: print(f"{scan.device}: {scan.barcode}"))
+        if engine.start():
+            engine.wait()
+            engine.stop()
+        return
+
+    devices = find_scanner_devices(args.device)
+    if args.list or not devices:
+        print("\n".join(devices) if devices else "No scanner devices found")
+        return
+
+    sources = [EvdevSource(path, grab=bool(args.device) and not args.no_grab) for path in devices]
+    if args.record:
+        print(f"Recording key events from {len(sources)} device(s) to {args.record} (Ctrl+C to stop)")
+        count = record_events(sources, args.record)
+        print(f"Recorded {count} key events")
+        return
+
+    engine = ScannerInputEngine(sources)
+    if not engine.start():
+        sys.exit(1)
+    print(f"Listening on {', '.join(engine.devices)} (Ctrl+C to exit)")
+    try:
+        while True:
+            scan = engine.get_scan()
+            print(f"{scan.device}: {scan.barcode}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+
+if __name__ == "__main__":
+    main()
@@ -18,8 +18,8 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
 from led_controller import LEDStatusManager
-from api.api_client import ApiClient
-from utils.config import load_config
+from src.api.api_client import ApiClient
+from src.utils.config import load_config
 
 logger = logging.getLogger(__name__)
 
@@ -11,8 +11,8 @@ import time
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from utils.config import load_config
-from iot.hub_client import HubClient
+from src.utils.config import load_config
+from src.iot.hub_client import HubClient
 
 def test_device_message(device_id=None, barcode=None):
     """Test sending a message from a specific device to IoT Hub"""
@@ -1,5 +1,12 @@
-from utils.config import load_config
-from iot.hub_client import HubClient
+import sys
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.utils.config import load_config
+from src.iot.hub_client import HubClient
 import time
 import traceback
 
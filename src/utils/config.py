@@ -57,6 +57,9 @@ def load_config():
                         config["iot_hub"].update(file_config["iot_hub"])
                     if "barcode_scanner" in file_config:
                         config["barcode_scanner"].update(file_config["barcode_scanner"])
+                    # Carry over the remaining sections (ota_server, ota, app_version, ...) as-is
+                    for key, value in file_config.items():
+                        config.setdefault(key, value)
             except json.JSONDecodeError as e:
                 print(f"Error reading config file: {e}")
                 return None
@@ -1,54 +1,23 @@
 import os
 import sys
 from pathlib import Path
-from datetime import datetime, timezone
-import re
+import argparse
 
 # Add project root to Python path
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from src.database.local_storage import LocalStorage
+from src.database.history_pages import SOURCES, DEFAULT_PAGE_SIZE
+from src.utils.timestamps import format_hub
 
 class DatabaseViewer:
     def __init__(self):
         self.storage = LocalStorage()
         
     def format_timestamp(self, timestamp):
-        """Format timestamp to match required format: 2025-05-09T10:34:17.353Z
-        This handles various input timestamp formats and standardizes them
-        """
-        # If timestamp is already in the correct format, return it
-        if isinstance(timestamp, str) and re.match(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$', timestamp):
-            return timestamp
-            
-        try:
-            # If it's a string, try to parse it
-            if isinstance(timestamp, str):
-                # Try different formats
-                try:
-                    # Try ISO format with timezone
-                    dt_obj = datetime.fromisoformat(timestamp)
-                except ValueError:
-                    try:
-                        # Try standard datetime format
-                        dt_obj = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f")
-                    except ValueError:
-                        # If all else fails, return as is
-                        return timestamp
-            else:
-                # If it's already a datetime object
-                dt_obj = timestamp
-                
-            # Ensure it's timezone aware
-            if dt_obj.tzinfo is None:
-                dt_obj = dt_obj.replace(tzinfo=timezone.utc)
-                
-            # Format to the required format
-            return dt_obj.strftime("%Y-%m-%dT%H:%M:%S.%fZ")[:-3] + 'Z'
-        except Exception:
-            # If any error occurs, return the original timestamp
-            return timestamp
+        """Format timestamp to match required format: 2025-05-09T10:34:17.353Z"""
+        return format_hub(timestamp)
 
     def view_recent_scans(self, limit=10):
         """Display recent barcode scans from the database"""
@@ -72,10 +41,51 @@ class DatabaseViewer:
         finally:
             self.storage.close()
 
+    def view_history(self, source, page_size=DEFAULT_PAGE_SIZE, cursor=None, device_id=None, ean=None,
+                     since=None, until=None, interactive=False):
+        """Display history one keyset page at a time, newest first"""
+        while True:
+            result = self.storage.history_pages.page(source, cursor, page_size, device_id, ean, since, until)
+            if not result['success']:
+                print(f"Error: {result['message']}")
+                return
+            columns = SOURCES[source]['columns']
+            print(f"\n=== {source.title()} ===")
+            for item in result['items']:
+                values = [self.format_timestamp(item[column]) if column == 'timestamp' else item[column]
+                          for column in columns]
+                print(f"#{item['id']}  " + "  ".join(f"{column}={value}" for column, value in zip(columns, values)
+                                                   if value is not None))
+            if not result['items']:
+                print(f"No {source} found")
+
+            cursor = result['next_cursor']
+            if cursor is None:
+                return
+            if not interactive:
+                print(f"\nMore rows available: --cursor {cursor}")
+                return
+            if input("\n[Enter] next page, [q] quit: ").strip().lower() == 'q':
+                return
+
 def main():
+    parser = argparse.ArgumentParser(description="Browse local scan, transaction and notification history")
+    parser.add_argument("source", nargs="?", choices=list(SOURCES), help="History to page through (default: recent scans)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_PAGE_SIZE, help="Rows per page")
+    parser.add_argument("--cursor", type=int, help="Continue from a previous page's cursor")
+    parser.add_argument("--device", help="Only this device ID")
+    parser.add_argument("--ean", help="Only this EAN")
+    parser.add_argument("--since", help="ISO start time")
+    parser.add_argument("--until", help="ISO end time")
+    args = parser.parse_args()
+
     try:
         viewer = DatabaseViewer()
-        viewer.view_recent_scans()
+        if args.source is None:
+            viewer.view_recent_scans()
+        else:
+            viewer.view_history(args.source, args.limit, args.cursor, args.device, args.ean,
+                                args.since, args.until, interactive=sys.stdin.isatty())
     except KeyboardInterrupt:
         print("\nExiting...")
     except Exception as e:
@@ -0,0 +1,63 @@
+"""
+Lazy imports and lazy singletons to keep application startup fast.
+
+Heavy third-party packages (azure.iot, redis, requests) and clients that run
+schema DDL or load config on construction are only paid for on first use,
+so the scanner is ready sooner after an OTA restart.
+"""
+import importlib
+import threading
+import types
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name):
+    """Return a proxy for module ``name`` that is imported on first use"""
+    return LazyModule(name)
+
+class LazySingleton:
+    """Proxy that builds its target with ``factory`` on first attribute access"""
+
+    def __init__(self, factory):
+        self.__dict__["_factory"] = factory
+        self.__dict__["_instance"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def get(self):
+        """Return the underlying instance, creating it if needed"""
+        instance = self.__dict__["_instance"]
+        if instance is None:
+            with self.__dict__["_lock"]:
+                instance = self.__dict__["_instance"]
+                if instance is None:
+                    instance = self.__dict__["_factory"]()
+                    self.__dict__["_instance"] = instance
+        return instance
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.get(), attr, value)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Startup import-time benchmark.
+
+Imports an application module in a fresh interpreter with ``-X importtime``
+and fails when the total exceeds a budget, so regressions such as a heavy
+SDK creeping back into module-level imports are caught before they reach
+the Raspberry Pis.
+
+    python src/utils/startup_benchmark.py --module src.main --budget-ms 800
+"""
+
+import re
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+
+DEFAULT_MODULE = "src.main"
+DEFAULT_BUDGET_MS = 800
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S.*)$")
+
+def measure_imports(module):
+    """Import ``module`` in a subprocess and parse its -X importtime report
+
+    Returns:
+        list: (package, self_us, cumulative_us, depth) for every import
+    """
+    code = (
+        "import sys; "
+        f"sys.path[:0] = [{str(project_root)!r}, {str(project_root / 'src')!r}]; "
+        f"import {module}"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=project_root
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, package = match.groups()
+            imports.append((package.strip(), int(self_us), int(cumulative_us), len(indent) // 2))
+    return imports
+
+def main():
+    parser = argparse.ArgumentParser(description="Check application import time against a budget")
+    parser.add_argument("--module", default=DEFAULT_MODULE, help="Module to import (default: src.main)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Total import time budget")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest top-level imports to show")
+    parser.add_argument("--runs", type=int, default=3, help="Runs to take the best of (first run warms caches)")
+    args = parser.parse_args()
+
+    best_total = None
+    best_imports = None
+    for _ in range(args.runs):
+        imports = measure_imports(args.module)
+        # Top-level imports (depth 0) add up to the whole import cost
+        total_us = sum(cumulative for _, _, cumulative, depth in imports if depth == 0)
+        if best_total is None or total_us < best_total:
+            best_total, best_imports = total_us, imports
+
+    total_ms = best_total / 1000
+    print(f"Import time for {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("Slowest top-level imports:")
+    top_level = sorted((i for i in best_imports if i[3] == 0), key=lambda i: i[2], reverse=True)
+    for package, _, cumulative_us, _ in top_level[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {package}")
+
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import time exceeds budget by {total_ms - args.budget_ms:.1f} ms")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Timestamp codec shared by every table that stores time.
+
+Rows keep their human-readable TEXT ``timestamp`` and gain an integer
+``timestamp_ms`` column (UTC epoch milliseconds), which is what ordering,
+range queries and row matching use. Parsing is one precompiled regex plus
+integer arithmetic, and it accepts every format found in existing databases:
+the hub format ``2025-05-09T10:34:17.353Z``, ``isoformat()`` with an offset,
+naive ``YYYY-MM-DD HH:MM:SS[.ffffff]`` (taken as UTC), and the four-digit
+fraction ``...17.3531Z`` that older builds wrote.
+"""
+import re
+from datetime import date, datetime, timezone, timedelta
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_ORDINAL = EPOCH.toordinal()
+_MILLISECOND = timedelta(milliseconds=1)
+
+_TIMESTAMP_RE = re.compile(
+    r'\s*(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})'
+    r'(?:\.(\d+))?'
+    r'(?:(Z)|([+-])(\d{2}):?(\d{2}))?\s*\Z'
+)
+
+def _parse_ms(text):
+    match = _TIMESTAMP_RE.match(text)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, _, sign, offset_hours, offset_minutes = match.groups()
+    days = date(int(year), int(month), int(day)).toordinal() - _EPOCH_ORDINAL
+    seconds = days * 86400 + int(hour) * 3600 + int(minute) * 60 + int(second)
+    if sign:
+        offset = int(offset_hours) * 3600 + int(offset_minutes) * 60
+        seconds -= offset if sign == '+' else -offset
+    millis = int((fraction or '0')[:3].ljust(3, '0'))
+    return seconds * 1000 + millis
+
+def to_epoch_ms(value):
+    """UTC epoch milliseconds for a datetime or timestamp string; None if unparseable"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (value - EPOCH) // _MILLISECOND
+    try:
+        return _parse_ms(str(value))
+    except ValueError:
+        return None
+
+def from_epoch_ms(epoch_ms):
+    """Aware UTC datetime for epoch milliseconds"""
+    return EPOCH + timedelta(milliseconds=epoch_ms)
+
+def now_ms():
+    return to_epoch_ms(datetime.now(timezone.utc))
+
+def format_hub(value):
+    """Format as ``2025-05-09T10:34:17.353Z``; unparseable strings are returned unchanged"""
+    epoch_ms = value if isinstance(value, int) else to_epoch_ms(value)
+    if epoch_ms is None:
+        return None if value is None else str(value)
+    dt_obj = from_epoch_ms(epoch_ms)
+    return f"{dt_obj:%Y-%m-%dT%H:%M:%S}.{epoch_ms % 1000:03d}Z"
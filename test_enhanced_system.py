@@ -6,12 +6,12 @@ Test script for the enhanced inventory management and device registration system
 import sys
 from pathlib import Path
 
-# Add src to path
-src_path = Path(__file__).parent / 'src'
-sys.path.append(str(src_path))
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
 
-from inventory_manager import InventoryManager
-from enhanced_device_registration import EnhancedDeviceRegistration
+from src.inventory_manager import InventoryManager
+from src.enhanced_device_registration import EnhancedDeviceRegistration
 
 def test_inventory_management():
     """Test inventory management functionality"""
@@ -22,7 +22,7 @@ def test_inventory_management():
     manager = InventoryManager()
     
     # Test the problematic EAN
-    ean = "23541523652145"
+    ean = "23541523652143"
     print(f"\n1. Checking inventory status for EAN: {ean}")
     status = manager.check_inventory_status(ean)
     print(f"   Status: {status['alert_level']}")
@@ -103,7 +103,7 @@ def test_complete_workflow():
     manager = InventoryManager()
     
     # Test the complete barcode processing workflow
-    ean = "23541523652145"
+    ean = "23541523652143"
     device_id = "test_device_workflow"
     
     print(f"\n1. Processing barcode scan for EAN: {ean}")
@@ -0,0 +1,139 @@
+import sqlite3
+
+import pytest
+
+from src.database.migrations import migrate
+from src.ota import aggregator
+from src.ota.aggregator import FleetInventoryStore, InventoryUploader
+
+
+def transaction(transaction_id, ean="A", new_quantity=None, timestamp_ms=None, **columns):
+    row = {"id": transaction_id, "ean": ean, "quantity_change": 1, "new_quantity": new_quantity,
+           "timestamp_ms": timestamp_ms}
+    row.update(columns)
+    return row
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FleetInventoryStore(tmp_path / "fleet.db")
+
+
+def test_merge_advances_high_water_mark(store):
+    result = store.merge("d1", 0, 3, [transaction(1, new_quantity=1), transaction(3, new_quantity=2)])
+    assert (result["accepted"], result["duplicates"], result["high_water_mark"]) == (2, 0, 3)
+
+    retry = store.merge("d1", 0, 3, [transaction(1, new_quantity=1), transaction(3, new_quantity=2)])
+    assert (retry["accepted"], retry["duplicates"]) == (0, 2)
+
+    gap = store.merge("d1", 5, 6, [transaction(6)])
+    assert gap["conflict"] and gap["high_water_mark"] == 3
+    assert store.high_water_mark("d1") == 3
+    assert store.high_water_mark("d2") == 0
+    assert store.sources()[0]["transactions"] == 2
+
+
+def test_quantities_only_move_forward(store):
+    store.merge("d1", 0, 2, [transaction(1, new_quantity=5), transaction(2, new_quantity=7)])
+    store.merge("d1", 0, 1, [transaction(1, new_quantity=5)])
+    store.merge("d2", 0, 1, [transaction(1, new_quantity=3)])
+    item = store.item("A")
+    assert item["total_quantity"] == 10
+    assert [(device["source_device"], device["quantity"]) for device in item["devices"]] == [("d1", 7), ("d2", 3)]
+    assert store.totals()["items"] == [{"ean": "A", "total_quantity": 10, "devices": 2}]
+
+
+@pytest.mark.parametrize("after_id, through_id, transactions", [
+    (True, 2, []),
+    (0, False, []),
+    (3, 2, []),
+    (0, 2, [transaction(3)]),
+    (0, 2, [transaction(True)]),
+    (0, 2, [transaction(1, quantity_change=True)]),
+    (0, 2, [transaction(1, quantity_change="1")]),
+    (0, 2, [transaction(1, ean=4006381333931)]),
+    (0, 2, ["not a transaction"]),
+    (0, 2, {"id": 1}),
+])
+def test_invalid_uploads_are_rejected(store, after_id, through_id, transactions):
+    with pytest.raises(ValueError):
+        store.merge("d1", after_id, through_id, transactions)
+    assert store.high_water_mark("d1") == 0
+
+
+def test_transaction_pages_put_untimed_rows_last(store):
+    store.merge("d1", 0, 4, [transaction(1, timestamp_ms=1000), transaction(2, timestamp_ms=3000),
+                             transaction(3), transaction(4, timestamp="2025-07-01T00:00:00Z")])
+    pages = []
+    cursor = None
+    while True:
+        page = store.transactions(cursor=cursor, limit=1)
+        pages += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [4, 2, 1, 3]
+    with pytest.raises(ValueError):
+        store.transactions(cursor="nonsense")
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        assert self.status_code == 200
+
+
+class FakeRequests:
+    """Routes the uploader's HTTP calls straight into a store"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, url, timeout=None):
+        return FakeResponse({"high_water_mark": self.store.high_water_mark(url.split("/")[-2])})
+
+    def post(self, url, json=None, timeout=None):
+        result = self.store.merge(url.split("/")[-2], json["after_id"], json["through_id"], json["transactions"])
+        if result["conflict"]:
+            return FakeResponse({"detail": result}, 409)
+        return FakeResponse(result)
+
+
+def add_local_transactions(db, count):
+    conn = sqlite3.connect(db)
+    conn.executemany("INSERT INTO inventory_transactions (ean, quantity_change, new_quantity) VALUES ('A', 1, ?)",
+                     [(quantity,) for quantity in range(1, count + 1)])
+    conn.commit()
+    conn.close()
+
+
+def test_uploader_sends_everything_past_the_mark(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(aggregator, "requests", FakeRequests(store))
+    db = tmp_path / "device.db"
+    migrate(db)
+    add_local_transactions(db, 5)
+    uploader = InventoryUploader("http://server", "d1", db, batch_size=2)
+    assert uploader.upload()["sent"] == 5
+    assert store.item("A")["total_quantity"] == 5
+
+    add_local_transactions(db, 1)
+    result = uploader.upload()
+    assert (result["sent"], result["high_water_mark"]) == (1, 6)
+
+
+def test_uploader_refuses_after_database_reset(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(aggregator, "requests", FakeRequests(store))
+    store.merge("d1", 0, 10, [transaction(10, new_quantity=1)])
+    db = tmp_path / "device.db"
+    migrate(db)
+    add_local_transactions(db, 2)
+    result = InventoryUploader("http://server", "d1", db).upload()
+    assert not result["success"]
+    assert "reset" in result["message"]
+    assert store.high_water_mark("d1") == 10
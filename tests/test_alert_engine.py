@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+from src.alert_engine import AlertEngine, stock_alert_types
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return AlertEngine(tmp_path / "alerts.db")
+
+
+def alert_rows(engine):
+    conn = sqlite3.connect(engine.db_path)
+    rows = conn.execute("SELECT ean, alert_type, status, change_seq FROM inventory_alerts ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+
+def test_stock_alert_types():
+    assert stock_alert_types(-2) == {"NEGATIVE_INVENTORY"}
+    assert stock_alert_types(0) == {"ZERO_INVENTORY"}
+    assert stock_alert_types(4) == set()
+
+
+def test_one_active_alert_per_key(engine):
+    conn = engine._get_connection()
+    cursor = conn.cursor()
+    assert engine.raise_alert(cursor, "1", "ZERO_INVENTORY", "empty", "HIGH")
+    assert not engine.raise_alert(cursor, "1", "ZERO_INVENTORY", "empty", "HIGH")
+    engine.commit(conn)
+    engine.refresh()
+    assert not engine.raise_alert(cursor, "1", "ZERO_INVENTORY", "empty", "HIGH")
+    engine.commit(conn)
+    conn.close()
+    assert len(engine.get_active_alerts()) == 1
+
+
+def test_change_seq_advances_on_insert_and_resolve(engine):
+    conn = engine._get_connection()
+    cursor = conn.cursor()
+    assert engine.evaluate(cursor, "1", 0) == {"raised": ["ZERO_INVENTORY"], "resolved": []}
+    engine.commit(conn)
+    assert engine.evaluate(cursor, "2", -1) == {"raised": ["NEGATIVE_INVENTORY"], "resolved": []}
+    engine.commit(conn)
+    assert engine.evaluate(cursor, "1", 5) == {"raised": [], "resolved": ["ZERO_INVENTORY"]}
+    engine.commit(conn)
+    conn.close()
+    assert alert_rows(engine) == [
+        ("1", "ZERO_INVENTORY", "resolved", 3),
+        ("2", "NEGATIVE_INVENTORY", "active", 2)
+    ]
+
+
+def test_cache_changes_wait_for_commit(engine):
+    conn = engine._get_connection()
+    engine.raise_alert(conn.cursor(), "1", "ZERO_INVENTORY", "empty", "HIGH")
+    assert ("1", "ZERO_INVENTORY") not in engine._active_keys()
+    engine.commit(conn)
+    assert ("1", "ZERO_INVENTORY") in engine._active_keys()
+
+    engine.resolve(conn.cursor(), "1", "ZERO_INVENTORY")
+    engine.rollback(conn)
+    conn.close()
+    assert ("1", "ZERO_INVENTORY") in engine._active_keys()
+    assert alert_rows(engine)[0][2] == "active"
+
+
+def test_rolled_back_alert_can_be_raised_again(engine):
+    conn = engine._get_connection()
+    engine.raise_alert(conn.cursor(), "1", "ZERO_INVENTORY", "empty", "HIGH")
+    engine.rollback(conn)
+    assert engine.raise_alert(conn.cursor(), "1", "ZERO_INVENTORY", "empty", "HIGH")
+    engine.commit(conn)
+    conn.close()
+    assert len(alert_rows(engine)) == 1
+
+
+def test_evaluate_all(engine):
+    conn = engine._get_connection()
+    conn.executemany("INSERT INTO inventory_enhanced (ean, current_quantity) VALUES (?, ?)",
+                     [("1", 0), ("2", -3), ("3", 8)])
+    engine.evaluate(conn.cursor(), "3", 0)
+    engine.commit(conn)
+
+    assert engine.evaluate_all(conn.cursor()) == {"raised": 2, "resolved": 1}
+    engine.commit(conn)
+    conn.close()
+    assert {(alert["ean"], alert["alert_type"]) for alert in engine.get_active_alerts()} \
+        == {("1", "ZERO_INVENTORY"), ("2", "NEGATIVE_INVENTORY")}
+    assert engine.get_active_alerts(limit=1)[0]["severity"] == "CRITICAL"
+    assert engine._active_keys() == {("1", "ZERO_INVENTORY"), ("2", "NEGATIVE_INVENTORY")}
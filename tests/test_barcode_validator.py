@@ -0,0 +1,50 @@
+import pytest
+
+from src.barcode_validator import (BarcodeValidationError, gs1_check_digit, is_numeric, validate_ean,
+                                   validate_ean_batch, validate_ean_batch_numpy, validate_ean_batch_python)
+
+VALID = ["4006381333931", "09501101530003", "96385074", "036000291452", "23541523652143"]
+INVALID = ["4006381333932", "23541523652145", "12345", "", None, "400638133393x", "４００６３８１３３３９３１"]
+
+
+@pytest.mark.parametrize("code", VALID)
+def test_validate_ean_accepts_valid_codes(code):
+    assert validate_ean(f" {code} ") == code
+
+
+def test_validate_ean_reports_expected_check_digit():
+    with pytest.raises(BarcodeValidationError, match="expected 3, got 5"):
+        validate_ean("23541523652145")
+
+
+@pytest.mark.parametrize("code", ["４００６３８１３３３９３１", "4006381333９31", "40063813339³1"])
+def test_validate_ean_rejects_non_ascii_digits(code):
+    # str.isdigit accepts these, int() either rejects them or reads them as different digits
+    with pytest.raises(BarcodeValidationError, match="numeric"):
+        validate_ean(code)
+
+
+def test_is_numeric():
+    assert is_numeric("0123456789")
+    assert not is_numeric("")
+    assert not is_numeric("²")
+    assert not is_numeric("١٢٣")
+
+
+def test_gs1_check_digit():
+    assert gs1_check_digit("400638133393") == 1
+    assert gs1_check_digit("2354152365214") == 3
+
+
+def test_batch_python_matches_single_validation():
+    assert validate_ean_batch_python(VALID + INVALID) == [True] * len(VALID) + [False] * len(INVALID)
+
+
+def test_batch_numpy_matches_python():
+    pytest.importorskip("numpy")
+    codes = VALID + [code for code in INVALID if code is not None] + ["123456789012345"]
+    assert list(validate_ean_batch_numpy(codes)) == validate_ean_batch_python(codes)
+
+
+def test_batch_of_nothing():
+    assert len(validate_ean_batch([])) == 0
@@ -0,0 +1,98 @@
+import json
+import sqlite3
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from src.alert_engine import AlertEngine
+from src.database.columnar_export import ColumnarExporter, ExportReader, load_manifest
+
+
+def add_scans(db, barcodes, device="dev"):
+    conn = sqlite3.connect(db)
+    conn.executemany("INSERT INTO scans (device_id, barcode, quantity, timestamp_ms) VALUES (?, ?, 1, ?)",
+                     [(device, barcode, 1_750_000_000_000 + i) for i, barcode in enumerate(barcodes)])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / "device.db"
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_export_resumes_after_high_water_mark(db, tmp_path, file_format):
+    exporter = ColumnarExporter(db, tmp_path / "exports", file_format, chunk_rows=1, max_rows_per_file=3)
+    add_scans(db, ["a", "b", "c", "d"])
+    first = exporter.export(["scans"])["tables"]["scans"]
+    assert first["rows"] == 4
+    assert len(first["files"]) == 2
+
+    assert exporter.export(["scans"])["tables"]["scans"] == {"rows": 0, "files": []}
+    add_scans(db, ["e"])
+    assert exporter.export(["scans"])["tables"]["scans"]["rows"] == 1
+    assert load_manifest(tmp_path / "exports")["tables"]["scans"]["high_water_mark"] == 5
+
+    table = ExportReader(tmp_path / "exports").read("scans")
+    assert table.column("id").to_pylist() == [1, 2, 3, 4, 5]
+    assert table.column("barcode").to_pylist() == ["a", "b", "c", "d", "e"]
+    assert not exporter.export(["products"])["success"]
+
+
+def test_resolved_alerts_are_exported_again(db, tmp_path):
+    engine = AlertEngine(db)
+    exporter = ColumnarExporter(db, tmp_path / "exports")
+    conn = engine._get_connection()
+    engine.evaluate(conn.cursor(), "1", 0)
+    engine.evaluate(conn.cursor(), "2", 0)
+    engine.commit(conn)
+    assert exporter.export(["inventory_alerts"])["tables"]["inventory_alerts"]["rows"] == 2
+
+    engine.evaluate(conn.cursor(), "1", 3)
+    engine.commit(conn)
+    conn.close()
+    assert exporter.export(["inventory_alerts"])["tables"]["inventory_alerts"]["rows"] == 1
+
+    reader = ExportReader(tmp_path / "exports")
+    table = reader.read("inventory_alerts", columns=["ean", "status"])
+    assert table.column_names == ["ean", "status", "export_device"]
+    assert sorted(zip(table.column("ean").to_pylist(), table.column("status").to_pylist())) \
+        == [("1", "resolved"), ("2", "active")]
+
+
+def test_manifest_without_marker_is_reexported(db, tmp_path):
+    export_dir = tmp_path / "exports"
+    (export_dir / "inventory_alerts").mkdir(parents=True)
+    stale = export_dir / "inventory_alerts" / "inventory_alerts_000000000001_000000000001.parquet"
+    stale.write_bytes(b"old")
+    (export_dir / "manifest.json").write_text(json.dumps({"device_id": "dev", "tables": {
+        "inventory_alerts": {"high_water_mark": 1, "files": [{"file": "inventory_alerts/" + stale.name}]}
+    }}))
+    engine = AlertEngine(db)
+    conn = engine._get_connection()
+    engine.evaluate(conn.cursor(), "1", 0)
+    engine.commit(conn)
+    conn.close()
+
+    assert ColumnarExporter(db, export_dir).export(["inventory_alerts"])["tables"]["inventory_alerts"]["rows"] == 1
+    assert not stale.exists()
+    state = load_manifest(export_dir)["tables"]["inventory_alerts"]
+    assert state["marker"] == "change_seq"
+    assert ExportReader(export_dir).read("inventory_alerts").num_rows == 1
+
+
+def test_fleet_read_keeps_devices_apart(tmp_path):
+    for device in ("north", "south"):
+        db = tmp_path / f"{device}.db"
+        ColumnarExporter(db, tmp_path / "fleet" / device)
+        add_scans(db, [f"{device}-1", f"{device}-2"], device)
+        ColumnarExporter(db, tmp_path / "fleet" / device).export()
+
+    reader = ExportReader(tmp_path / "fleet")
+    table = reader.read("scans")
+    assert sorted(zip(table.column("export_device").to_pylist(), table.column("id").to_pylist())) \
+        == [("north", 1), ("north", 2), ("south", 1), ("south", 2)]
+    assert reader.read("scans", devices=["south"]).column("barcode").to_pylist() == ["south-1", "south-2"]
+    assert reader.read("inventory_alerts", columns=["ean"]).num_rows == 0
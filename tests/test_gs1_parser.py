@@ -0,0 +1,57 @@
+import json
+from datetime import date
+
+import pytest
+
+from src.gs1_parser import (GS, GS1ParseError, _parse_date, gs1_transaction_notes, is_gs1_element_string,
+                            parse_element_string, parse_gs1)
+
+
+def test_human_readable_and_raw_forms_agree():
+    raw = f"]C1010950110153000317261231" f"10LOT42{GS}3724"
+    readable = "(01)09501101530003(17)261231(10)LOT42(37)24"
+    assert parse_element_string(raw) == parse_element_string(readable)
+
+
+def test_parse_gs1_fields():
+    parsed = parse_gs1("(01)09501101530003(17)261231(10)LOT42(37)24")
+    assert parsed["gtin"] == "09501101530003"
+    assert parsed["quantity"] == 24
+    assert parsed["batch"] == "LOT42"
+    assert parsed["expiry"] == "2026-12-31"
+    assert json.loads(gs1_transaction_notes(parsed)) == {"batch": "LOT42", "expiry": "2026-12-31",
+                                                         "case_quantity": 24}
+
+
+def test_plain_gtin_has_no_notes():
+    parsed = parse_gs1("(01)09501101530003")
+    assert parsed["quantity"] == 1
+    assert gs1_transaction_notes(parsed) is None
+
+
+@pytest.mark.parametrize("data, message", [
+    ("(01)09501101530004", "check digit"),
+    ("(05)1", "Unknown application identifier"),
+    ("01095011015300", "requires 14 characters"),
+    ("(01)09501101530003(37)0", "positive"),
+    ("(01)0950110153000３", "numeric"),
+])
+def test_parse_errors(data, message):
+    with pytest.raises(GS1ParseError, match=message):
+        parse_gs1(data)
+
+
+def test_day_zero_is_last_day_of_month():
+    assert _parse_date("240200", today=date(2025, 1, 1)) == "2024-02-29"
+
+
+def test_century_window():
+    assert _parse_date("991231", today=date(2025, 1, 1)) == "1999-12-31"
+    assert _parse_date("700101", today=date(2025, 1, 1)) == "2070-01-01"
+
+
+def test_element_string_detection():
+    assert is_gs1_element_string("(01)09501101530003")
+    assert is_gs1_element_string("010950110153000317261231")
+    assert not is_gs1_element_string("4006381333931")
+    assert not is_gs1_element_string("")
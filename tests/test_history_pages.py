@@ -0,0 +1,61 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.database.history_pages import HistoryPages
+from src.utils.timestamps import to_epoch_ms
+
+START = datetime(2025, 7, 1, tzinfo=timezone.utc)
+
+
+def add_transaction(pages, ean, hours):
+    moment = START + timedelta(hours=hours)
+    conn = sqlite3.connect(pages.db_path)
+    try:
+        shard = pages.log.attach(conn, "inventory_transactions", to_epoch_ms(moment))
+        row_id = pages.log.insert(conn.cursor(), shard, "inventory_transactions", {
+            "ean": ean, "device_id": "dev", "transaction_type": "scan", "quantity_change": 1,
+            "timestamp": moment.isoformat(), "timestamp_ms": to_epoch_ms(moment)
+        })
+        conn.commit()
+        return row_id
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def pages(tmp_path):
+    return HistoryPages(tmp_path / "history.db")
+
+
+def page_ids(pages, **filters):
+    return [[item["id"] for item in page["items"]] for page in pages.iter_pages("transactions", **filters)]
+
+
+def test_pages_follow_key_order(pages):
+    for hour in range(7):
+        add_transaction(pages, "A" if hour % 2 else "B", hour)
+    assert page_ids(pages, page_size=3) == [[7, 6, 5], [4, 3, 2], [1]]
+    assert page_ids(pages, page_size=2, ean="A") == [[6, 4], [2]]
+    assert page_ids(pages, page_size=10, since=START + timedelta(hours=2), until=START + timedelta(hours=4)) \
+        == [[5, 4, 3]]
+
+
+def test_pages_span_main_database_and_shards(pages):
+    for hour in range(3):
+        add_transaction(pages, "A", hour)
+    pages.log.enable("inventory_transactions", shard_by="rows", rows_per_shard=2)
+    for hour in range(3, 8):
+        add_transaction(pages, "A", hour)
+    assert page_ids(pages, page_size=3) == [[8, 7, 6], [5, 4, 3], [2, 1]]
+    assert page_ids(pages, page_size=10, since=START + timedelta(hours=1), until=START + timedelta(hours=5)) \
+        == [[6, 5, 4, 3, 2]]
+
+
+def test_unknown_source_and_filter(pages):
+    assert not pages.page("orders")["success"]
+    assert not pages.page("notifications", ean="1")["success"]
+    assert pages.page("notifications") == {
+        "success": True, "message": "0 notifications", "items": [], "next_cursor": None, "has_more": False
+    }
@@ -0,0 +1,114 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.inventory_history import InventoryHistory
+from src.inventory_manager import InventoryManager
+from src.utils.timestamps import to_epoch_ms
+
+START = datetime(2025, 7, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def history(tmp_path):
+    return InventoryHistory(tmp_path / "history.db", snapshot_interval=0)
+
+
+def add_transaction(history, ean, previous, change, moment):
+    conn = sqlite3.connect(history.db_path)
+    try:
+        shard = history.log.attach(conn, "inventory_transactions", to_epoch_ms(moment))
+        row_id = history.log.insert(conn.cursor(), shard, "inventory_transactions", {
+            "ean": ean, "transaction_type": "scan", "quantity_change": change, "previous_quantity": previous,
+            "new_quantity": previous + change, "timestamp": moment.isoformat(), "timestamp_ms": to_epoch_ms(moment)
+        })
+        conn.commit()
+        return row_id
+    finally:
+        conn.close()
+
+
+def stored_quantities(history):
+    conn = sqlite3.connect(history.db_path)
+    rows = dict(conn.execute("SELECT ean, current_quantity FROM inventory_enhanced").fetchall())
+    conn.close()
+    return rows
+
+
+def test_as_of_replay_with_and_without_snapshots(history):
+    add_transaction(history, "A", 10, -2, START)
+    add_transaction(history, "B", 0, 5, START + timedelta(hours=1))
+    add_transaction(history, "A", 8, -3, START + timedelta(hours=2))
+    before = history.quantities_as_of(START + timedelta(hours=1))
+    assert before == {"A": 8, "B": 5}
+
+    assert history.create_snapshot()["last_transaction_id"] == 3
+    assert history.create_snapshot()["message"] == "Latest snapshot is up to date"
+    add_transaction(history, "B", 5, 1, START + timedelta(hours=3))
+
+    assert history.quantities_as_of(START + timedelta(hours=1)) == before
+    assert history.quantities_as_of() == {"A": 5, "B": 6}
+    assert history.quantity_as_of("A", START + timedelta(hours=2)) == 5
+    assert history.quantity_as_of("C") is None
+    with pytest.raises(ValueError):
+        history.quantities_as_of("not a time")
+
+
+def test_snapshots_are_pruned(history):
+    for hour in range(4):
+        add_transaction(history, "A", hour, 1, START + timedelta(hours=hour))
+        history.create_snapshot(retention=2)
+    conn = sqlite3.connect(history.db_path)
+    anchors = [row[0] for row in conn.execute("SELECT last_transaction_id FROM inventory_snapshots ORDER BY 1")]
+    items = conn.execute("SELECT COUNT(*) FROM inventory_snapshot_items").fetchone()[0]
+    conn.close()
+    assert anchors == [3, 4]
+    assert items == 2
+
+
+def test_rebuild_corrects_drift(history):
+    add_transaction(history, "A", 0, 4, START)
+    add_transaction(history, "B", 0, 2, START)
+    conn = sqlite3.connect(history.db_path)
+    conn.execute("INSERT INTO inventory_enhanced (ean, current_quantity) VALUES ('A', 9)")
+    conn.commit()
+    conn.close()
+
+    result = history.rebuild(dry_run=True)
+    assert result["drift"] == {"A": {"stored": 9, "replayed": 4}}
+    assert result["inserted"] == 1
+    assert stored_quantities(history) == {"A": 9}
+
+    history.rebuild()
+    assert stored_quantities(history) == {"A": 4, "B": 2}
+
+
+def test_rebuild_after_retention_gap(history):
+    history.log.enable("inventory_transactions", shard_by="day", retention_days=1)
+    add_transaction(history, "A", 0, 4, START)
+    add_transaction(history, "A", 4, -1, START + timedelta(hours=1))
+    history.create_snapshot()
+    later = START + timedelta(days=5)
+    add_transaction(history, "A", 3, 2, later)
+    dropped = history.log.drop_expired(now=to_epoch_ms(later))["dropped"]
+    assert dropped == [f"inventory_transactions_{START:%Y%m%d}.db"]
+
+    assert history.rebuild()["transactions"] == 1
+    assert stored_quantities(history) == {"A": 5}
+    with pytest.raises(ValueError):
+        history.quantities_as_of(START + timedelta(minutes=30))
+
+    conn = sqlite3.connect(history.db_path)
+    conn.execute("DELETE FROM inventory_snapshot_items")
+    conn.execute("DELETE FROM inventory_snapshots")
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError, match="no snapshot covers them"):
+        history.rebuild()
+
+    manager = InventoryManager.__new__(InventoryManager)
+    manager.history = history
+    result = manager.rebuild_from_log()
+    assert not result["success"]
+    assert result["message"].startswith("Rebuild failed: Transactions")
@@ -0,0 +1,73 @@
+import threading
+
+from src.main import BarcodeReader
+
+
+class RecordingLock:
+    """threading.Lock that logs every acquire"""
+
+    def __init__(self, log):
+        self.lock = threading.Lock()
+        self.log = log
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.log.append("lock")
+
+    def __exit__(self, *exc):
+        self.log.append("unlock")
+        self.lock.release()
+
+
+class FakeStorage:
+    def __init__(self, scans, log):
+        self.scans = scans
+        self.log = log
+
+    def get_unsent_scans(self):
+        self.log.append("read")
+        return self.scans
+
+    def mark_sent_to_hub(self, device_id, barcode, timestamp):
+        self.log.append(f"mark {barcode}")
+
+
+class FakeHub:
+    def __init__(self, log, fail_on=None):
+        self.log = log
+        self.fail_on = fail_on
+
+    def send_message(self, barcode, device_id, quantity):
+        if barcode == self.fail_on:
+            raise ConnectionError("hub down")
+        self.log.append(f"send {barcode}")
+        return True
+
+
+def reader(scans, fail_on=None):
+    log = []
+    instance = BarcodeReader.__new__(BarcodeReader)
+    instance.hub_lock = RecordingLock(log)
+    instance.hub_connected = True
+    instance.storage = FakeStorage(scans, log)
+    instance.hub_client = FakeHub(log, fail_on)
+    return instance, log
+
+
+SCANS = [{"barcode": code, "device_id": "d1", "quantity": 1, "timestamp": "t"} for code in ("A", "B")]
+
+
+def test_lock_is_released_between_retried_messages():
+    instance, log = reader(SCANS)
+    instance.retry_unsent_scans()
+    assert log == ["lock", "read", "unlock",
+                   "lock", "send A", "mark A", "unlock",
+                   "lock", "send B", "mark B", "unlock"]
+
+
+def test_retry_stops_when_the_hub_fails():
+    instance, log = reader(SCANS, fail_on="A")
+    instance.retry_unsent_scans()
+    assert "send B" not in log
+    assert not instance.hub_connected
+    assert log[-1] == "unlock"
@@ -0,0 +1,51 @@
+import sqlite3
+
+from src.database.migrations import MIGRATIONS, SCHEMA_VERSION, get_version, migrate
+from src.inventory_manager import STOCK_STATUSES, InventoryManager, classify_stock_status
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    db = tmp_path / "fresh.db"
+    assert migrate(db) == [number for number, _, _ in MIGRATIONS]
+    assert get_version(db) == SCHEMA_VERSION
+    assert migrate(db) == []
+
+
+def test_change_seq_backfilled_from_id(tmp_path):
+    db = tmp_path / "v5.db"
+    conn = sqlite3.connect(db)
+    for number, _, step in MIGRATIONS:
+        if number <= 5:
+            step(conn.cursor())
+    conn.execute("PRAGMA user_version = 5")
+    conn.execute("INSERT INTO inventory_alerts (ean, alert_type, message, severity) VALUES ('1', 'X', 'm', 'HIGH')")
+    conn.commit()
+    conn.close()
+
+    assert migrate(db) == [6]
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT id, change_seq FROM inventory_alerts").fetchall() == [(1, 1)]
+    conn.close()
+
+
+def test_classify_null_quantity():
+    assert classify_stock_status(None, 5) == "OUT_OF_STOCK"
+    assert classify_stock_status(3, None) == "NORMAL"
+    assert classify_stock_status(-1, 5) == "CRITICAL"
+    assert classify_stock_status(5, 5) == "LOW_STOCK"
+
+
+def test_rebuild_status_counters_with_null_quantity(tmp_path):
+    db = tmp_path / "inventory.db"
+    migrate(db)
+    conn = sqlite3.connect(db)
+    conn.executemany(
+        "INSERT INTO inventory_enhanced (ean, current_quantity, min_threshold) VALUES (?, ?, ?)",
+        [("1", None, 5), ("2", 10, 5), ("3", 2, 5)]
+    )
+    InventoryManager._rebuild_status_counters(InventoryManager.__new__(InventoryManager), conn.cursor())
+    conn.commit()
+    counts = dict(conn.execute("SELECT status, item_count FROM inventory_status_counts").fetchall())
+    conn.close()
+    assert set(counts) == set(STOCK_STATUSES)
+    assert counts == {"CRITICAL": 0, "OUT_OF_STOCK": 1, "LOW_STOCK": 1, "NORMAL": 1}
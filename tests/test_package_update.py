@@ -0,0 +1,80 @@
+import zipfile
+
+import pytest
+
+pytest.importorskip("requests")
+
+from src.ota import package_update
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    for name, data in {
+        "src/main.py": "print('main')\n",
+        "src/system_status_monitor_backup.py": "BACKUP = True\n",
+        "src/ota/client.py": "CLIENT = 1\n",
+        "src/__pycache__/main.cpython-311.pyc": "bytecode",
+        "src/app.log": "log",
+        "other/big.py": "IGNORED = 1\n",
+        "config.json": '{"iot_hub": {"connection_string": "secret"}}',
+    }.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(data)
+    monkeypatch.setattr(package_update, "project_root", tmp_path)
+    return tmp_path
+
+
+MANIFEST = {"include": ["src/*"], "exclude": package_update.DEFAULT_MANIFEST["exclude"]}
+
+
+def test_collect_files_keeps_backup_modules_and_applies_excludes(tree):
+    assert package_update.collect_files(MANIFEST) == [
+        "src/main.py", "src/ota/client.py", "src/system_status_monitor_backup.py"
+    ]
+
+
+def test_only_include_roots_are_walked(tree):
+    manifest = {"include": ["src/*", "src/ota/*.py", "*.json"], "exclude": []}
+    assert package_update._include_roots(manifest) == [tree]
+    assert package_update._include_roots(MANIFEST) == [tree / "src"]
+    assert package_update._include_roots({"include": ["src/ota/*", "src/*.py"], "exclude": []}) == [tree / "src"]
+
+
+def test_deterministic_zip_is_byte_identical_and_readable(tmp_path):
+    entries = []
+    for name, data in (("a.txt", b"hello" * 100), ("dir/b.bin", bytes(range(256)))):
+        entries.append((name, package_update.zlib.crc32(data), len(data), package_update._deflate(data)))
+    first, second = tmp_path / "first.zip", tmp_path / "second.zip"
+    package_update.write_deterministic_zip(first, entries)
+    package_update.write_deterministic_zip(second, entries)
+    assert first.read_bytes() == second.read_bytes()
+    with zipfile.ZipFile(first) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["a.txt", "dir/b.bin"]
+        assert archive.read("dir/b.bin") == bytes(range(256))
+
+
+def test_compressed_entries_are_cached_by_content(tmp_path):
+    source = tmp_path / "module.py"
+    source.write_text("X = 1\n")
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    first = package_update._compress_entry(source, cache)
+    second = package_update._compress_entry(source, cache)
+    assert not first["cached"] and second["cached"]
+    assert first["compressed_path"] == second["compressed_path"]
+
+
+def test_packages_are_reproducible(tree, tmp_path):
+    out_a, out_b = tmp_path / "out_a", tmp_path / "out_b"
+    out_a.mkdir()
+    out_b.mkdir()
+    cache = tmp_path / "cache"
+    first = package_update.create_update_package("1.2.3", "test", out_a, workers=1, cache_dir=cache)
+    second = package_update.create_update_package("1.2.3", "test", out_b, workers=1, cache_dir=cache)
+    assert first.read_bytes() == second.read_bytes()
+    with zipfile.ZipFile(first) as archive:
+        assert "src/system_status_monitor_backup.py" in archive.namelist()
+        config = archive.read("config.json").decode()
+        assert "secret" not in config and '"app_version": "1.2.3"' in config
@@ -0,0 +1,88 @@
+from src.ota.rollout import RolloutScheduler, device_bucket
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+DEVICES = [f"device-{i}" for i in range(1000)]
+
+
+def test_device_bucket_is_stable_and_per_update():
+    assert device_bucket("u1", "device-1") == device_bucket("u1", "device-1")
+    assert [device_bucket("u1", d) for d in DEVICES[:20]] != [device_bucket("u2", d) for d in DEVICES[:20]]
+    assert all(0 <= device_bucket("u1", d) < 100 for d in DEVICES)
+
+
+def test_rings_widen_and_keep_earlier_devices():
+    clock = Clock()
+    scheduler = RolloutScheduler("u1", {"rings": [1, 10, 100]}, clock=clock)
+    first = {d for d in DEVICES if scheduler.in_rollout(d)}
+    assert 0 < len(first) < 40
+    assert scheduler.advance_ring() == 10
+    second = {d for d in DEVICES if scheduler.in_rollout(d)}
+    assert first < second and len(second) < 200
+    scheduler.advance_ring()
+    assert scheduler.advance_ring() == 100
+    assert all(scheduler.in_rollout(d) for d in DEVICES)
+
+
+def test_ring_advances_automatically_unless_paused():
+    clock = Clock()
+    scheduler = RolloutScheduler("u1", {"rings": [1, 100], "ring_interval_seconds": 60}, clock=clock)
+    scheduler.pause()
+    clock.now = 120
+    scheduler.request("device-1", 0)
+    assert scheduler.current_percentage() == 1
+    scheduler.resume()
+    clock.now = 180
+    scheduler.request("device-1", 0)
+    assert scheduler.current_percentage() == 100
+
+
+def test_concurrency_limit_and_lease_expiry():
+    clock = Clock()
+    scheduler = RolloutScheduler("u1", {"max_concurrent_downloads": 2, "lease_seconds": 100}, clock=clock)
+    assert scheduler.request("a", 1) == (True, "granted")
+    assert scheduler.request("b", 1) == (True, "granted")
+    assert scheduler.request("c", 1) == (False, "concurrency_limit")
+    assert scheduler.request("a", 1) == (True, "lease_active")
+    scheduler.report("a", True)
+    assert scheduler.request("c", 1) == (True, "granted")
+    clock.now = 100
+    assert scheduler.stats()["active_downloads"] == 2
+    assert scheduler.request("d", 1) == (True, "granted")
+    assert scheduler.stats()["active_downloads"] == 1
+
+
+def test_bandwidth_budget_resets_each_window():
+    clock = Clock()
+    scheduler = RolloutScheduler("u1", {"bandwidth_budget_bytes": 100, "window_seconds": 60}, clock=clock)
+    assert scheduler.request("a", 60)[0]
+    assert scheduler.request("b", 60) == (False, "bandwidth_budget")
+    assert scheduler.retry_after() == 60
+    clock.now = 60
+    assert scheduler.request("b", 60)[0]
+
+
+def test_auto_pause_after_failure_threshold():
+    scheduler = RolloutScheduler("u1", {"failure_threshold": 0.2, "min_reports": 5}, clock=Clock())
+    for device in "abcd":
+        scheduler.report(device, False)
+    assert not scheduler.state["paused"]
+    scheduler.report("e", True)
+    assert scheduler.state["paused"]
+    assert "80%" in scheduler.state["pause_reason"]
+    assert scheduler.request("f", 0) == (False, "paused")
+
+
+def test_state_round_trips_through_dict():
+    clock = Clock()
+    scheduler = RolloutScheduler("u1", {"rings": [5, 100]}, clock=clock)
+    scheduler.request("device-1", 10)
+    restored = RolloutScheduler.from_dict("u1", scheduler.to_dict(), clock=clock)
+    assert restored.stats() == scheduler.stats()
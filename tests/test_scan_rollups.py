@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from src.database.scan_rollups import ScanAnalytics, auto_granularity, bucket_start, record_scan
+
+T0 = 1_749_999_600
+
+
+@pytest.fixture
+def analytics(tmp_path):
+    analytics = ScanAnalytics(tmp_path / "rollups.db")
+    conn = analytics._get_connection()
+    cursor = conn.cursor()
+    for offset, device, ean, quantity in ((0, "d1", "A", 1), (30, "d1", "B", 3), (90, "d2", "A", None),
+                                          (4000, "d2", "B", 2)):
+        record_scan(cursor, device, ean, quantity, T0 + offset)
+        cursor.execute("INSERT INTO scans (device_id, barcode, quantity, timestamp_ms) VALUES (?, ?, ?, ?)",
+                       (device, ean, quantity, (T0 + offset) * 1000))
+    conn.commit()
+    conn.close()
+    return analytics
+
+
+def series(result):
+    return [(point["bucket_start"], point["scans"], point["quantity"]) for point in result]
+
+
+def test_bucket_helpers():
+    assert bucket_start(T0 + 59, "minute") == T0
+    assert bucket_start(T0 + 3601, "hour") == T0 + 3600
+    assert auto_granularity(T0, T0 + 3600) == "minute"
+    assert auto_granularity(T0, T0 + 7 * 86400) == "hour"
+    assert auto_granularity(T0, T0 + 3 * 365 * 86400) == "day"
+
+
+def test_throughput_by_device_and_ean(analytics):
+    hour = bucket_start(T0, "hour")
+    assert series(analytics.throughput("hour", T0, T0 + 7200)) == [(hour, 3, 5), (hour + 3600, 1, 2)]
+    assert series(analytics.throughput("hour", T0, T0 + 7200, device_id="d1")) == [(hour, 2, 4)]
+    assert series(analytics.throughput("hour", T0, T0 + 7200, barcode="A")) == [(hour, 2, 2)]
+
+
+def test_throughput_rejects_device_and_ean_together(analytics):
+    with pytest.raises(ValueError, match="not both"):
+        analytics.throughput("hour", T0, T0 + 7200, device_id="d1", barcode="A")
+    with pytest.raises(ValueError):
+        analytics.throughput("week", T0, T0 + 7200)
+
+
+def test_rebuild_matches_incremental_rollups(analytics):
+    before = series(analytics.throughput("minute", T0, T0 + 7200))
+    conn = sqlite3.connect(analytics.db_path)
+    conn.execute("DELETE FROM scan_rollups_device")
+    conn.commit()
+    conn.close()
+    analytics.rebuild()
+    assert series(analytics.throughput("minute", T0, T0 + 7200)) == before
+    top = sorted(analytics.top("device", T0, T0 + 86400), key=lambda row: row["device_id"])
+    assert top == [{"device_id": "d1", "scans": 2, "quantity": 4}, {"device_id": "d2", "scans": 2, "quantity": 3}]
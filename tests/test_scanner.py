@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from src.scanner import input_engine
+from src.scanner.coalescer import ScanCoalescer
+from src.scanner.input_engine import ReplaySource, ScannerInputEngine, create_scanner_engine
+
+
+@pytest.fixture
+def input_devices(tmp_path):
+    paths = []
+    for name in ("usb-Scanner-event-kbd", "usb-Keyboard-event-kbd"):
+        path = tmp_path / name
+        path.write_bytes(b"")
+        paths.append(str(path))
+    return paths
+
+
+def test_auto_discovered_devices_are_not_grabbed(input_devices, tmp_path, monkeypatch):
+    monkeypatch.setattr(input_engine, "DEFAULT_DEVICE_PATTERNS", [str(tmp_path / "*-event-kbd")])
+    engine = create_scanner_engine({})
+    assert len(engine.sources) == 2
+    assert not any(source.grab for source in engine.sources)
+
+
+def test_configured_devices_are_grabbed(input_devices):
+    engine = create_scanner_engine({"devices": input_devices[:1]})
+    assert [source.grab for source in engine.sources] == [True]
+    engine = create_scanner_engine({"devices": input_devices[:1], "grab": False})
+    assert [source.grab for source in engine.sources] == [False]
+
+
+def test_no_devices(tmp_path):
+    assert create_scanner_engine({"devices": [str(tmp_path / "missing*")]}) is None
+
+
+def test_replayed_scans_from_several_scanners():
+    first = ReplaySource.from_barcodes("scanner-1", ["4006381333931", "LOT-42a"])
+    second = ReplaySource.from_barcodes("scanner-2", ["\x1d0109501101530003"])
+    engine = ScannerInputEngine([first, second])
+    assert engine.start()
+    assert engine.wait(5)
+    scans = []
+    while (scan := engine.get_scan(timeout=0)) is not None:
+        scans.append((scan.device, scan.barcode))
+    engine.stop()
+    assert [barcode for device, barcode in scans if device == "scanner-1"] == ["4006381333931", "LOT-42a"]
+    assert [barcode for device, barcode in scans if device == "scanner-2"] == ["\x1d0109501101530003"]
+
+
+def coalesce(reads, window=0.5, debounce=0.08):
+    events = []
+    # A clock that never advances: events are emitted only by a new barcode or close()
+    coalescer = ScanCoalescer(events.append, window, debounce, clock=lambda: 0.0)
+    for barcode, device, timestamp in reads:
+        coalescer.add(barcode, device, timestamp)
+    coalescer.close()
+    return [(event.barcode, event.device, event.quantity, event.reads) for event in events]
+
+
+def test_double_fire_is_one_scan():
+    assert coalesce([("A", "s1", 1.00), ("A", "s1", 1.03)]) == [("A", "s1", 1, 2)]
+
+
+def test_repeated_scans_in_window_add_quantity():
+    assert coalesce([("A", "s1", 1.0), ("A", "s1", 1.3), ("A", "s1", 1.6)]) == [("A", "s1", 3, 3)]
+
+
+def test_gap_longer_than_window_starts_new_event():
+    assert coalesce([("A", "s1", 1.0), ("A", "s1", 2.0)]) == [("A", "s1", 1, 1), ("A", "s1", 1, 1)]
+
+
+def test_other_barcode_and_devices_are_separate():
+    events = coalesce([("A", "s1", 1.0), ("A", "s2", 1.1), ("B", "s1", 1.2), ("A", "s1", 1.3)])
+    # Per device, events keep scan order
+    assert [event for event in events if event[1] == "s1"] == [("A", "s1", 1, 1), ("B", "s1", 1, 1), ("A", "s1", 1, 1)]
+    assert [event for event in events if event[1] == "s2"] == [("A", "s2", 1, 1)]
+
+
+def test_events_are_emitted_after_the_window():
+    events = []
+    coalescer = ScanCoalescer(events.append, window_seconds=0.05, debounce_seconds=0.0)
+    coalescer.add("A", "s1")
+    coalescer.add("A", "s1")
+    deadline = time.time() + 5
+    while not events and time.time() < deadline:
+        time.sleep(0.01)
+    coalescer.close()
+    assert [(event.barcode, event.quantity) for event in events] == [("A", 2)]
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+
+import pytest
+
+from src.database.shards import MS_PER_DAY, SEALED, ShardedLog
+
+DAY0 = 20000 * MS_PER_DAY
+
+
+def add_scan(log, barcode, epoch_ms, timeout=5):
+    conn = sqlite3.connect(log.db_path, timeout=timeout)
+    try:
+        shard = log.attach(conn, "scans", epoch_ms)
+        row_id = log.insert(conn.cursor(), shard, "scans", {
+            "device_id": "dev", "barcode": barcode, "timestamp_ms": epoch_ms, "sent_to_hub": 1
+        })
+        conn.commit()
+        return row_id
+    finally:
+        conn.close()
+
+
+def all_ids(log):
+    ids = []
+    for conn in log.each_segment("scans"):
+        ids += [row[0] for row in conn.execute("SELECT rowid FROM scans ORDER BY rowid")]
+    return ids
+
+
+@pytest.fixture
+def log(tmp_path):
+    return ShardedLog(tmp_path / "main.db")
+
+
+def test_unsharded_table_writes_to_main_database(log):
+    assert add_scan(log, "a", DAY0) == 1
+    assert log.segments(sqlite3.connect(log.db_path).cursor(), "scans") == [None]
+
+
+def test_rows_mode_rolls_over_and_seals(log):
+    add_scan(log, "before", DAY0)
+    log.enable("scans", shard_by="rows", rows_per_shard=2)
+    ids = [add_scan(log, str(i), DAY0 + i) for i in range(5)]
+    assert ids == [2, 3, 4, 5, 6]
+
+    shards = log.status()["scans"]["shards"]
+    assert [(shard["first_id"], shard["last_id"]) for shard in shards] == [(2, 3), (4, 5), (6, 6)]
+    first = sqlite3.connect(log.shard_dir / shards[0]["file"])
+    assert first.execute("PRAGMA user_version").fetchone()[0] == SEALED
+    first.close()
+    assert all_ids(log) == [1, 2, 3, 4, 5, 6]
+
+
+def test_day_mode_segments_by_time(log):
+    log.enable("scans", shard_by="day")
+    for day in range(3):
+        add_scan(log, str(day), DAY0 + day * MS_PER_DAY)
+    conn = sqlite3.connect(log.db_path)
+    segments = log.segments(conn.cursor(), "scans", since_ms=DAY0 + MS_PER_DAY, until_ms=DAY0 + MS_PER_DAY)
+    newest = log.segments(conn.cursor(), "scans", newest_first=True)
+    conn.close()
+    assert [path.name for path in segments] == ["scans_20241005.db", "scans_20241006.db"]
+    assert newest[0].name == "scans_20241006.db"
+
+
+def test_concurrent_writers_get_dense_unique_ids(log):
+    log.enable("scans", shard_by="rows", rows_per_shard=7)
+    ids = []
+    lock = threading.Lock()
+
+    def writer(name):
+        for i in range(10):
+            row_id = add_scan(log, f"{name}{i}", DAY0 + i, timeout=30)
+            with lock:
+                ids.append(row_id)
+
+    threads = [threading.Thread(target=writer, args=(name,)) for name in "abcd"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(ids) == list(range(1, 41))
+    assert all_ids(log) == list(range(1, 41))
+
+
+def test_write_while_main_database_is_locked(log):
+    log.enable("scans", shard_by="day")
+    add_scan(log, "first", DAY0)
+    blocker = sqlite3.connect(log.db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        assert add_scan(log, "second", DAY0 + 1, timeout=0.1) == 2
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+
+
+def test_drop_expired_keeps_unsent_and_newest(log):
+    log.enable("scans", shard_by="day", retention_days=1)
+    add_scan(log, "old", DAY0)
+    conn = sqlite3.connect(log.db_path)
+    shard = log.attach(conn, "scans", DAY0 + MS_PER_DAY)
+    log.insert(conn.cursor(), shard, "scans", {"barcode": "unsent", "timestamp_ms": DAY0 + MS_PER_DAY})
+    conn.commit()
+    conn.close()
+    add_scan(log, "new", DAY0 + 5 * MS_PER_DAY)
+
+    result = log.drop_expired(now=DAY0 + 5 * MS_PER_DAY)
+    assert result["dropped"] == ["scans_20241004.db"]
+    assert [kept["file"] for kept in result["kept"]] == ["scans_20241005.db"]
+    conn = sqlite3.connect(log.db_path)
+    assert log.missing_ids(conn.cursor(), "scans") == (0, 1)
+    conn.close()
+    assert all_ids(log) == [2, 3]
+
+
+def test_enable_rejects_unknown_table_and_mode(log):
+    with pytest.raises(ValueError):
+        log.enable("products")
+    with pytest.raises(ValueError):
+        log.enable("scans", shard_by="week")
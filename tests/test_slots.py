@@ -0,0 +1,107 @@
+import os
+import sqlite3
+
+import pytest
+
+from src.ota.slots import SlotManager, default_slots_dir
+
+
+@pytest.fixture
+def app(tmp_path):
+    root = tmp_path / "app"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "main.py").write_text("VERSION = 1\n")
+    (root / "config.json").write_text('{"app_version": "1.0"}')
+    (root / "package_cache").mkdir()
+    (root / "package_cache" / "abc.zip").write_text("cached")
+    conn = sqlite3.connect(root / "barcode_scans.db")
+    conn.execute("CREATE TABLE scans (barcode TEXT)")
+    conn.execute("INSERT INTO scans VALUES ('before')")
+    conn.commit()
+    conn.close()
+    return root
+
+
+def package(tmp_path, version, source="VERSION = {version}\n"):
+    extract = tmp_path / f"pkg_{version}"
+    (extract / "src").mkdir(parents=True)
+    (extract / "src" / "main.py").write_text(source.format(version=version))
+    return extract
+
+
+def scan_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_flip_and_rollback(app, tmp_path):
+    slots = SlotManager(app / "slots")
+    first = slots.prepare(package(tmp_path, 2), app, ["config.json"], version="2.0")
+    assert slots.active_slot() is None
+    slots.activate(first.name)
+    assert slots.active_slot() == first.name
+    assert (slots.current_link / "src" / "main.py").read_text() == "VERSION = 2\n"
+
+    second = slots.prepare(package(tmp_path, 3), first, ["config.json"], version="3.0")
+    assert second.name != first.name
+    slots.activate(second.name)
+    assert slots.slot_info(second.name)["version"] == "3.0"
+
+    assert slots.rollback() == first.name
+    assert (slots.current_link / "src" / "main.py").read_text() == "VERSION = 2\n"
+
+
+def test_rollback_needs_a_previous_slot(app, tmp_path):
+    slots = SlotManager(app / "slots")
+    assert slots.rollback() is None
+    slots.activate(slots.prepare(package(tmp_path, 2), app, version="2.0").name)
+    assert slots.rollback() is None
+
+
+def test_slot_with_syntax_errors_is_not_prepared(app, tmp_path):
+    slots = SlotManager(app / "slots")
+    assert slots.prepare(package(tmp_path, 2, source="def broken(:\n"), app, version="2.0") is None
+    assert slots.active_slot() is None
+
+
+def test_state_is_moved_once_and_shared_by_both_slots(app, tmp_path):
+    slots = SlotManager(app / "slots")
+    # A connection the running application opened before the update
+    running = sqlite3.connect(app / "barcode_scans.db")
+    first = slots.prepare(package(tmp_path, 2), app, version="2.0")
+
+    # Writes made before the restart land in the shared database
+    running.execute("INSERT INTO scans VALUES ('after prepare')")
+    running.commit()
+    running.close()
+    assert (app / "barcode_scans.db").is_symlink()
+    assert scan_count(slots.data_dir / "barcode_scans.db") == 2
+    assert scan_count(first / "barcode_scans.db") == 2
+    assert (first / "package_cache" / "abc.zip").read_text() == "cached"
+
+    slots.activate(first.name)
+    second = slots.prepare(package(tmp_path, 3), first, version="3.0")
+    assert os.readlink(second / "barcode_scans.db") == os.path.join("..", "data", "barcode_scans.db")
+    assert scan_count(second / "barcode_scans.db") == 2
+
+
+def test_launch_path_reroots_project_and_slot_paths(app, tmp_path):
+    slots = SlotManager(app / "slots")
+    slot = slots.prepare(package(tmp_path, 2), app, version="2.0")
+    slots.activate(slot.name)
+    expected = slots.current_link / "src" / "main.py"
+    # First A/B install: the running script is under the project root, not a slot
+    assert slots.launch_path(app / "src" / "main.py", app) == expected
+    assert slots.launch_path(slot / "src" / "main.py", app) == expected
+    outside = (tmp_path / "elsewhere.py").resolve()
+    assert slots.launch_path(outside, app) == outside
+
+
+def test_default_slots_dir_from_inside_a_slot(app, tmp_path):
+    slots = SlotManager(app / "slots")
+    slot = slots.prepare(package(tmp_path, 2), app, version="2.0")
+    assert default_slots_dir(app) == app / "slots"
+    assert default_slots_dir(slot) == (app / "slots").resolve()
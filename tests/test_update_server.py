@@ -0,0 +1,112 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+from src.ota import update_server
+from src.ota.package_cache import EMPTY_CACHE_MARKER
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(update_server, "UPDATES_DIR", tmp_path / "updates")
+    monkeypatch.setattr(update_server, "DEVICES_DIR", tmp_path / "devices")
+    monkeypatch.setattr(update_server, "CATALOGUE_GENERATION_FILE", tmp_path / "updates" / ".generation")
+    monkeypatch.setattr(update_server, "_catalogue_cache", {"stamp": None, "updates": []})
+    (tmp_path / "updates").mkdir()
+    (tmp_path / "devices").mkdir()
+    return update_server
+
+
+@pytest.fixture
+def client(server):
+    return TestClient(server.app)
+
+
+def publish(server, update_id, version, created_at, file_hash="hash"):
+    update_dir = server.UPDATES_DIR / update_id
+    update_dir.mkdir()
+    (update_dir / "package.zip").write_bytes(b"package")
+    server.publish_update_info(update_dir, {
+        "update_id": update_id, "version": version, "filename": "package.zip", "file_hash": file_hash,
+        "created_at": created_at, "size_bytes": 7
+    })
+
+
+def test_catalogue_sees_every_publish(server):
+    assert server.read_catalogue() == []
+    publish(server, "u1", "1.0", "2025-07-01T00:00:00.000Z")
+    assert [update["update_id"] for update in server.read_catalogue()] == ["u1"]
+    publish(server, "u2", "1.1", "2025-07-02T00:00:00.000Z")
+    assert [update["update_id"] for update in server.read_catalogue()] == ["u2", "u1"]
+
+
+def test_unknown_or_traversing_update_ids_are_rejected(server, client):
+    for update_id in ("..", ".", "a/b", "a\\b", ""):
+        assert server.update_dir_for(update_id) is None
+    assert client.post("/updates/missing/rollout/pause").status_code == 404
+    assert client.get("/updates/missing/rollout").status_code == 404
+    assert not (server.UPDATES_DIR / "missing").exists()
+    with pytest.raises(KeyError):
+        server.rollout_lock("missing")
+
+    publish(server, "u1", "1.0", "2025-07-01T00:00:00.000Z")
+    assert client.get("/updates/u1/rollout").status_code == 404
+    assert client.post("/updates/u1/rollout", json={"rings": [10, 100]}).json()["stats"]["percentage"] == 10
+    assert client.get("/updates/u1/download").content == b"package"
+
+
+def test_empty_cache_is_recorded(server, client):
+    publish(server, "u1", "1.0", "2025-07-01T00:00:00.000Z")
+    client.post("/devices/d1/check", params={"cached_hashes": ["abc"], "peer_port": 8765})
+    assert client.get("/devices/d1").json()["cached_packages"] == ["abc"]
+
+    client.post("/devices/d1/check", params={"cached_hashes": [EMPTY_CACHE_MARKER], "peer_port": 8765})
+    assert client.get("/devices/d1").json()["cached_packages"] == []
+
+    client.post("/devices/d1/check", params={"cached_hashes": ["abc"]})
+    client.post("/devices/d1/check", params={"peer_port": 8765})
+    assert client.get("/devices/d1").json()["cached_packages"] == []
+
+
+def test_peers_share_a_site_and_hold_the_package(server, client):
+    publish(server, "u1", "1.0", "2025-07-01T00:00:00.000Z", file_hash="h1")
+    for device_id, site, cached in (("old", "shop", ["h1"]), ("other-site", "depot", ["h1"]),
+                                    ("no-copy", "shop", ["h0"]), ("new", "shop", ["h1"])):
+        client.post(f"/devices/{device_id}/check", params={"cached_hashes": cached, "peer_port": 8765, "site": site})
+    server.update_device_info("no-port", {"site": "shop", "cached_packages": ["h1"], "peer_address": None})
+
+    response = client.post("/devices/me/check", params={"site": "shop"}).json()
+    assert response["has_update"]
+    assert response["file_hash"] == "h1"
+    assert response["peers"] == ["http://testclient:8765", "http://testclient:8765"]
+    assert server.find_peers("old", "shop", "h1") == ["http://testclient:8765"]
+    assert server.find_peers("me", "depot", "h2") == []
+
+
+def test_rollout_limits_downloads(server, client):
+    publish(server, "u1", "1.0", "2025-07-01T00:00:00.000Z")
+    client.post("/updates/u1/rollout", json={"max_concurrent_downloads": 1})
+    first = client.post("/devices/d1/check", params={"current_version": "0.9"}).json()
+    second = client.post("/devices/d2/check", params={"current_version": "0.9"}).json()
+    assert first["has_update"] and first["update_id"] == "u1"
+    assert not second["has_update"] and second["retry_after"] >= 1
+
+    client.post("/devices/d1/update_status", params={"version": "1.0", "status": "success"})
+    assert client.post("/devices/d2/check", params={"current_version": "0.9"}).json()["has_update"]
+    assert not client.post("/devices/d1/check").json()["has_update"]
+
+
+def test_only_install_outcomes_feed_the_rollout(server, client):
+    publish(server, "u1", "1.0", "2025-07-01T00:00:00.000Z")
+    client.post("/updates/u1/rollout", json={"min_reports": 2, "failure_threshold": 0.4})
+    for device_id, status in (("d1", "success"), ("d2", "rolled_back"), ("d3", "downloading")):
+        client.post(f"/devices/{device_id}/update_status", params={"version": "1.0", "status": status})
+    stats = client.get("/updates/u1/rollout").json()["stats"]
+    assert (stats["reported"], stats["failed"], stats["paused"]) == (1, 0, False)
+
+    client.post("/devices/d4/update_status", params={"version": "1.0", "status": "failed"})
+    stats = client.get("/updates/u1/rollout").json()["stats"]
+    assert (stats["reported"], stats["failed"], stats["paused"]) == (2, 1, True)